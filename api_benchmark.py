@@ -0,0 +1,177 @@
+"""
+Concurrency check for the metrics API: many clients against one server.
+
+    python api_benchmark.py                                   # generated 200k-row workbook, 48 clients
+    python api_benchmark.py --workbook "failure data new.xlsx" --clients 96 --workers 4
+
+A server (metrics_api.py) is started on a free port in a child process.
+The workbook is uploaded, then --clients threads send --requests each. Each
+request picks at random among reliability (per sheet / all sheets, minutes
+or hours, several observation periods), costs and risk. The first requests
+for a parameter set are computed on the worker pool; repeats hit the result
+cache. While that load runs, /health is polled on a separate connection. Its
+latency shows whether the async front end stays responsive with every
+worker busy.
+
+Reported: request latency percentiles, throughput, cache hits and the
+slowest /health answer. Exit code 1 when any request failed.
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics_api import ApiError, MetricsClient
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, workers, spool):
+    args = [sys.executable, os.path.join(HERE, "metrics_api.py"), "--port", str(port), "--spool", spool]
+    if workers:
+        args += ["--workers", str(workers)]
+    process = subprocess.Popen(args, cwd=HERE, stderr=subprocess.DEVNULL)
+    client = MetricsClient(f"http://127.0.0.1:{port}", timeout=5)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            client.health()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("metrics API did not start")
+
+
+def stop_server(process, timeout=30):
+    """SIGTERM the server so it shuts its worker pool down itself; kill it only if it hangs."""
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def random_request(client, data_hash, sheets, rng):
+    kind = rng.choice(("reliability", "reliability", "costs", "risk"))
+    if kind == "reliability":
+        return kind, client.reliability(data_hash, sheet=rng.choice(sheets + [None]),
+                                        units=rng.choice(("hours", "minutes")),
+                                        observation_period=rng.choice((480, 720, 1440)))
+    if kind == "costs":
+        return kind, client.costs(data_hash)
+    return kind, client.risk(data_hash, sheet=rng.choice(sheets), trend=rng.choice((None, 100)))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the metrics API with many concurrent clients.")
+    parser.add_argument("--workbook", help="Workbook to upload (default: generate one)")
+    parser.add_argument("--rows", type=int, default=200_000, help="Rows to generate")
+    parser.add_argument("--sheets", type=int, default=4, help="Sheets to generate")
+    parser.add_argument("--clients", type=int, default=48, help="Concurrent client threads")
+    parser.add_argument("--requests", type=int, default=10, help="Requests per client")
+    parser.add_argument("--workers", type=int, default=None, help="Server worker processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        workbook = args.workbook
+        if workbook is None:
+            from generate_test_data import generate, write_xlsx
+            workbook = os.path.join(scratch, "bench.xlsx")
+            print(f"Generating {args.rows:,} rows x {args.sheets} sheets...", file=sys.stderr)
+            write_xlsx(workbook, generate(args.rows, args.sheets, args.seed))
+
+        port = free_port()
+        server = start_server(port, args.workers, os.path.join(scratch, "spool"))
+        try:
+            client = MetricsClient(f"http://127.0.0.1:{port}")
+            start = time.perf_counter()
+            described = client.upload(workbook)
+            upload_s = time.perf_counter() - start
+            data_hash, sheets = described["hash"], [s["name"] for s in described["sheets"]]
+            print(f"upload + parse: {upload_s:.2f}s ({described['rows']:,} rows, {len(sheets)} sheets)")
+
+            health_latency, stop = [], threading.Event()
+
+            def poll_health():
+                health = MetricsClient(client.base_url, timeout=30)
+                while not stop.is_set():
+                    t = time.perf_counter()
+                    health.health()
+                    health_latency.append(time.perf_counter() - t)
+                    time.sleep(0.05)
+
+            latencies, errors = {}, []
+
+            def run_client(i):
+                rng = random.Random(args.seed * 1000 + i)
+                for _ in range(args.requests):
+                    t = time.perf_counter()
+                    try:
+                        kind, _ = random_request(client, data_hash, sheets, rng)
+                    except (ApiError, OSError) as e:
+                        errors.append(str(e))
+                        continue
+                    latencies.setdefault(kind, []).append(time.perf_counter() - t)
+
+            poller = threading.Thread(target=poll_health, daemon=True)
+            poller.start()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.clients) as pool:
+                list(pool.map(run_client, range(args.clients)))
+            wall = time.perf_counter() - start
+            stop.set()
+            poller.join()
+            stats = client.health()
+        finally:
+            stop_server(server)
+
+    every = [x for values in latencies.values() for x in values]
+    result = {
+        "clients": args.clients, "requests": len(every), "errors": len(errors), "upload_s": round(upload_s, 3),
+        "wall_s": round(wall, 3), "requests_per_s": round(len(every) / wall, 1) if wall else None,
+        "p50_ms": round(statistics.median(every) * 1000, 1) if every else None,
+        "p95_ms": round(percentile(every, 0.95) * 1000, 1) if every else None,
+        "max_ms": round(max(every) * 1000, 1) if every else None,
+        "health_max_ms": round(max(health_latency) * 1000, 1) if health_latency else None,
+        "server": {k: stats[k] for k in ("workers", "jobs", "cache_hits", "rejected")},
+        "by_endpoint_p50_ms": {k: round(statistics.median(v) * 1000, 1) for k, v in sorted(latencies.items())},
+    }
+    print(f"{result['requests']:,} requests from {args.clients} clients in {wall:.2f}s "
+          f"({result['requests_per_s']}/s), {len(errors)} errors")
+    print(f"latency p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, max {result['max_ms']} ms; "
+          f"/health under load at most {result['health_max_ms']} ms")
+    print(f"server: {stats['jobs']} jobs on {stats['workers']} workers, {stats['cache_hits']} cache hits, "
+          f"{stats['rejected']} rejected")
+    for error in errors[:5]:
+        print(f"  error: {error}", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,25 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import LabelEncoder
+import os
+import uuid
 import warnings
 warnings.filterwarnings('ignore')
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image as RLImage
-from reportlab.lib.units import inch
-from io import BytesIO
-import tempfile
-import os
+from data_loader import load_workbook, numeric_column
+from column_mapping import maintenance_mask
+from schema import AUTO_SKIP
+from cost_scan import DEFAULT_EXCLUDED, cost_partials
+from grouped import GROUP_LEVELS, cached_group_base, grouped_metrics
+from incremental import incremental_store
+from failure_model import model_store
+from timeaware import RESAMPLE_RULES, cached_timestamps, compute_time_reliability, resample_reliability
+from timeline import FULL_DETAIL_LIMIT, is_downsampled, timeline_figure
+from exports import export_cache, export_key, build_excel_report, build_pdf_report
+from instrumentation import DEBUG_DEFAULT, LOG_DIR, STAGE_LOG, RunRecorder
+from history_store import STORE_ENABLED, STORE_GROUP_LEVELS, HistoryFilter, history_store
+from survival import MIN_FAILURES_FOR_FIT, cached_lifetimes
+from simulation import cached_what_if, compare
+from table_view import PAGE_SIZES, sheet_view
 
 # Page Configuration
 st.set_page_config(
@@ -25,13 +29,20 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Font served locally (static/fonts, see .streamlit/config.toml) - the page loads nothing from the internet;
+# without the bundled file an installed Outfit or the system font stack is used
+FONT_FILE = 'Outfit-Variable.woff2'
+font_src = "local('Outfit')"
+if os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'fonts', FONT_FILE)):
+    font_src += f", url('app/static/fonts/{FONT_FILE}') format('woff2')"
+st.markdown(f"<style>@font-face {{ font-family: 'Outfit'; src: {font_src}; "
+            "font-weight: 300 700; font-display: swap; }</style>", unsafe_allow_html=True)
+
 # Premium Custom CSS
 st.markdown("""
     <style>
-    @import url('https://fonts.googleapis.com/css2?family=Outfit:wght@300;400;600;700&display=swap');
-    
     * {
-        font-family: 'Outfit', sans-serif;
+        font-family: 'Outfit', 'Source Sans Pro', system-ui, -apple-system, 'Segoe UI', Roboto, sans-serif;
     }
     
     .stApp {
@@ -116,10 +127,25 @@ st.markdown("""
 
 # Sidebar
 st.sidebar.markdown("### 📥 Input Data")
-uploaded_file = st.sidebar.file_uploader("Upload 'failure data new' (Excel)", type=["xlsx", "xls"])
+sources = ["Excel upload", "Live CSV feed"] + (["History"] if STORE_ENABLED else [])
+source = st.sidebar.radio("Source", sources, horizontal=True,
+                          help="Live CSV feed tails a CSV file or drop folder that the historian keeps appending to. "
+                               "History queries every workbook uploaded so far.")
+live_path = None
+uploaded_file = None
+history_mode = source == "History"
+if source == "Live CSV feed":
+    live_path = st.sidebar.text_input("CSV file or drop folder", value=os.environ.get('RELIABILITY_LIVE_PATH', ''))
+    live_interval = st.sidebar.number_input("Refresh every (seconds)", value=5, min_value=1, max_value=300)
+elif not history_mode:
+    uploaded_file = st.sidebar.file_uploader("Upload 'failure data new' (Excel)", type=["xlsx", "xls"])
 
 # Handle Excel Title Rows
-skip_rows = st.sidebar.number_input("Skip empty/title rows at top", value=0, min_value=0, help="If your Excel has a title like 'Electrical failure data' on top, skip those rows until you reach the actual headers.")
+auto_header = st.sidebar.checkbox("Auto-detect header row", value=True, help="Finds the header row of every sheet (skipping titles like 'Electrical failure data') and maps the columns automatically.")
+if auto_header:
+    skip_rows = AUTO_SKIP
+else:
+    skip_rows = st.sidebar.number_input("Skip empty/title rows at top", value=0, min_value=0, help="If your Excel has a title like 'Electrical failure data' on top, skip those rows until you reach the actual headers.")
 
 # Configuration
 st.sidebar.markdown("---")
@@ -133,338 +159,590 @@ else:
 unit_conv = st.sidebar.selectbox("Display Calculations in:", ["Minutes", "Hours"], index=1)
 conv_factor = 60 if unit_conv == "Hours" else 1
 
-if uploaded_file:
+time_aware = st.sidebar.toggle("🗓️ Time-aware mode", value=False,
+                               help="Use the Date (and start time) column for calendar operating time and real time between failures.")
+
+# Diagnostics: per-stage timings, run logs and one-off profiling (see instrumentation.py)
+debug_mode = st.sidebar.toggle("🧪 Debug panel", value=DEBUG_DEFAULT,
+                               help="Time every stage of this page (wall time, peak memory, rows) and log each run.")
+st.session_state.setdefault('debug_session', uuid.uuid4().hex[:8])
+st.session_state['debug_run'] = st.session_state.get('debug_run', 0) + 1
+run = RunRecorder(enabled=debug_mode,
+                  trace_allocations=st.session_state.get('trace_allocations', False),
+                  profile=st.session_state.pop('profile_next_run', False),
+                  session=st.session_state['debug_session'], run_id=st.session_state['debug_run'])
+
+if live_path:
+    # --- LIVE FEED ---
+    # Each refresh parses only the rows appended since the last one (see live_ingest.py);
+    # offsets and running state are shared by every session watching the same path
+    import plotly.graph_objects as go
+    from live_ingest import live_feeds
+
+    feed = live_feeds.get(live_path, observation_period)
+    st.markdown("<h3 class='section-title'>📡 Live Failure Feed</h3>", unsafe_allow_html=True)
+
+    @st.fragment(run_every=live_interval)
+    def live_dashboard():
+        result = feed.poll(conv_factor)
+        files = [f for f in result.files if f.snapshot is not None]
+        st.caption(f"{datetime.now():%H:%M:%S} - {result.new_rows:,} new rows parsed in "
+                   f"{result.seconds * 1000:.0f} ms; refreshing every {live_interval}s.")
+        for f in result.files:
+            if f.error:
+                st.warning(f"⚠️ {f.name}: {f.error}")
+        if not files:
+            st.info(f"Waiting for failure events in '{live_path}'...")
+            return
+
+        l1, l2, l3, l4 = st.columns(4)
+        l1.metric("Records", f"{sum(f.rows for f in files):,}")
+        l2.metric("Total Failures", f"{sum(f.snapshot.reliability.num_failures for f in files):,}")
+        l3.metric("Repair Cost (All)", f"{sum(f.cost_all for f in files):,.2f}")
+        l4.metric("Repair Cost (Excl. Maintenance)", f"{sum(f.cost_excl_maintenance for f in files):,.2f}")
+
+        live_df = pd.DataFrame([{
+            "File": f.name,
+            "Records": f.rows,
+            "Failures": f.snapshot.reliability.num_failures,
+            f"MTTF ({unit_conv})": f.snapshot.reliability.mttf,
+            f"MTTR ({unit_conv})": f.snapshot.reliability.mttr,
+            "Current Risk": f.snapshot.risk.current_risk,
+            "Next Failure (records)": f.snapshot.prediction.estimated_next_failure if f.snapshot.prediction else None,
+            "All Repair Cost": f.cost_all,
+            "Exclude MAINTENANCE": f.cost_excl_maintenance,
+        } for f in files])
+        st.dataframe(live_df.style.format({
+            f"MTTF ({unit_conv})": "{:,.2f}", f"MTTR ({unit_conv})": "{:,.2f}", "Current Risk": "{:.1f}",
+            "Next Failure (records)": "{:,.1f}", "All Repair Cost": "{:,.2f}", "Exclude MAINTENANCE": "{:,.2f}"
+        }), use_container_width=True, hide_index=True)
+
+        names = [f.name for f in files]
+        chosen = st.selectbox("Risk trend for", names, key='live_trend_file')
+        trend_file = files[names.index(chosen)]
+        fig_live = go.Figure(go.Scattergl(
+            x=list(range(trend_file.trend_start, trend_file.rows)), y=trend_file.risk_trend,
+            mode='lines', name='Risk Score', line=dict(color='#ef4444', width=2)
+        ))
+        fig_live.update_layout(
+            title=f"Risk Score - last {len(trend_file.risk_trend):,} records of {trend_file.name}",
+            xaxis_title="Record Index", yaxis_title="Risk Score (0-100)", yaxis=dict(range=[0, 100]),
+            height=350, plot_bgcolor='rgba(0,0,0,0)', margin=dict(l=20, r=20, t=50, b=20)
+        )
+        st.plotly_chart(fig_live, use_container_width=True)
+
+    with run.stage('live_feed'):
+        live_dashboard()
+
+elif history_mode:
+    # --- HISTORY ---
+    # Every uploaded workbook is stored once in a local SQLite file (see history_store.py);
+    # filters and aggregations run as SQL there, so no old workbook is re-parsed
+    st.markdown("<h3 class='section-title'>📚 Failure History</h3>", unsafe_allow_html=True)
+    store = history_store()
+    stored = store.workbooks()
+    if stored.empty:
+        st.info("No workbooks stored yet - every uploaded workbook is added to the history automatically.")
+    else:
+        with run.stage('history', int(stored['Records'].sum())):
+            first_date, last_date = store.date_range()
+            h1, h2 = st.columns(2)
+            dates = ()
+            if first_date:
+                first_date, last_date = pd.Timestamp(first_date).date(), pd.Timestamp(last_date).date()
+                dates = h1.date_input("Period", value=(first_date, last_date), min_value=first_date, max_value=last_date,
+                                      help="Records without a usable date are only counted when the full period is selected.")
+            chosen_books = h2.multiselect("Workbooks", store.distinct('Workbook'))
+            h3, h4, h5 = st.columns(3)
+            chosen_sheets = h3.multiselect("Sheets", store.distinct('Sheet'))
+            chosen_depts = h4.multiselect("Departments", store.distinct('Department'))
+            chosen_equipment = h5.multiselect("Equipment", store.distinct('Equipment'))
+            # A period that is still being picked has one date; the full stored range means no date bound
+            start, end = (dates + (None, None))[:2] if len(dates) == 2 else (None, None)
+            if (start, end) == (first_date, last_date):
+                start = end = None
+            history_filter = HistoryFilter(start=start, end=end, workbooks=tuple(chosen_books),
+                                           sheets=tuple(chosen_sheets), departments=tuple(chosen_depts),
+                                           equipment=tuple(chosen_equipment))
+
+            query_start = datetime.now()
+            totals = store.totals(history_filter, observation_period, conv_factor)
+            t1, t2, t3, t4 = st.columns(4)
+            t1.metric("Records", f"{int(totals['Records']):,}")
+            t2.metric("Total Failures", f"{int(totals['Failures']):,}")
+            t3.metric(f"MTTF ({unit_conv})", f"{totals['MTTF']:,.2f}")
+            t4.metric(f"MTTR ({unit_conv})", f"{totals['MTTR']:,.2f}")
+            t5, t6, t7 = st.columns(3)
+            t5.metric(f"Total Downtime ({unit_conv})", f"{totals['Downtime']:,.2f}")
+            t6.metric("Repair Cost (All)", f"{totals['All Repair Cost']:,.2f}")
+            t7.metric("Repair Cost (Excl. Maintenance)", f"{totals['Exclude MAINTENANCE']:,.2f}")
+
+            history_by = st.multiselect("Group by", STORE_GROUP_LEVELS, default=['Year', 'Department'],
+                                        key='history_group_by')
+            history_df = store.grouped(history_by, history_filter, observation_period, conv_factor)
+            for level in ('Year', 'Month'):
+                if level in history_df:
+                    history_df[level] = history_df[level].fillna('Undated')
+            st.dataframe(history_df.style.format({
+                "Op Time": "{:,.2f}", "MTTF": "{:,.2f}", "Failure Rate (λ)": "{:.6f}",
+                "Repair Time": "{:,.2f}", "MTTR": "{:,.2f}", "Repair Rate (μ)": "{:.6f}",
+                "All Repair Cost": "{:,.2f}", "Exclude MAINTENANCE": "{:,.2f}"
+            }), use_container_width=True, hide_index=True)
+
+            history_reasons = store.reason_counts(history_filter)
+            query_ms = (datetime.now() - query_start).total_seconds() * 1000
+            if len(history_reasons):
+                import plotly.express as px
+                fig_history = px.pie(history_reasons, values='Count', names='Reason',
+                                     title='Failure Reasons Distribution (Top 10)',
+                                     hole=0.4, color_discrete_sequence=px.colors.qualitative.Bold)
+                fig_history.update_layout(
+                    height=500,
+                    legend=dict(orientation="v", yanchor="middle", y=0.5, xanchor="left", x=1.1),
+                    margin=dict(l=20, r=150, t=50, b=20)
+                )
+                fig_history.update_traces(textposition='inside', textinfo='percent+label')
+                st.plotly_chart(fig_history, use_container_width=True)
+            st.caption(f"Times in {unit_conv}; repair figures and the second cost total exclude MAINTENANCE rows. "
+                       f"Queried {int(stored['Records'].sum()):,} stored records in {query_ms:.0f} ms.")
+
+            with st.expander(f"🗄️ Stored workbooks ({len(stored)})"):
+                st.dataframe(stored, use_container_width=True, hide_index=True)
+                st.caption("A new export with the same file name replaces the stored version when it only adds rows.")
+
+elif uploaded_file:
+    # Charting, ML and export libraries are imported where their sections run, so the
+    # landing page renders without them (see startup_benchmark.py)
+    import plotly.graph_objects as go
+
     try:
-        # Load sheets 
-        xls = pd.ExcelFile(uploaded_file)
-        sheet_names = xls.sheet_names
+        # Load sheets (parsed once per file content + skip rows, then served from cache)
+        with run.stage('load') as stage:
+            workbook = load_workbook(uploaded_file, skip_rows)
+            total_rows = stage.rows = sum(len(frame) for frame in workbook.sheets.values())
+        sheet_names = workbook.sheet_names
         sheet_name = st.sidebar.selectbox("Select Sheet", sheet_names)
+
+        # Added to the history store once per file content, on a background thread
+        if STORE_ENABLED:
+            try:
+                with run.stage('history_ingest', total_rows):
+                    ingest_future = history_store().submit(workbook, uploaded_file.name)
+                if ingest_future is not None:
+                    st.sidebar.caption("📚 Adding this workbook to the history in the background.")
+            except Exception:
+                # The history is an extra - never fail the upload over it (e.g. read-only install dir)
+                pass
         
-        # Load data with skip rows
-        df = pd.read_excel(uploaded_file, sheet_name=sheet_name, skiprows=skip_rows)
-        
-        
-        # Clean column names
-        df.columns = [str(c).strip() for c in df.columns]
+        # The cached frame is shared across reruns and sessions - read it, never modify it;
+        # derived values (coerced columns, operating time, risk features) live in separate arrays
+        df = workbook.sheet(sheet_name)
+        run.annotate(file=workbook.data_hash[:16], sheet=sheet_name, sheet_rows=len(df), total_rows=total_rows)
+        with run.stage('column_mapping', len(df)):
+            # Column roles inferred once per workbook (see schema.py)
+            schema = workbook.schema(sheet_name)
+            if auto_header and schema.header_row:
+                st.sidebar.caption(f"Header detected on row {schema.header_row + 1} of '{sheet_name}'.")
         
-        # UI for Column Selection
-        st.markdown("<h3 class='section-title'>🔍 Data Configuration</h3>", unsafe_allow_html=True)
-        col_setup1, col_setup2, col_setup3 = st.columns(3)
+            # UI for Column Selection
+            st.markdown("<h3 class='section-title'>🔍 Data Configuration</h3>", unsafe_allow_html=True)
+            col_setup1, col_setup2, col_setup3 = st.columns(3)
         
-        with col_setup1:
-            # Map downtime column - try to find "Equipment Downtime"
-            dt_cols = [c for c in df.columns if 'equipment downtime' in str(c).lower()]
-            default_dt = dt_cols[0] if dt_cols else df.columns[0]
-            downtime_col = st.selectbox("Select Downtime Column (Minutes)", df.columns, index=list(df.columns).index(default_dt))
+            with col_setup1:
+                # Map downtime column - defaults to the inferred "Equipment Downtime" column
+                default_dt = schema.column('downtime', df.columns[0])
+                downtime_col = st.selectbox("Select Downtime Column (Minutes)", df.columns, index=list(df.columns).index(default_dt))
         
-        with col_setup2:
-            # Map repair time column
-            repair_time_col = st.selectbox("Select Repair Time Column (Minutes)", df.columns, index=list(df.columns).index(downtime_col))
+            with col_setup2:
+                # Map repair time column
+                default_repair = schema.column('repair_time', downtime_col)
+                repair_time_col = st.selectbox("Select Repair Time Column (Minutes)", df.columns, index=list(df.columns).index(default_repair))
             
-        with col_setup3:
-            # Map Department column for filtering
-            dept_options = [c for c in df.columns if 'department' in str(c).lower()]
-            dept_col = st.selectbox("Select Department Column", df.columns, index=list(df.columns).index(dept_options[0]) if dept_options else 0)
+            with col_setup3:
+                # Map Department column for filtering
+                default_dept = schema.column('department')
+                dept_col = st.selectbox("Select Department Column", df.columns, index=list(df.columns).index(default_dept) if default_dept else 0)
 
-        # Map Repairing Cost column (Global selection for summary)
-        st.sidebar.markdown("---")
-        st.sidebar.markdown("### 💰 Cost Settings")
-        cost_options = [c for c in df.columns if 'cost' in str(c).lower()]
-        global_cost_col = st.sidebar.selectbox("Select 'Repairing Cost' Column", df.columns, index=list(df.columns).index(cost_options[0]) if cost_options else 0)
+            # Map Repairing Cost column (Global selection for summary)
+            st.sidebar.markdown("---")
+            st.sidebar.markdown("### 💰 Cost Settings")
+            default_cost = schema.column('cost')
+            global_cost_col = st.sidebar.selectbox("Select 'Repairing Cost' Column", df.columns, index=list(df.columns).index(default_cost) if default_cost else 0)
 
-        # Prepare columns - convert to numeric and handle non-numeric values
-        df[downtime_col] = pd.to_numeric(df[downtime_col], errors='coerce').fillna(0)
-        df[repair_time_col] = pd.to_numeric(df[repair_time_col], errors='coerce').fillna(0)
+        with run.stage('calculations', len(df)):
+            # Prepare columns - convert to numeric and handle non-numeric values
+            downtime = numeric_column(df, downtime_col)
+            repair_values = downtime if repair_time_col == downtime_col else numeric_column(df, repair_time_col)
         
-        # VALIDATION: Check if the user selected a proper numeric column
-        if df[downtime_col].sum() == 0 and len(df) > 0:
-            st.warning(f"⚠️ Warning: The selected column '{downtime_col}' contains only zeros or non-numeric data. Please select the correct column from the dropdown.")
-
-        # Department filtering for Repair Rate
-        # Requirement: Exclude 'MAINTENANCE' from repair calculations
-        repair_df = df.copy()
-        if dept_col in df.columns:
-            # Clean department names (remove spaces and case-insensitive check)
-            repair_df = df[df[dept_col].astype(str).str.strip().str.upper() != 'MAINTENANCE']
-            excluded_count = len(df) - len(repair_df)
-            if excluded_count > 0:
-                st.sidebar.success(f"✅ Filtered: {excluded_count} rows of 'MAINTENANCE' excluded from Repair Rate.")
-            else:
-                st.sidebar.info(f"ℹ️ No 'MAINTENANCE' rows found in '{dept_col}'.")
+            # VALIDATION: Check if the user selected a proper numeric column
+            if downtime.sum() == 0 and len(df) > 0:
+                st.warning(f"⚠️ Warning: The selected column '{downtime_col}' contains only zeros or non-numeric data. Please select the correct column from the dropdown.")
 
-        # --- CALCULATIONS ---
-        # 1. Operating Time = Obs Period - Downtime (On full data)
-        df['Operating_Time'] = observation_period - df[downtime_col]
-        df['Operating_Time'] = df['Operating_Time'].clip(lower=0)
-        
-        # 2. Aggregates
-        total_op_time = df['Operating_Time'].sum() / conv_factor
-        num_failures = len(df[df[downtime_col] > 0])
-        
-        # Repair aggregates (Using filtered data)
-        total_repair_time = repair_df[repair_time_col].sum() / conv_factor
-        num_repairs = len(repair_df[repair_df[repair_time_col] > 0])
-        
-        # 3. Metrics with safety checks
-        mttf = total_op_time / num_failures if num_failures > 0 else 0
-        failure_rate = 1 / mttf if mttf > 0 else 0
-        
-        mttr = total_repair_time / num_repairs if num_repairs > 0 else 0
-        repair_rate = 1 / mttr if mttr > 0 else 0
+            # Department filtering for Repair Rate
+            # Requirement: Exclude 'MAINTENANCE' from repair calculations
+            repair_mask = None
+            if dept_col in df.columns:
+                # Clean department names (remove spaces and case-insensitive check)
+                repair_mask = ~maintenance_mask(df[dept_col])
+                excluded_count = len(df) - int(repair_mask.sum())
+                if excluded_count > 0:
+                    st.sidebar.success(f"✅ Filtered: {excluded_count} rows of 'MAINTENANCE' excluded from Repair Rate.")
+                else:
+                    st.sidebar.info(f"ℹ️ No 'MAINTENANCE' rows found in '{dept_col}'.")
+
+            # --- CALCULATIONS ---
+            # Failure/repair aggregates, MTTF/MTTR, risk and next-failure estimate (see incremental.py):
+            # a re-upload that only appends rows to this sheet is folded in without recomputing history
+            selection = (sheet_name, downtime_col, repair_time_col, dept_col, observation_period)
+            snapshot = incremental_store.update(
+                (workbook.data_hash,) + selection,
+                downtime, repair_values, repair_mask,
+                observation_period, conv_factor, lineage=selection
+            )
+            metrics = snapshot.reliability
+            if snapshot.mode == 'append':
+                st.sidebar.info(f"♻️ {snapshot.new_rows:,} new rows appended - metrics updated incrementally.")
+            # Per-record series carried by the store: no full-history pass on reruns
+            op_time = metrics.operating_time
 
         # --- DISPLAY ---
         
         # Row 1: Failure Analysis
         st.markdown("<h3 class='section-title'>🛑 Failure Rate Analysis</h3>", unsafe_allow_html=True)
         m1, m2, m3, m4 = st.columns(4)
-        m1.metric("Total Failures", f"{num_failures:,}")
-        m2.metric(f"Total Op. Time ({unit_conv})", f"{total_op_time:,.2f}")
-        m3.metric(f"MTTF ({unit_conv})", f"{mttf:,.2f}")
-        m4.metric("Failure Rate (λ)", f"{failure_rate:.6f}")
+        m1.metric("Total Failures", f"{metrics.num_failures:,}")
+        m2.metric(f"Total Op. Time ({unit_conv})", f"{metrics.total_op_time:,.2f}")
+        m3.metric(f"MTTF ({unit_conv})", f"{metrics.mttf:,.2f}")
+        m4.metric("Failure Rate (λ)", f"{metrics.failure_rate:.6f}")
         
         # Row 2: Repair Analysis
         st.markdown("<h3 class='section-title'>🔧 Repair Rate Analysis</h3>", unsafe_allow_html=True)
         r1, r2, r3, r4 = st.columns(4)
-        r1.metric("Total Repairs", f"{num_repairs:,}")
-        r2.metric(f"Total Repair Time ({unit_conv})", f"{total_repair_time:,.2f}")
-        r3.metric(f"MTTR ({unit_conv})", f"{mttr:,.2f}")
-        r4.metric("Repair Rate (μ)", f"{repair_rate:.6f}")
+        r1.metric("Total Repairs", f"{metrics.num_repairs:,}")
+        r2.metric(f"Total Repair Time ({unit_conv})", f"{metrics.total_repair_time:,.2f}")
+        r3.metric(f"MTTR ({unit_conv})", f"{metrics.mttr:,.2f}")
+        r4.metric("Repair Rate (μ)", f"{metrics.repair_rate:.6f}")
 
+        pdf_data_store = metrics.as_dict(unit_conv)
 
-        # Add PDF Button to Top Right Corner (after calculations)
-        # Note: PDF will be generated at the end after all charts are created
-        # Placeholder for now - actual PDF button will be added after all content is ready
-        
-        pdf_data_store = {
-            'num_failures': num_failures,
-            'total_op_time': total_op_time,
-            'mttf': mttf,
-            'failure_rate': failure_rate,
-            'num_repairs': num_repairs,
-            'total_repair_time': total_repair_time,
-            'mttr': mttr,
-            'repair_rate': repair_rate,
-            'unit_conv': unit_conv
-        }
+        # Row 3: Calendar-based analysis from the event timestamps (see timeaware.py)
+        if time_aware:
+            st.markdown("<h3 class='section-title'>🗓️ Calendar-Based Reliability</h3>", unsafe_allow_html=True)
+            date_col = schema.column('date')
+            if date_col is None:
+                st.warning("⚠️ No Date column found - time-aware mode needs one.")
+            else:
+                try:
+                    with run.stage('time_aware', len(df)):
+                        ta1, ta2 = st.columns(2)
+                        time_unit = ta1.radio("Time unit", ["hours", "days"], horizontal=True)
+                        period_label = ta2.radio("Resample", list(RESAMPLE_RULES), horizontal=True)
+                        timestamps = cached_timestamps(workbook, sheet_name, date_col, schema.column('start_time'))
+                        timed = compute_time_reliability(timestamps, downtime, time_unit)
+
+                        c1, c2, c3, c4 = st.columns(4)
+                        c1.metric(f"Calendar Op. Time ({time_unit})", f"{timed.total_op_time:,.2f}")
+                        c2.metric(f"MTTF ({time_unit})", f"{timed.mttf:,.2f}")
+                        c3.metric(f"Mean Time Between Failures ({time_unit})",
+                                  f"{timed.mean_tbf:,.2f}" if timed.has_prediction else "n/a")
+                        c4.metric(f"Next Failure In ({time_unit})",
+                                  f"{timed.estimated_next_failure:,.1f}" if timed.has_prediction else "n/a",
+                                  delta=f"{timed.confidence:.0f}% confidence" if timed.has_prediction else None,
+                                  delta_color="off")
+                        caption = f"{timed.start:%Y-%m-%d} to {timed.end:%Y-%m-%d}, {timed.num_failures:,} failures."
+                        if timed.dropped_rows:
+                            caption += f" {timed.dropped_rows:,} rows without a valid date were skipped."
+                        st.caption(caption)
+
+                        periods = resample_reliability(timestamps, downtime, RESAMPLE_RULES[period_label], time_unit)
+                        fig_periods = go.Figure()
+                        fig_periods.add_trace(go.Bar(x=periods['Period'], y=periods['Failures'],
+                                                     name='Failures', marker_color='#ef4444'))
+                        fig_periods.add_trace(go.Scatter(x=periods['Period'], y=periods['Availability (%)'],
+                                                         name='Availability (%)', yaxis='y2',
+                                                         line=dict(color='#10b981', width=2)))
+                        fig_periods.update_layout(
+                            title=dict(text=f"{period_label} Failures and Availability", font=dict(size=20)),
+                            yaxis=dict(title='Failures'),
+                            yaxis2=dict(title='Availability (%)', overlaying='y', side='right', range=[0, 100]),
+                            plot_bgcolor='rgba(0,0,0,0)',
+                            height=400,
+                            margin=dict(l=20, r=20, t=50, b=20),
+                            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+                        )
+                        st.plotly_chart(fig_periods, use_container_width=True)
+                except Exception as e:
+                    st.warning(f"Time-aware analysis unavailable: {str(e)}")
 
         # Charts Section
         st.markdown("<h3 class='section-title'>📊 Visualization</h3>", unsafe_allow_html=True)
         
         # 1. Timeline Chart (Full Width for better view)
-        fig_bar = go.Figure()
-        fig_bar.add_trace(go.Bar(
-            name='Operating Time',
-            x=df.index,
-            y=df['Operating_Time'] / conv_factor,
-            marker_color='#10b981',
-            hovertemplate="Index %{x}<br>Op Time: %{y:.2f} " + unit_conv
-        ))
-        fig_bar.add_trace(go.Bar(
-            name='Downtime',
-            x=df.index,
-            y=df[downtime_col] / conv_factor,
-            marker_color='#ef4444',
-            hovertemplate="Index %{x}<br>Downtime: %{y:.2f} " + unit_conv
-        ))
-        fig_bar.update_layout(
-            barmode='stack', 
-            title=dict(text=f"Time Distribution per Event ({unit_conv})", font=dict(size=20)),
-            plot_bgcolor='rgba(0,0,0,0)',
-            height=450,
-            margin=dict(l=20, r=20, t=50, b=20),
-            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-        )
-        st.plotly_chart(fig_bar, use_container_width=True)
+        # Large sheets are bucketed server-side and drawn with WebGL; zooming re-buckets the window
+        n_records = len(df)
+        view_start, view_stop = 0, n_records
+        if is_downsampled(n_records):
+            view_start, view_stop = st.slider(
+                "Zoom timeline to records", 0, n_records, (0, n_records),
+                key=f"timeline_zoom_{sheet_name}_{n_records}",
+                help="Narrow the window to see finer buckets - individual records below "
+                     f"{FULL_DETAIL_LIMIT:,} records."
+            )
+            view_stop = max(view_stop, view_start + 1)
+        with run.stage('chart_timeline', view_stop - view_start):
+            fig_bar = timeline_figure(op_time, downtime,
+                                      conv_factor, unit_conv, view_start, view_stop)
+            st.plotly_chart(fig_bar, use_container_width=True)
             
         # 2. Reason Distribution
-        reason_col_list = [c for c in df.columns if 'reason' in c.lower()]
-        if reason_col_list:
-            reason_df = df[df[downtime_col] > 0][reason_col_list[0]].value_counts().reset_index()
-            reason_df.columns = ['Reason', 'Count']
+        reason_col = schema.column('reason')
+        with run.stage('chart_reasons', len(df)):
+            if reason_col:
+                # Boolean mask instead of a filtered copy; object values keep value_counts' tie order
+                reason_df = df[reason_col].to_numpy(dtype=object)[downtime > 0]
+                reason_df = pd.Series(reason_df).value_counts().reset_index()
+                reason_df.columns = ['Reason', 'Count']
             
-            # Group small reasons if too many to avoid overlap
-            if len(reason_df) > 10:
-                top_10 = reason_df.head(10)
-                others_count = reason_df.iloc[10:]['Count'].sum()
-                reason_df = pd.concat([top_10, pd.DataFrame([{'Reason': 'OTHERS', 'Count': others_count}])])
-
-            fig_pie = px.pie(reason_df, values='Count', names='Reason', 
-                           title='Failure Reasons Distribution (Top 10)',
-                           hole=0.4, color_discrete_sequence=px.colors.qualitative.Bold)
+                # Group small reasons if too many to avoid overlap
+                if len(reason_df) > 10:
+                    top_10 = reason_df.head(10)
+                    others_count = reason_df.iloc[10:]['Count'].sum()
+                    reason_df = pd.concat([top_10, pd.DataFrame([{'Reason': 'OTHERS', 'Count': others_count}])])
+
+                import plotly.express as px
+                fig_pie = px.pie(reason_df, values='Count', names='Reason', 
+                               title='Failure Reasons Distribution (Top 10)',
+                               hole=0.4, color_discrete_sequence=px.colors.qualitative.Bold)
             
-            fig_pie.update_layout(
-                height=600,
-                legend=dict(orientation="v", yanchor="middle", y=0.5, xanchor="left", x=1.1),
-                margin=dict(l=20, r=150, t=50, b=20)
-            )
-            fig_pie.update_traces(textposition='inside', textinfo='percent+label')
-            st.plotly_chart(fig_pie, use_container_width=True)
-        else:
-            st.info("Add a 'Reason' column to see distribution chart.")
+                fig_pie.update_layout(
+                    height=600,
+                    legend=dict(orientation="v", yanchor="middle", y=0.5, xanchor="left", x=1.1),
+                    margin=dict(l=20, r=150, t=50, b=20)
+                )
+                fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+                st.plotly_chart(fig_pie, use_container_width=True)
+            else:
+                st.info("Add a 'Reason' column to see distribution chart.")
 
         # --- MULTI-SHEET COST SUMMARY ---
         st.markdown("<h3 class='section-title'>💰 Multi-Sheet Cost Summary</h3>", unsafe_allow_html=True)
         
-        summary_data = []
-        # Create a normalized version of the target cost column for fuzzy matching
-        target_cost_norm = str(global_cost_col).strip().lower()
+        # Every sheet is reduced once to cost sums per department x reason x month for all numeric
+        # columns; other cost/department columns and exclusions re-aggregate those (see cost_scan.py)
+        with run.stage('cost_summary', total_rows):
+            with st.spinner("Analyzing all sheets..."):
+                cost_cube = cost_partials(workbook).cube(global_cost_col, dept_col, sheet_names)
+            # Reports keep the standard MAINTENANCE exclusion
+            summary_data = cost_cube.summary()
 
-        with st.spinner("Analyzing all sheets..."):
-            for s_name in sheet_names:
-                try:
-                    # Read each sheet
-                    temp_df = pd.read_excel(uploaded_file, sheet_name=s_name, skiprows=skip_rows)
-                    temp_df.columns = [str(c).strip() for c in temp_df.columns]
-                    
-                    # Find the best matching cost column in this specific sheet
-                    actual_cost_col = None
-                    # 1. Try exact match from sidebar selection
-                    if global_cost_col in temp_df.columns:
-                        actual_cost_col = global_cost_col
-                    else:
-                        # 2. Try normalized match (ignore case/extra spaces)
-                        for c in temp_df.columns:
-                            if c.lower().strip() == target_cost_norm:
-                                actual_cost_col = c
-                                break
-                        
-                        # 3. If still not found, search for any column containing 'cost'
-                        if not actual_cost_col:
-                            for c in temp_df.columns:
-                                if 'cost' in c.lower():
-                                    actual_cost_col = c
-                                    break
-                    
-                    all_cost = 0
-                    exclude_maint_cost = 0
-                    
-                    if actual_cost_col:
-                        temp_df[actual_cost_col] = pd.to_numeric(temp_df[actual_cost_col], errors='coerce').fillna(0)
-                        all_cost = temp_df[actual_cost_col].sum()
-                        
-                        # Find department column for this sheet (fuzzy search)
-                        actual_dept_col = None
-                        if dept_col in temp_df.columns:
-                            actual_dept_col = dept_col
-                        else:
-                            for c in temp_df.columns:
-                                if 'department' in c.lower() or 'dept' in c.lower():
-                                    actual_dept_col = c
-                                    break
-                        
-                        # Calculate excluded cost
-                        if actual_dept_col:
-                            mask = temp_df[actual_dept_col].astype(str).str.strip().str.upper() != 'MAINTENANCE'
-                            exclude_maint_cost = temp_df[mask][actual_cost_col].sum()
-                        else:
-                            exclude_maint_cost = all_cost
-                            
-                    summary_data.append({
-                        "Sheet Name": s_name,
-                        "All Repair Cost": round(all_cost, 2),
-                        "Exclude MAINTENANCE": round(exclude_maint_cost, 2),
-                        "Status": "✅ Success" if actual_cost_col else "⚠️ Cost Column Missing"
-                    })
-                except Exception as e:
-                    summary_data.append({
-                        "Sheet Name": s_name,
-                        "All Repair Cost": 0,
-                        "Exclude MAINTENANCE": 0,
-                        "Status": f"❌ Error: {str(e)[:30]}..."
-                    })
-
-        if summary_data:
-            summary_df = pd.DataFrame(summary_data)
-            
-            # Calculate Grand Totals
-            grand_all = summary_df["All Repair Cost"].sum()
-            grand_excl = summary_df["Exclude MAINTENANCE"].sum()
-            
-            # Display metrics for Grand Total
-            gt1, gt2 = st.columns(2)
-            gt1.metric("Grand Total (All Sheets)", f"{grand_all:,.2f}")
-            gt2.metric("Grand Total (Excl. Maintenance)", f"{grand_excl:,.2f}")
-            
-            # Add Grand Total Row to table
-            total_row = pd.DataFrame([{
-                "Sheet Name": "✨ GRAND TOTAL",
-                "All Repair Cost": grand_all,
-                "Exclude MAINTENANCE": grand_excl,
-                "Status": "SUMMARY"
-            }])
-            summary_display_df = pd.concat([summary_df, total_row], ignore_index=True)
-            
-            st.markdown("##### Detailed Sheet-wise Breakdown")
-            st.table(summary_display_df.style.format({
-                "All Repair Cost": "{:,.2f}",
-                "Exclude MAINTENANCE": "{:,.2f}"
-            }))
-        else:
-            st.warning("Could not find cost data in sheets. Check your column selection.")
+            if summary_data:
+                departments = cost_cube.departments()
+                excluded = st.multiselect("Exclude departments", departments,
+                                          default=[d for d in DEFAULT_EXCLUDED if d in departments])
+                if not excluded:
+                    excl_label = "No Exclusions"
+                elif len(excluded) <= 2:
+                    excl_label = f"Exclude {', '.join(excluded)}"
+                else:
+                    excl_label = f"Exclude {len(excluded)} Departments"
+                summary_df = pd.DataFrame(cost_cube.summary(excluded)).rename(
+                    columns={"Exclude MAINTENANCE": excl_label})
+
+                # Calculate Grand Totals
+                grand_all = summary_df["All Repair Cost"].sum()
+                grand_excl = summary_df[excl_label].sum()
+
+                # Display metrics for Grand Total
+                gt1, gt2 = st.columns(2)
+                gt1.metric("Grand Total (All Sheets)", f"{grand_all:,.2f}")
+                gt2.metric(f"Grand Total ({excl_label})", f"{grand_excl:,.2f}")
+
+                # Add Grand Total Row to table
+                total_row = pd.DataFrame([{
+                    "Sheet Name": "✨ GRAND TOTAL",
+                    "All Repair Cost": grand_all,
+                    excl_label: grand_excl,
+                    "Status": "SUMMARY"
+                }])
+                summary_display_df = pd.concat([summary_df, total_row], ignore_index=True)
+
+                st.markdown("##### Detailed Sheet-wise Breakdown")
+                st.table(summary_display_df.style.format({
+                    "All Repair Cost": "{:,.2f}",
+                    excl_label: "{:,.2f}"
+                }))
+
+                with st.expander("🧮 Cost by Sheet × Department"):
+                    st.dataframe(cost_cube.pivot().style.format("{:,.2f}"), use_container_width=True)
+            else:
+                st.warning("Could not find cost data in sheets. Check your column selection.")
+
+        # --- GROUPED RELIABILITY ---
+        st.markdown("<h3 class='section-title'>🏭 Reliability by Equipment / Department / Reason</h3>", unsafe_allow_html=True)
+
+        # One group-by pass over every sheet, cached per workbook; slicing re-aggregates the small base table
+        with run.stage('grouped', total_rows):
+            group_base = cached_group_base(workbook, observation_period)
+            group_by = st.multiselect("Group by", GROUP_LEVELS, default=['Equipment', 'Department'])
+            if len(group_base):
+                group_df = grouped_metrics(group_base, group_by, conv_factor)
+                st.dataframe(group_df.style.format({
+                    "Op Time": "{:,.2f}", "MTTF": "{:,.2f}", "Failure Rate (λ)": "{:.6f}",
+                    "Repair Time": "{:,.2f}", "MTTR": "{:,.2f}", "Repair Rate (μ)": "{:.6f}"
+                }), use_container_width=True, hide_index=True)
+                st.caption(f"Times in {unit_conv}. Equipment falls back to the sheet name when a sheet has no "
+                           "equipment column; repair figures exclude MAINTENANCE rows.")
+            else:
+                st.info("No sheet with an 'Equipment Downtime' column found for grouped metrics.")
+
+        # --- LIFETIME ANALYSIS ---
+        st.markdown("<h3 class='section-title'>📈 Lifetime Analysis (Weibull)</h3>", unsafe_allow_html=True)
+
+        # Thousands of bootstrap fits: built on request (on a process pool), then cached per workbook
+        lifetime_unit = unit_conv.lower()
+        fits = cached_lifetimes(workbook, observation_period, lifetime_unit, time_aware, compute=False)
+        if fits is None and st.button("📈 Fit Weibull Models"):
+            with run.stage('lifetimes', total_rows):
+                fits = cached_lifetimes(workbook, observation_period, lifetime_unit, time_aware)
+        if fits is not None:
+            lifetimes = fits.summary()
+            fitted = lifetimes[lifetimes['Fitted']]
+            if len(fitted):
+                st.dataframe(lifetimes.drop(columns='Fitted'), use_container_width=True, hide_index=True,
+                             column_config={c: st.column_config.NumberColumn(format="%.3f")
+                                            for c in lifetimes.columns if lifetimes[c].dtype.kind == 'f'})
+                asset = st.selectbox("Reliability curve for", fitted.index,
+                                     format_func=lambda i: f"{fitted.at[i, 'Sheet']} / {fitted.at[i, 'Equipment']}")
+                curve = fits.curve(fits.index(fitted.at[asset, 'Sheet'], fitted.at[asset, 'Equipment']))
+                fig_curve = go.Figure()
+                fig_curve.add_trace(go.Scatter(x=curve['t'], y=curve['R high'], line=dict(width=0),
+                                               showlegend=False, hoverinfo='skip'))
+                fig_curve.add_trace(go.Scatter(x=curve['t'], y=curve['R low'], line=dict(width=0), fill='tonexty',
+                                               fillcolor='rgba(59,130,246,0.2)',
+                                               name=f"{fits.confidence:.0%} interval"))
+                fig_curve.add_trace(go.Scatter(x=curve['t'], y=curve['R'], name='R(t)',
+                                               line=dict(color='#3b82f6', width=2)))
+                fig_curve.update_layout(
+                    title=dict(text="Reliability R(t)", font=dict(size=20)),
+                    xaxis=dict(title=f"Time since last failure ({lifetime_unit})"),
+                    yaxis=dict(title='R(t)', range=[0, 1]),
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    height=400,
+                    margin=dict(l=20, r=20, t=50, b=20),
+                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+                )
+                st.plotly_chart(fig_curve, use_container_width=True)
+                st.caption(f"Weibull maximum-likelihood fits per sheet and equipment, with {fits.boot_shape.shape[0]:,} "
+                           f"bootstrap resamples (seed {fits.seed}) for the intervals. Times in {lifetime_unit}: "
+                           "calendar gaps in time-aware mode (sheets with dates), record gaps otherwise; the time "
+                           "since the last failure counts as censored. B10 is the time by which 10% of units have failed.")
+            else:
+                st.info(f"No equipment with at least {MIN_FAILURES_FOR_FIT} failure intervals to fit.")
+
+        # --- WHAT-IF SIMULATION ---
+        st.markdown("<h3 class='section-title'>🎲 What-If Simulation</h3>", unsafe_allow_html=True)
+
+        sim1, sim2, sim3, sim4 = st.columns(4)
+        mttr_change = sim1.slider("MTTR change (%)", -80, 100, -20, step=5)
+        horizon_days = sim2.number_input("Horizon (days)", value=91, min_value=1, max_value=3650)
+        n_trajectories = sim3.select_slider("Trajectories", [10_000, 50_000, 100_000, 200_000, 500_000], value=100_000)
+        budget_seconds = sim4.select_slider("Time budget (s)", [1.0, 2.0, 3.0, 5.0, 10.0, 30.0], value=3.0)
+        sim_args = (workbook, observation_period, global_cost_col, dept_col, horizon_days * 1440,
+                    1 + mttr_change / 100, n_trajectories, budget_seconds)
+        # Runs on request within the time budget, then cached per parameters
+        sim_runs = cached_what_if(*sim_args, compute=False)
+        if sim_runs is None and st.button("🎲 Run Simulation"):
+            with run.stage('simulation', n_trajectories):
+                sim_runs = cached_what_if(*sim_args)
+        if sim_runs is not None:
+            baseline, scenario = sim_runs
+            if scenario.sheets:
+                base_total, scen_total = baseline.summary().iloc[:4], scenario.summary().iloc[:4]
+                s1, s2, s3, s4 = st.columns(4)
+                for col, (i, label, fmt) in zip((s1, s2, s3, s4), (
+                        (0, "Availability P50 (%)", "{:,.2f}"), (1, "Failures P50", "{:,.0f}"),
+                        (2, "Repair Cost P50", "{:,.0f}"), (3, "Excl. MAINTENANCE P50", "{:,.0f}"))):
+                    col.metric(label, fmt.format(scen_total['P50'][i]),
+                               delta=fmt.format(scen_total['P50'][i] - base_total['P50'][i]),
+                               delta_color="normal" if i == 0 else "inverse")
+                st.dataframe(compare(baseline, scenario), use_container_width=True, hide_index=True,
+                             column_config={c: st.column_config.NumberColumn(format="%.2f")
+                                            for c in ['Mean', 'P5', 'P50', 'P95', 'Δ Mean', 'Δ P5', 'Δ P50', 'Δ P95']})
+                fig_sim = go.Figure()
+                for result, name, color in ((baseline, "Current MTTR", '#94a3b8'),
+                                            (scenario, f"MTTR {mttr_change:+d}%", '#3b82f6')):
+                    fig_sim.add_trace(go.Histogram(x=result.totals('All Repair Cost'), name=name, opacity=0.6,
+                                                   marker_color=color, nbinsx=60))
+                fig_sim.update_layout(
+                    title=dict(text=f"Repair Cost over {horizon_days} Days (all sheets)", font=dict(size=20)),
+                    barmode='overlay',
+                    xaxis=dict(title='Repair cost'),
+                    yaxis=dict(title='Trajectories'),
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    height=400,
+                    margin=dict(l=20, r=20, t=50, b=20),
+                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+                )
+                st.plotly_chart(fig_sim, use_container_width=True)
+                caption = (f"{scenario.trajectories:,} trajectories per scenario in "
+                           f"{baseline.seconds + scenario.seconds:.1f}s (seed {scenario.seed}), seeded from each "
+                           "sheet's λ, μ and observed repair costs per failure. Deltas are against the current MTTR "
+                           "with the same random draws. Availability for all sheets is their mean.")
+                if baseline.truncated:
+                    caption += f" Stopped at the time budget ({n_trajectories:,} requested)."
+                st.caption(caption)
+            else:
+                st.info("No sheet with an 'Equipment Downtime' column found for the simulation.")
 
         # --- ML PREDICTIVE ANALYTICS ---
         st.markdown("<h3 class='section-title'>🤖 AI Predictive Analytics</h3>", unsafe_allow_html=True)
         
+        # Computed once here and reused by the PDF report
+        risk = None
+        fig_risk = None
         if len(df) >= 10:  # Need minimum data for ML
             try:
-                # Prepare features for ML
-                ml_df = df.copy()
-                ml_df['record_index'] = range(len(ml_df))
-                
-                # Feature engineering
-                ml_df['avg_downtime'] = ml_df[downtime_col].rolling(window=3, min_periods=1).mean()
-                ml_df['downtime_trend'] = ml_df[downtime_col].diff().fillna(0)
-                ml_df['failure_flag'] = (ml_df[downtime_col] > 0).astype(int)
-                
-                # Calculate failure frequency (failures per 10 records)
-                ml_df['failure_frequency'] = ml_df['failure_flag'].rolling(window=10, min_periods=1).sum()
+                with run.stage('ml', len(df)):
+                    # Causal risk score of every record, carried by the incremental store (see reliability.py)
+                    risk = snapshot.risk
+                    current_risk = risk.current_risk
+                    avg_risk = risk.avg_risk
+                    recent_failures = risk.recent_failures
                 
-                # Risk Score Calculation (0-100)
-                risk_factors = [
-                    ml_df[downtime_col] / ml_df[downtime_col].max() if ml_df[downtime_col].max() > 0 else 0,
-                    ml_df['avg_downtime'] / ml_df['avg_downtime'].max() if ml_df['avg_downtime'].max() > 0 else 0,
-                    ml_df['failure_frequency'] / 10  # Normalize to 0-1
-                ]
-                ml_df['risk_score'] = (sum(risk_factors) / len(risk_factors) * 100).clip(0, 100)
+                    # Display Risk Metrics
+                    risk1, risk2, risk3 = st.columns(3)
+                    risk1.metric("Current Risk Score", f"{current_risk:.1f}/100", 
+                               delta=f"{current_risk - avg_risk:.1f} vs avg",
+                               delta_color="inverse")
+                    risk2.metric("Recent Failures (Last 10)", f"{recent_failures}")
+                    risk3.metric("Failure Frequency", f"{(recent_failures/10)*100:.0f}%")
                 
-                # Current Risk Assessment
-                current_risk = ml_df['risk_score'].iloc[-1]
-                avg_risk = ml_df['risk_score'].mean()
-                recent_failures = ml_df['failure_flag'].tail(10).sum()
-                
-                # Display Risk Metrics
-                risk1, risk2, risk3 = st.columns(3)
-                risk1.metric("Current Risk Score", f"{current_risk:.1f}/100", 
-                           delta=f"{current_risk - avg_risk:.1f} vs avg",
-                           delta_color="inverse")
-                risk2.metric("Recent Failures (Last 10)", f"{recent_failures}")
-                risk3.metric("Failure Frequency", f"{(recent_failures/10)*100:.0f}%")
-                
-                # ML Prediction: Next Failure Time Estimation
-                if ml_df['failure_flag'].sum() >= 5:  # Need enough failure events
-                    # Get indices where failures occurred
-                    failure_indices = ml_df[ml_df['failure_flag'] == 1]['record_index'].values
-                    
-                    if len(failure_indices) > 1:
-                        # Calculate intervals between failures
-                        failure_intervals = np.diff(failure_indices)
-                        avg_interval = failure_intervals.mean()
-                        std_interval = failure_intervals.std()
-                        
-                        # Predict next failure
-                        last_failure_index = failure_indices[-1]
-                        current_index = len(ml_df) - 1
-                        records_since_failure = current_index - last_failure_index
-                        
-                        estimated_next_failure = max(0, avg_interval - records_since_failure)
-                        confidence = max(0, 100 - (std_interval / avg_interval * 100)) if avg_interval > 0 else 0
-                        
+                    # ML Prediction: Next Failure Time Estimation. The random forest is fitted once per workbook
+                    # across all sheets and then loaded warm (see failure_model.py); the interval heuristic
+                    # is the fallback when there is too little failure history to train on
+                    prediction = snapshot.prediction
+                    try:
+                        with st.spinner("Loading failure model..."):
+                            failure_model = model_store.get(workbook)
+                        forecast = model_store.forecast(workbook, sheet_name) if failure_model else None
+                    except Exception:
+                        failure_model = forecast = None
+                    if forecast is not None:
+                        estimated_next_failure, confidence = forecast.estimated_next_failure, forecast.confidence
+                    elif prediction is not None:
+                        estimated_next_failure, confidence = prediction.estimated_next_failure, prediction.confidence
+                    if forecast is not None or prediction is not None:
                         st.markdown("##### 🔮 Next Failure Prediction")
                         pred1, pred2 = st.columns(2)
                         pred1.metric("Estimated Records Until Next Failure", 
-                                   f"{int(estimated_next_failure)} records")
+                                   f"{int(round(estimated_next_failure))} records")
                         pred2.metric("Prediction Confidence", f"{confidence:.0f}%")
-                        
+                        if forecast is not None:
+                            st.caption(f"Random forest trained on {failure_model.n_train:,} records from all sheets "
+                                       f"(out-of-bag R² {forecast.oob_r2:.2f}).")
+                        else:
+                            st.caption("Estimated from the mean interval between failures.")
+                    
                         # Warning if high risk
                         if estimated_next_failure < 5 and current_risk > 60:
                             st.warning("⚠️ **High Risk Alert:** Equipment is showing signs of imminent failure. Consider preventive maintenance.")
@@ -474,37 +752,42 @@ if uploaded_file:
                             st.success("✅ Equipment operating within normal parameters.")
                 
                 # Risk Trend Visualization
-                fig_risk = go.Figure()
-                fig_risk.add_trace(go.Scatter(
-                    x=ml_df.index,
-                    y=ml_df['risk_score'],
-                    mode='lines',
-                    name='Risk Score',
-                    line=dict(color='#ef4444', width=2),
-                    fill='tozeroy',
-                    fillcolor='rgba(239, 68, 68, 0.1)'
-                ))
-                fig_risk.add_hline(y=avg_risk, line_dash="dash", 
-                                  line_color="gray", 
-                                  annotation_text=f"Average Risk: {avg_risk:.1f}")
-                fig_risk.update_layout(
-                    title="Risk Score Trend Over Time",
-                    xaxis_title="Record Index",
-                    yaxis_title="Risk Score (0-100)",
-                    height=350,
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    margin=dict(l=20, r=20, t=50, b=20)
-                )
-                st.plotly_chart(fig_risk, use_container_width=True)
+                with run.stage('chart_risk', len(df)):
+                    fig_risk = go.Figure()
+                    fig_risk.add_trace(go.Scatter(
+                        x=df.index,
+                        y=risk.risk_score,
+                        mode='lines',
+                        name='Risk Score',
+                        line=dict(color='#ef4444', width=2),
+                        fill='tozeroy',
+                        fillcolor='rgba(239, 68, 68, 0.1)'
+                    ))
+                    fig_risk.add_hline(y=avg_risk, line_dash="dash", 
+                                      line_color="gray", 
+                                      annotation_text=f"Average Risk: {avg_risk:.1f}")
+                    fig_risk.update_layout(
+                        title="Risk Score Trend Over Time",
+                        xaxis_title="Record Index",
+                        yaxis_title="Risk Score (0-100)",
+                        height=350,
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        margin=dict(l=20, r=20, t=50, b=20)
+                    )
+                    st.plotly_chart(fig_risk, use_container_width=True)
                 
                 # Key Insights
+                avg_interval_text = f"{prediction.avg_interval:.1f} records" if prediction else "n/a"
+                model_text = (f"Random forest ({len(failure_model.forest.estimators_)} trees, "
+                              f"{failure_model.n_train:,} training records)" if forecast else "interval heuristic")
                 with st.expander("📊 ML Model Insights"):
                     st.markdown(f"""
                     **Model Analysis:**
-                    - **Total Records Analyzed:** {len(ml_df)}
-                    - **Total Failures Detected:** {ml_df['failure_flag'].sum()}
-                    - **Average Time Between Failures:** {avg_interval:.1f} records (if applicable)
-                    - **Current Equipment Health:** {'Critical' if current_risk > 75 else 'Warning' if current_risk > 50 else 'Good'}
+                    - **Total Records Analyzed:** {len(df)}
+                    - **Total Failures Detected:** {risk.total_failures}
+                    - **Average Time Between Failures:** {avg_interval_text} (if applicable)
+                    - **Current Equipment Health:** {risk.health}
+                    - **Next-Failure Model:** {model_text}
                     
                     **Risk Factors Contributing to Score:**
                     - Recent downtime patterns
@@ -513,294 +796,99 @@ if uploaded_file:
                     """)
                     
             except Exception as e:
+                risk = fig_risk = None
                 st.info(f"ML Analysis requires more structured data. Error: {str(e)}")
         else:
             st.info("⚠️ ML Predictions require at least 10 records. Please upload more data for predictive analytics.")
 
-        with st.expander("📄 View Current Sheet Processed Data"):
-            st.dataframe(df)
+        # Runs only while open, and ships one page of rows: filters and sorting run on the server over
+        # indexes cached per sheet (see table_view.py); paging reruns just this fragment
+        data_expander = st.expander("📄 View Current Sheet Processed Data", key='data_view', on_change='rerun')
+        if data_expander.open:
+            view = sheet_view(workbook, sheet_name, dept_col, reason_col)
+
+            @st.fragment
+            def data_viewer():
+                v1, v2, v3, v4 = st.columns([3, 3, 3, 1])
+                filters = {label: col.multiselect(label, view.categories(label), key=f'data_view_{label}')
+                           for label, col in zip(view.filter_labels, (v1, v2))}
+                sort_col = v3.selectbox("Sort by", [None] + list(df.columns), key='data_view_sort',
+                                        format_func=lambda c: "Record order" if c is None else c)
+                descending = v4.toggle("Desc", key='data_view_desc', disabled=sort_col is None)
+                p1, p2, p3 = st.columns([1, 1, 4])
+                page_size = p1.selectbox("Rows per page", PAGE_SIZES, index=1, key='data_view_size')
+                page_number = p2.number_input("Page", min_value=1, value=1, key='data_view_page')
+                page = view.page(filters, sort_col, descending, page_number - 1, page_size,
+                                 extra={'Operating_Time': op_time})
+                st.dataframe(page.rows, use_container_width=True)
+                shown = f"Rows {page.start + 1:,}-{page.start + len(page.rows):,} of {page.total:,}" \
+                    if page.total else "No rows"
+                if page.total < len(view):
+                    shown += f" (filtered from {len(view):,})"
+                p3.caption(f"{shown} - page {page.page + 1:,} of {page.pages:,}")
+
+            with data_expander:
+                with run.stage('data_table', len(df)):
+                    data_viewer()
 
         # === EXPORT BUTTONS IN SIDEBAR ===
         st.sidebar.markdown("---")
         st.sidebar.markdown("### 📥 Export Reports")
         
-        # Excel Export
-        excel_buffer = BytesIO()
-        with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-            # Summary Sheet
-            summary_export_data = {
-                'Metric': ['Total Failures', f'Total Operating Time ({unit_conv})', 
-                          f'MTTF ({unit_conv})', 'Failure Rate (λ)',
-                          'Total Repairs', f'Total Repair Time ({unit_conv})',
-                          f'MTTR ({unit_conv})', 'Repair Rate (μ)'],
-                'Value': [num_failures, f"{total_op_time:.2f}", f"{mttf:.2f}", f"{failure_rate:.6f}",
-                         num_repairs, f"{total_repair_time:.2f}", f"{mttr:.2f}", f"{repair_rate:.6f}"]
-            }
-            summary_df_export = pd.DataFrame(summary_export_data)
-            summary_df_export.to_excel(writer, sheet_name='Summary', index=False)
-            
-            # Raw Data Sheet
-            df.to_excel(writer, sheet_name='Raw Data', index=False)
-            
-        excel_buffer.seek(0)
-        st.sidebar.download_button(
-            label="📊 Download Excel Report",
-            data=excel_buffer,
-            file_name=f"reliability_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True
-        )
+        # Reports are built only on request and cached by a hash of their inputs
+        report_inputs = (workbook.data_hash, skip_rows, sheet_name, downtime_col, repair_time_col,
+                         dept_col, global_cost_col, observation_period, unit_conv)
         
-        # PDF Export
-        try:
-            pdf_buffer = BytesIO()
-            doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-            elements = []
-            styles = getSampleStyleSheet()
-            
-            # Custom Styles
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=20,
-                textColor=colors.HexColor('#1e3a8a'),
-                spaceAfter=6,
-                alignment=1  # Center
-            )
-            heading_style = ParagraphStyle(
-                'CustomHeading',
-                parent=styles['Heading2'],
-                fontSize=14,
-                textColor=colors.HexColor('#1e3a8a'),
-                spaceBefore=12,
-                spaceAfter=6
+        # Excel Export
+        excel_key = export_key('excel', *report_inputs)
+        if export_cache.get(excel_key) is not None or st.sidebar.button("📊 Prepare Excel Report", use_container_width=True):
+            with run.stage('excel_export', len(df)):
+                excel_report = export_cache.build(excel_key, build_excel_report, pdf_data_store, df,
+                                                  {downtime_col: downtime, repair_time_col: repair_values,
+                                                   'Operating_Time': op_time})
+            st.sidebar.download_button(
+                label="📊 Download Excel Report",
+                data=excel_report,
+                file_name=f"reliability_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                use_container_width=True
             )
-            
-            # Title Page
-            elements.append(Paragraph("🏭 Equipment Reliability & Failure Analytics Report", title_style))
-            elements.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
-            elements.append(Spacer(1, 0.2*inch))
-            
-            # 1. Failure Rate Analysis
-            elements.append(Paragraph("🛑 Failure Rate Analysis", heading_style))
-            failure_data = [
-                ['Metric', 'Value'],
-                ['Total Failures', f"{pdf_data_store['num_failures']:,}"],
-                [f"Total Operating Time ({pdf_data_store['unit_conv']})", f"{pdf_data_store['total_op_time']:,.2f}"],
-                [f"MTTF ({pdf_data_store['unit_conv']})", f"{pdf_data_store['mttf']:,.2f}"],
-                ['Failure Rate (λ)', f"{pdf_data_store['failure_rate']:.6f}"]
-            ]
-            failure_table = Table(failure_data, colWidths=[3.5*inch, 2*inch])
-            failure_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            elements.append(failure_table)
-            elements.append(Spacer(1, 0.2*inch))
-            
-            # 2. Repair Rate Analysis
-            elements.append(Paragraph("🔧 Repair Rate Analysis", heading_style))
-            repair_data = [
-                ['Metric', 'Value'],
-                ['Total Repairs', f"{pdf_data_store['num_repairs']:,}"],
-                [f"Total Repair Time ({pdf_data_store['unit_conv']})", f"{pdf_data_store['total_repair_time']:,.2f}"],
-                [f"MTTR ({pdf_data_store['unit_conv']})", f"{pdf_data_store['mttr']:,.2f}"],
-                ['Repair Rate (μ)', f"{pdf_data_store['repair_rate']:.6f}"]
-            ]
-            repair_table = Table(repair_data, colWidths=[3.5*inch, 2*inch])
-            repair_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            elements.append(repair_table)
-            elements.append(Spacer(1, 0.2*inch))
-            
-            # 3. Charts as Images
-            elements.append(Paragraph("📊 Visualizations", heading_style))
-            
-            # Save bar chart as image
-            temp_bar_path = os.path.join(tempfile.gettempdir(), f'bar_chart_{datetime.now().strftime("%Y%m%d%H%M%S")}.png')
-            try:
-                fig_bar.write_image(temp_bar_path, width=800, height=400, engine='kaleido')
-                elements.append(RLImage(temp_bar_path, width=5.5*inch, height=2.75*inch))
-                elements.append(Spacer(1, 0.1*inch))
-            except Exception as chart_err:
-                elements.append(Paragraph(f"Bar chart unavailable: {str(chart_err)[:50]}", styles['Normal']))
-            
-            # Save pie chart if exists
-            if reason_col_list:
-                temp_pie_path = os.path.join(tempfile.gettempdir(), f'pie_chart_{datetime.now().strftime("%Y%m%d%H%M%S")}.png')
-                try:
-                    fig_pie.write_image(temp_pie_path, width=800, height=500, engine='kaleido')
-                    elements.append(RLImage(temp_pie_path, width=5.5*inch, height=3.4*inch))
-                    elements.append(Spacer(1, 0.1*inch))
-                except Exception as pie_err:
-                    elements.append(Paragraph(f"Pie chart unavailable: {str(pie_err)[:50]}", styles['Normal']))
-            
-            # 4. Cost Summary (if available)
-            if summary_data:
-                elements.append(PageBreak())
-                elements.append(Paragraph("💰 Multi-Sheet Cost Summary", heading_style))
-                
-                cost_table_data = [['Sheet Name', 'All Repair Cost', 'Exclude MAINTENANCE', 'Status']]
-                grand_all = 0
-                grand_excl = 0
-                
-                for item in summary_data:
-                    cost_table_data.append([
-                        item['Sheet Name'],
-                        f"{item['All Repair Cost']:,.2f}",
-                        f"{item['Exclude MAINTENANCE']:,.2f}",
-                        item.get('Status', 'OK')
-                    ])
-                    if item['Sheet Name'] != '✨ GRAND TOTAL':
-                        grand_all += item['All Repair Cost']
-                        grand_excl += item['Exclude MAINTENANCE']
-                
-                # Add Grand Total Row
-                cost_table_data.append([
-                    '✨ GRAND TOTAL',
-                    f"{grand_all:,.2f}",
-                    f"{grand_excl:,.2f}",
-                    'SUMMARY'
-                ])
-                
-                cost_table = Table(cost_table_data, colWidths=[1.5*inch, 1.5*inch, 1.5*inch, 1*inch])
-                cost_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, -1), 8),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                    ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
-                    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#fef3c7')),  # Highlight grand total
-                    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                elements.append(cost_table)
-            
-            # 5. ML Predictions (if available)
-            if len(df) >= 10:
-                try:
-                    elements.append(PageBreak())
-                    elements.append(Paragraph("🤖 AI/ML Predictive Analytics", heading_style))
-                    
-                    # ML Data preparation
-                    ml_df_pdf = df.copy()
-                    ml_df_pdf['record_index'] = range(len(ml_df_pdf))
-                    ml_df_pdf['avg_downtime'] = ml_df_pdf[downtime_col].rolling(window=3, min_periods=1).mean()
-                    ml_df_pdf['downtime_trend'] = ml_df_pdf[downtime_col].diff().fillna(0)
-                    ml_df_pdf['failure_flag'] = (ml_df_pdf[downtime_col] > 0).astype(int)
-                    ml_df_pdf['failure_frequency'] = ml_df_pdf['failure_flag'].rolling(window=10, min_periods=1).sum()
-                    
-                    risk_factors_pdf = [
-                        ml_df_pdf[downtime_col] / ml_df_pdf[downtime_col].max() if ml_df_pdf[downtime_col].max() > 0 else 0,
-                        ml_df_pdf['avg_downtime'] / ml_df_pdf['avg_downtime'].max() if ml_df_pdf['avg_downtime'].max() > 0 else 0,
-                        ml_df_pdf['failure_frequency'] / 10
-                    ]
-                    ml_df_pdf['risk_score'] = (sum(risk_factors_pdf) / len(risk_factors_pdf) * 100).clip(0, 100)
-                    
-                    current_risk_pdf = ml_df_pdf['risk_score'].iloc[-1]
-                    avg_risk_pdf = ml_df_pdf['risk_score'].mean()
-                    recent_failures_pdf = ml_df_pdf['failure_flag'].tail(10).sum()
-                    
-                    ml_metrics_data = [
-                        ['Metric', 'Value'],
-                        ['Current Risk Score', f"{current_risk_pdf:.1f}/100"],
-                        ['Average Risk Score', f"{avg_risk_pdf:.1f}/100"],
-                        ['Recent Failures (Last 10)', f"{recent_failures_pdf}"],
-                        ['Failure Frequency', f"{(recent_failures_pdf/10)*100:.0f}%"],
-                        ['Equipment Health', 'Critical' if current_risk_pdf > 75 else 'Warning' if current_risk_pdf > 50 else 'Good']
-                    ]
-                    
-                    ml_table = Table(ml_metrics_data, colWidths=[3.5*inch, 2*inch])
-                    ml_table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                        ('FONTSIZE', (0, 0), (-1, -1), 10),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-                        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                    ]))
-                    elements.append(ml_table)
-                    elements.append(Spacer(1, 0.1*inch))
-                    
-                    # Add risk trend chart (recreate it for PDF)
-                    try:
-                        # Create risk chart
-                        fig_risk_pdf = go.Figure()
-                        fig_risk_pdf.add_trace(go.Scatter(
-                            x=ml_df_pdf.index,
-                            y=ml_df_pdf['risk_score'],
-                            mode='lines',
-                            name='Risk Score',
-                            line=dict(color='#ef4444', width=2),
-                            fill='tozeroy',
-                            fillcolor='rgba(239, 68, 68, 0.1)'
-                        ))
-                        fig_risk_pdf.add_hline(y=avg_risk_pdf, line_dash="dash", 
-                                              line_color="gray", 
-                                              annotation_text=f"Average Risk: {avg_risk_pdf:.1f}")
-                        fig_risk_pdf.update_layout(
-                            title="Risk Score Trend Over Time",
-                            xaxis_title="Record Index",
-                            yaxis_title="Risk Score (0-100)",
-                            height=350,
-                            plot_bgcolor='rgba(0,0,0,0)',
-                            margin=dict(l=20, r=20, t=50, b=20)
-                        )
-                        
-                        temp_risk_path = os.path.join(tempfile.gettempdir(), f'risk_chart_{datetime.now().strftime("%Y%m%d%H%M%S")}.png')
-                        fig_risk_pdf.write_image(temp_risk_path, width=800, height=350, engine='kaleido')
-                        elements.append(RLImage(temp_risk_path, width=5.5*inch, height=2.4*inch))
-                    except Exception as risk_err:
-                        elements.append(Paragraph(f"Risk chart unavailable: {str(risk_err)[:50]}", styles['Normal']))
-                        
-                except Exception as ml_err:
-                    elements.append(Paragraph(f"ML section unavailable: {str(ml_err)[:100]}", styles['Normal']))
-            
-            # Build PDF
-            doc.build(elements)
-            pdf_buffer.seek(0)
-            
-            # Cleanup temp files
-            cleanup_files = []
-            if 'temp_bar_path' in locals(): cleanup_files.append(temp_bar_path)
-            if 'temp_pie_path' in locals(): cleanup_files.append(temp_pie_path)
-            if 'temp_risk_path' in locals(): cleanup_files.append(temp_risk_path)
-            
-            for path in cleanup_files:
-                try:
-                    if os.path.exists(path):
-                        os.unlink(path)
-                except:
-                    pass
-            
+        
+        # PDF Export (built on a background worker - the dashboard stays responsive meanwhile)
+        pdf_key = export_key('pdf', *report_inputs)
+        pdf_future = export_cache.get(pdf_key)
+        if pdf_future is not None and pdf_future.done() and pdf_future.exception() is not None:
+            st.sidebar.error(f"PDF Error: {str(pdf_future.exception())[:50]}...")
+            st.sidebar.info("Run: pip install kaleido")
+            pdf_future = None
+        
+        if pdf_future is None and st.sidebar.button("📄 Prepare PDF Report", use_container_width=True):
+            # Static export gets the full-range timeline with SVG traces (WebGL does not rasterize reliably)
+            with run.stage('pdf_figures', len(df)):
+                fig_bar_pdf = timeline_figure(op_time, downtime,
+                                              conv_factor, unit_conv, webgl=False)
+            # The build itself runs on the worker and logs its own 'pdf_export' stage when it finishes
+            pdf_future = export_cache.submit(pdf_key, run.background('pdf_export', build_pdf_report, len(df)),
+                                             pdf_data_store, risk, fig_bar_pdf,
+                                             fig_pie if reason_col else None, fig_risk, summary_data)
+        
+        if pdf_future is not None and pdf_future.done():
             st.sidebar.download_button(
                 label="📄 Download PDF Report",
-                data=pdf_buffer,
+                data=pdf_future.result(),
                 file_name=f"complete_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
                 mime="application/pdf",
                 use_container_width=True
             )
-        except Exception as e:
-            st.sidebar.error(f"PDF Error: {str(e)[:50]}...")
-            st.sidebar.info("Run: pip install kaleido")
+        elif pdf_future is not None:
+            with st.sidebar:
+                # Poll only this fragment; a full rerun once the PDF is ready shows the download button
+                @st.fragment(run_every=1)
+                def pdf_build_status():
+                    if pdf_future.done():
+                        st.rerun()
+                    st.info("⏳ Building PDF report in the background...")
+                pdf_build_status()
 
     except Exception as e:
         st.error(f"Error: {e}")
@@ -834,3 +922,33 @@ else:
         buffer.close()
         with open("sample_data.xlsx", "rb") as f:
             st.sidebar.download_button("Download Sample File", f, "sample_data.xlsx")
+
+# === DEBUG PANEL ===
+run_log = run.finish()
+if debug_mode:
+    with st.expander("🧪 Debug: stage timings", expanded=True):
+        if run.stages:
+            stage_df = pd.DataFrame([r.as_dict() for r in run.stages])
+            st.dataframe(stage_df, use_container_width=True, hide_index=True)
+            st.caption(f"Run {run.run_id}: {run_log['total_seconds']:.3f}s in total, "
+                       f"{stage_df['seconds'].sum():.3f}s in the stages above. "
+                       f"Logged to {LOG_DIR}/{STAGE_LOG}.")
+        else:
+            st.caption("No stages ran - upload a workbook to see timings.")
+        background = run.session_background()
+        if background:
+            st.markdown("##### Background builds")
+            st.dataframe(pd.DataFrame(background), use_container_width=True, hide_index=True)
+
+        d1, d2 = st.columns(2)
+        d1.checkbox("Trace Python allocations", key='trace_allocations',
+                    help="Adds tracemalloc peaks per stage from the next rerun on; slows every stage down.")
+        if d2.button("🔬 Profile next rerun"):
+            st.session_state['profile_next_run'] = True
+            st.rerun()
+        if run.profile is not None:
+            st.markdown(f"##### Profile of this run ({run.profile.tool})")
+            st.code(run.profile.text, language=None)
+            if run.profile.path:
+                with open(run.profile.path, "rb") as f:
+                    st.download_button("Download profile", f.read(), file_name=os.path.basename(run.profile.path))
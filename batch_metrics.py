@@ -0,0 +1,175 @@
+"""
+Headless batch run: reliability and cost metrics for every sheet of every workbook.
+
+    python batch_metrics.py plant_exports/ "archive/2023-*.xlsx" -o weekly_metrics.csv
+
+Column roles, cleaning and the metric formulas are the dashboard's own
+(schema.py, data_loader.py, reliability.py, cost_scan.py), so the
+numbers match what a user would see after uploading each file by hand.
+Workbooks are spread over a process pool; re-runs on unchanged files load
+from the columnar sidecars instead of re-parsing the Excel files.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from column_mapping import maintenance_mask
+from cost_scan import summarize_frame
+from data_loader import ingest_workbook, numeric_column, read_source_bytes
+from reliability import compute_reliability, compute_risk
+from schema import AUTO_SKIP
+
+EXCEL_PATTERNS = ("*.xlsx", "*.xlsm")
+UNIT_FACTORS = {"minutes": 1, "hours": 60}
+
+
+def skip_rows_arg(value):
+    return AUTO_SKIP if value == AUTO_SKIP else int(value)
+
+
+def expand_inputs(inputs):
+    """Files for every directory / glob / path argument, de-duplicated and sorted."""
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for pattern in EXCEL_PATTERNS:
+                files.update(glob.glob(os.path.join(item, "**", pattern), recursive=True))
+        elif any(ch in item for ch in "*?["):
+            files.update(glob.glob(item, recursive=True))
+        elif os.path.isfile(item):
+            files.add(item)
+    # Skip Excel lock files (~$name.xlsx) left behind by open workbooks
+    return sorted(f for f in files if not os.path.basename(f).startswith("~$"))
+
+
+def sheet_metrics(workbook, s_name, cost_col=None, dept_col=None, observation_period=1440, conv_factor=1):
+    """
+    One output row of reliability/cost metrics for a workbook sheet, with the columns the
+    dashboard picks by default: the inferred schema's roles unless cost_col/dept_col name one.
+    """
+    df = workbook.sheet(s_name)
+    schema = workbook.schema(s_name)
+    row = {"Rows": len(df)}
+    downtime_col = schema.column('downtime')
+    actual_dept_col = dept_col if dept_col in df.columns else schema.column('department')
+    row["Downtime Column"] = downtime_col
+    row["Department Column"] = actual_dept_col
+
+    cost = summarize_frame(df, None, cost_col if cost_col in df.columns else schema.column('cost'), actual_dept_col)
+    row["All Repair Cost"] = cost["All Repair Cost"]
+    row["Exclude MAINTENANCE"] = cost["Exclude MAINTENANCE"]
+
+    if downtime_col is None:
+        row["Status"] = "⚠️ Downtime Column Missing"
+        return row
+
+    downtime = workbook.fetch(s_name, 'downtime')
+    repair_col = schema.column('repair_time', downtime_col)
+    repair_time = downtime if repair_col == downtime_col else numeric_column(df, repair_col)
+    repair_mask = None
+    if actual_dept_col:
+        repair_mask = ~maintenance_mask(df[actual_dept_col])
+    metrics = compute_reliability(downtime, repair_time, observation_period, conv_factor, repair_mask)
+    row.update({
+        "Total Failures": metrics.num_failures,
+        "Total Op. Time": round(metrics.total_op_time, 4),
+        "MTTF": round(metrics.mttf, 4),
+        "Failure Rate": round(metrics.failure_rate, 6),
+        "Total Repairs": metrics.num_repairs,
+        "Total Repair Time": round(metrics.total_repair_time, 4),
+        "MTTR": round(metrics.mttr, 4),
+        "Repair Rate": round(metrics.repair_rate, 6),
+    })
+    if len(df) >= 10:
+        risk = compute_risk(downtime)
+        row["Current Risk Score"] = round(risk.current_risk, 2)
+        row["Average Risk Score"] = round(risk.avg_risk, 2)
+    row["Status"] = cost["Status"]
+    return row
+
+
+def process_workbook(path, skip_rows=0, cost_col=None, dept_col=None, observation_period=1440, conv_factor=1):
+    """All sheet rows for one workbook; runs inside a worker process."""
+    try:
+        workbook = ingest_workbook(read_source_bytes(path), skip_rows)
+    except Exception as e:
+        return [{"File": path, "Sheet Name": None, "Status": f"❌ Error: {str(e)[:60]}"}]
+
+    rows = []
+    for s_name in workbook.sheet_names:
+        row = {"File": path, "Sheet Name": s_name}
+        try:
+            row.update(sheet_metrics(workbook, s_name, cost_col, dept_col, observation_period, conv_factor))
+        except Exception as e:
+            row["Status"] = f"❌ Error: {str(e)[:60]}"
+        rows.append(row)
+    return rows
+
+
+def run_batch(files, skip_rows=0, cost_col=None, dept_col=None, observation_period=1440,
+              conv_factor=1, workers=None, progress=None):
+    """Metrics rows for every sheet of every file, in input order."""
+    results = {}
+    args = (skip_rows, cost_col, dept_col, observation_period, conv_factor)
+    if workers == 1 or len(files) <= 1:
+        for path in files:
+            results[path] = process_workbook(path, *args)
+            if progress:
+                progress(len(results), len(files), path)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(process_workbook, path, *args): path for path in files}
+            for future in as_completed(futures):
+                path = futures[future]
+                results[path] = future.result()
+                if progress:
+                    progress(len(results), len(files), path)
+    return [row for path in files for row in results[path]]
+
+
+def write_output(rows, output):
+    out_df = pd.DataFrame(rows)
+    if output.lower().endswith(".json"):
+        out_df.to_json(output, orient="records", indent=2, force_ascii=False)
+    else:
+        out_df.to_csv(output, index=False)
+    return out_df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-sheet reliability and cost metrics for many workbooks.")
+    parser.add_argument("inputs", nargs="+", help="Workbook files, directories or glob patterns")
+    parser.add_argument("-o", "--output", default="reliability_metrics.csv",
+                        help="Output file; .json writes JSON records, anything else CSV")
+    parser.add_argument("--skip-rows", type=skip_rows_arg, default=AUTO_SKIP,
+                        help="Title rows above the header, or 'auto' to detect the header row of each sheet")
+    parser.add_argument("--observation-period", type=float, default=1440, help="Minutes per record")
+    parser.add_argument("--units", choices=sorted(UNIT_FACTORS), default="hours")
+    parser.add_argument("--cost-column", default=None, help="Preferred 'Repairing Cost' column name")
+    parser.add_argument("--department-column", default=None, help="Preferred department column name")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    files = expand_inputs(args.inputs)
+    if not files:
+        parser.error("no .xlsx files matched the given inputs")
+
+    def report(done, total, path):
+        print(f"[{done}/{total}] {path}", file=sys.stderr)
+
+    start = time.perf_counter()
+    rows = run_batch(files, args.skip_rows, args.cost_column, args.department_column,
+                     args.observation_period, UNIT_FACTORS[args.units], args.workers, report)
+    write_output(rows, args.output)
+    print(f"{len(rows)} sheets from {len(files)} workbooks in {time.perf_counter() - start:.1f}s -> {args.output}",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
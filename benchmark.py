@@ -0,0 +1,236 @@
+"""
+Stage-by-stage benchmark of the dashboard pipeline.
+
+    python benchmark.py --rows 1000000 --sheets 8 -o bench_1m.json
+    python benchmark.py --input plant_exports/week_40.xlsx --compare bench_1m.json
+
+Each stage runs on its own and is timed and memory-profiled separately:
+load, column resolution, metrics, cost scan, cost partials, risk features, charts, Excel
+export and PDF export. Peak memory is the process peak-RSS counter, reset
+before every stage on Linux (--tracemalloc adds Python-level peaks, at some
+cost to speed). Results go to a JSON file with the git revision, so runs of
+different versions can be compared with --compare.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+import sidecar
+from column_mapping import maintenance_mask
+from cost_scan import cost_partials, scan_costs
+from data_loader import ingest_workbook, numeric_column, read_source_bytes
+from exports import build_excel_report, build_pdf_report
+from generate_test_data import generate, write_xlsx
+from instrumentation import reset_peak_rss, rss_kb
+from reliability import compute_reliability, compute_risk, operating_time, predict_next_failure
+from schema import AUTO_SKIP, detect_header_rows, infer_roles
+from timeline import timeline_figure
+
+
+def run_stage(name, fn, rows, use_tracemalloc=False):
+    """Run fn() once; returns (result, stage record)."""
+    gc.collect()
+    peak_resettable = reset_peak_rss()
+    rss_before = rss_kb("VmRSS")
+    if use_tracemalloc:
+        tracemalloc.start()
+    error = None
+    start = time.perf_counter()
+    try:
+        result = fn()
+    except Exception as e:
+        result, error = None, f"{type(e).__name__}: {str(e)[:200]}"
+    seconds = time.perf_counter() - start
+    record = {"stage": name, "seconds": round(seconds, 4), "rows": rows,
+              "rows_per_second": round(rows / seconds) if seconds > 0 else None}
+    if use_tracemalloc:
+        record["py_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+    if rss_before is not None:
+        record["rss_mb"] = round(rss_kb("VmRSS") / 1024, 1)
+        if peak_resettable:
+            record["peak_rss_delta_mb"] = round((rss_kb("VmHWM") - rss_before) / 1024, 1)
+    if error:
+        record["error"] = error
+    print(f"  {name:<18} {seconds:>9.3f}s" + (f"  {error}" if error else ""), file=sys.stderr)
+    return result, record
+
+
+def largest_sheet(workbook):
+    readable = [n for n in workbook.sheet_names if n in workbook.sheets]
+    return max(readable, key=lambda n: len(workbook.sheets[n]))
+
+
+def benchmark(data, use_tracemalloc=False):
+    """Run every stage on one workbook (bytes) and return the stage records."""
+    records = []
+    stage = lambda name, fn, rows: run_stage(name, fn, rows, use_tracemalloc)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        sidecar.SIDECAR_DIR = scratch
+        sidecar.SIDECAR_ENABLED = False
+        workbook, rec = stage("load", lambda: ingest_workbook(data, AUTO_SKIP), 0)
+        records.append(rec)
+        if workbook is None:
+            return records
+        total_rows = sum(len(df) for df in workbook.sheets.values())
+        rec["rows"] = total_rows
+        rec["rows_per_second"] = round(total_rows / rec["seconds"]) if rec["seconds"] > 0 else None
+
+        # Write the sidecar outside the timing, then time the warm (memory-mapped) reload
+        sidecar.write_sidecar(workbook.data_hash, AUTO_SKIP, workbook.sheet_names, workbook.sheets,
+                              workbook.errors, header_rows=workbook.header_rows)
+        sidecar.SIDECAR_ENABLED = True
+        _, rec = stage("load_sidecar", lambda: ingest_workbook(data, AUTO_SKIP, workbook.data_hash), total_rows)
+        records.append(rec)
+
+    def resolve_columns():
+        header_rows = detect_header_rows(data)
+        return header_rows, {n: infer_roles(df.columns) for n, df in workbook.sheets.items()}
+    _, rec = stage("column_resolution", resolve_columns, total_rows)
+    records.append(rec)
+
+    sheets = [n for n in workbook.sheet_names if n in workbook.sheets and workbook.schema(n).column("downtime")]
+
+    def metrics():
+        out = {}
+        for name in sheets:
+            schema = workbook.schema(name)
+            downtime = workbook.fetch(name, "downtime")
+            dept = schema.column("department")
+            mask = ~maintenance_mask(workbook.sheets[name][dept]) if dept else None
+            out[name] = compute_reliability(downtime, downtime, 1440, 60, mask)
+        return out
+    _, rec = stage("metrics", metrics, total_rows)
+    records.append(rec)
+
+    summary_data, rec = stage("cost_scan", lambda: scan_costs(data, workbook.header_rows), total_rows)
+    records.append(rec)
+    # The dashboard's path: per-sheet partial aggregates of the already parsed workbook
+    _, rec = stage("cost_partials", lambda: cost_partials(workbook).cube().summary(), total_rows)
+    records.append(rec)
+
+    def risk_features():
+        out = {}
+        for name in sheets:
+            risk = compute_risk(workbook.fetch(name, "downtime"))
+            out[name] = (risk, predict_next_failure(risk.failure_flag))
+        return out
+    risks, rec = stage("risk_features", risk_features, total_rows)
+    records.append(rec)
+
+    # Charts, Excel and PDF work on one sheet, as the dashboard does
+    name = largest_sheet(workbook)
+    df = workbook.sheets[name]
+    schema = workbook.schema(name)
+    downtime_col = schema.column("downtime", df.columns[0])
+    downtime = numeric_column(df, downtime_col)
+    op_time = operating_time(downtime, 1440)
+    risk = risks[name][0] if risks and name in risks else compute_risk(downtime)
+    metrics_row = compute_reliability(downtime, downtime, 1440, 60).as_dict("Hours")
+
+    def charts():
+        fig_bar = timeline_figure(op_time, downtime, 60, "Hours")
+        reason_col = schema.column("reason")
+        figs = [fig_bar]
+        if reason_col:
+            counts = df.loc[downtime > 0, reason_col].astype(object).value_counts().head(10).reset_index()
+            counts.columns = ["Reason", "Count"]
+            figs.append(px.pie(counts, values="Count", names="Reason"))
+        figs.append(go.Figure(go.Scatter(x=np.arange(len(df)), y=risk.risk_score, mode="lines")))
+        # Serialization is what Streamlit ships to the browser
+        return figs, sum(len(f.to_json()) for f in figs)
+    chart_out, rec = stage("charts", charts, len(df))
+    if chart_out:
+        rec["payload_kb"] = round(chart_out[1] / 1024, 1)
+    records.append(rec)
+
+    _, rec = stage("excel_export", lambda: build_excel_report(
+        metrics_row, df, {downtime_col: downtime, "Operating_Time": op_time}), len(df))
+    records.append(rec)
+
+    def pdf_export():
+        fig_bar = timeline_figure(op_time, downtime, 60, "Hours", webgl=False)
+        figs = chart_out[0] if chart_out else [None, None, None]
+        fig_pie = figs[1] if len(figs) == 3 else None
+        return build_pdf_report(metrics_row, risk, fig_bar, fig_pie, figs[-1], summary_data or [])
+    _, rec = stage("pdf_export", pdf_export, len(df))
+    records.append(rec)
+    return records
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous_path):
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {r["stage"]: r for r in json.load(f)["stages"]}
+    print(f"\n{'stage':<18} {'before':>9} {'after':>9} {'ratio':>7}")
+    for rec in current:
+        old = previous.get(rec["stage"])
+        if old and old.get("seconds"):
+            print(f"{rec['stage']:<18} {old['seconds']:>8.3f}s {rec['seconds']:>8.3f}s "
+                  f"{rec['seconds'] / old['seconds']:>6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and memory-profile each dashboard pipeline stage.")
+    parser.add_argument("--input", help="Existing workbook to benchmark (default: generate one)")
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows to generate")
+    parser.add_argument("--sheets", type=int, default=4, help="Sheets to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default="benchmark_results.json")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also record Python allocation peaks")
+    parser.add_argument("--compare", help="Earlier results JSON to compare stage times against")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        data = read_source_bytes(args.input)
+        source = {"input": os.path.abspath(args.input)}
+    else:
+        with tempfile.TemporaryDirectory() as scratch:
+            path = os.path.join(scratch, "bench.xlsx")
+            print(f"Generating {args.rows:,} rows x {args.sheets} sheets...", file=sys.stderr)
+            write_xlsx(path, generate(args.rows, args.sheets, args.seed))
+            data = read_source_bytes(path)
+        source = {"generated_rows": args.rows, "sheets": args.sheets, "seed": args.seed}
+
+    print("Stages:", file=sys.stderr)
+    records = benchmark(data, args.tracemalloc)
+    result = {
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "workbook_mb": round(len(data) / 2**20, 2),
+        **source,
+        "stages": records,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+    if args.compare:
+        compare(records, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
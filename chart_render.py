@@ -0,0 +1,103 @@
+"""
+In-memory chart rasterization for the PDF report.
+
+A single warm kaleido browser (a few tabs) lives on a background event loop
+for the whole server process. All figures of a report are rendered
+concurrently and returned as PNG bytes, so ReportLab never touches temp files
+and each export no longer pays kaleido's start-up cost.
+"""
+import asyncio
+import atexit
+import threading
+
+RENDER_TABS = 3
+RENDER_TIMEOUT = 90
+
+
+class ChartRenderer:
+    """Owns the warm kaleido process; safe to share between sessions and export threads."""
+
+    def __init__(self, tabs=RENDER_TABS, timeout=RENDER_TIMEOUT):
+        self.tabs = tabs
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._loop = None
+        self._kaleido = None
+        self._legacy = False
+
+    def _start(self):
+        if self._kaleido is not None or self._legacy:
+            return
+        import kaleido
+        if not hasattr(kaleido, "Kaleido"):
+            # kaleido < 1.0 keeps its own persistent process behind fig.to_image()
+            self._legacy = True
+            return
+
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name="kaleido-renderer", daemon=True).start()
+
+        async def _open():
+            k = kaleido.Kaleido(n=self.tabs, timeout=self.timeout)
+            await k.open()
+            return k
+
+        try:
+            self._kaleido = asyncio.run_coroutine_threadsafe(_open(), loop).result(self.timeout)
+        except Exception:
+            loop.call_soon_threadsafe(loop.stop)
+            raise
+        self._loop = loop
+
+    def render(self, figures):
+        """
+        Render {name: (figure, width, height)} to PNG.
+        Returns {name: png bytes}, with the raised Exception in place of bytes for charts that failed.
+        """
+        try:
+            with self._lock:
+                self._start()
+        except Exception as e:
+            return {name: e for name in figures}
+
+        if self._legacy:
+            return {name: self._render_legacy(fig, w, h) for name, (fig, w, h) in figures.items()}
+
+        async def _render_all():
+            return await asyncio.gather(*[
+                self._kaleido.calc_fig(fig, opts={"format": "png", "width": w, "height": h})
+                for fig, w, h in figures.values()
+            ], return_exceptions=True)
+
+        try:
+            results = asyncio.run_coroutine_threadsafe(_render_all(), self._loop).result(
+                self.timeout * max(len(figures), 1)
+            )
+        except Exception as e:
+            # The browser is gone or hung - start a fresh one on the next report
+            self.close()
+            return {name: e for name in figures}
+        return dict(zip(figures, results))
+
+    @staticmethod
+    def _render_legacy(fig, width, height):
+        try:
+            return fig.to_image(format="png", width=width, height=height, engine="kaleido")
+        except Exception as e:
+            return e
+
+    def close(self):
+        with self._lock:
+            kaleido_proc, loop = self._kaleido, self._loop
+            self._kaleido = self._loop = None
+        if kaleido_proc is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(kaleido_proc.close(), loop).result(10)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+
+
+chart_renderer = ChartRenderer()
+atexit.register(chart_renderer.close)
@@ -0,0 +1,69 @@
+"""
+Fuzzy column resolution shared by the dashboard, the cost scan and batch jobs.
+
+Sheets name the same data slightly differently ("Repairing cost" vs
+"Repairing  cost", "Department" vs "Dept"), so every consumer resolves its
+columns through these helpers instead of re-implementing the scans.
+"""
+import numpy as np
+import pandas as pd
+
+
+def find_column(columns, keyword, default=None):
+    """First column whose name contains `keyword` (case-insensitive)."""
+    for c in columns:
+        if keyword in str(c).lower():
+            return c
+    return default
+
+
+def find_downtime_column(columns):
+    return find_column(columns, 'equipment downtime')
+
+
+def find_reason_column(columns):
+    return find_column(columns, 'reason')
+
+
+def find_cost_column(columns, preferred=None):
+    """Resolve the repair cost column of a sheet, starting from the user's sidebar choice."""
+    columns = [str(c) for c in columns]
+    # 1. Exact match from sidebar selection
+    if preferred is not None and preferred in columns:
+        return preferred
+    # 2. Normalized match (ignore case/extra spaces)
+    if preferred is not None:
+        target = str(preferred).strip().lower()
+        for c in columns:
+            if c.lower().strip() == target:
+                return c
+    # 3. Any column containing 'cost'
+    return find_column(columns, 'cost')
+
+
+def find_department_column(columns, preferred=None):
+    """Resolve the department column of a sheet, starting from the user's selection."""
+    columns = [str(c) for c in columns]
+    if preferred is not None and preferred in columns:
+        return preferred
+    for c in columns:
+        if 'department' in c.lower() or 'dept' in c.lower():
+            return c
+    return None
+
+
+def maintenance_mask(values):
+    """
+    Boolean array, True where a department Series is 'MAINTENANCE' (vectorized is_maintenance).
+    Categorical columns are checked once per category instead of once per row.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        per_category = np.asarray(values.cat.categories.astype(str).str.strip().str.upper() == 'MAINTENANCE')
+        codes = values.cat.codes.to_numpy()
+        return np.where(codes >= 0, per_category[codes], False)
+    return (values.astype(str).str.strip().str.upper() == 'MAINTENANCE').to_numpy()
+
+
+def is_maintenance(value):
+    # Clean department names (remove spaces and case-insensitive check)
+    return str(value).strip().upper() == 'MAINTENANCE'
@@ -0,0 +1,356 @@
+"""
+Streaming, parallel multi-sheet cost scan.
+
+The cost summary only needs two sums per sheet (all repair cost, and cost
+where department != 'MAINTENANCE'), so instead of loading every sheet into a
+DataFrame this engine streams rows through openpyxl's read-only iterator,
+keeps just the resolved cost and department cells, and fans the sheets out
+across a process pool. Memory stays flat per sheet and wall time scales with
+the number of cores.
+
+The dashboard already has every sheet parsed, so it works from partial
+aggregates instead (CostPartials): each sheet is reduced once to cost sums
+per department x reason x month for every numeric column, i.e. for every
+column the cost selection could resolve to. Summaries for any cost column,
+any set of excluded departments and the sheet x department pivot are then
+re-aggregations of those small tables. A different department column needs
+one more reduction, of the sheets whose resolved column changes.
+
+    cube = cost_partials(workbook).cube(cost_col, dept_col)
+    cube.summary(excluded={'MAINTENANCE', 'CCM'})   # rows like scan_costs()
+    cube.pivot()                                    # sheet x department
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from column_mapping import find_cost_column, find_department_column, is_maintenance, maintenance_mask
+from grouped import UNSPECIFIED, group_labels
+
+STATUS_OK = "✅ Success"
+STATUS_NO_COST = "⚠️ Cost Column Missing"
+
+# Below this size the process pool start-up costs more than it saves
+PARALLEL_MIN_BYTES = 2 * 1024 * 1024
+
+# Worker-process state: the workbook bytes are shipped once per worker, not once per sheet
+_worker_data = None
+_worker_book = None
+
+
+def header_names(cells):
+    """Header names as pandas would produce them (stripped, 'Unnamed: i', de-duplicated)."""
+    names, seen = [], {}
+    for i, cell in enumerate(cells):
+        name = f"Unnamed: {i}" if cell is None or str(cell).strip() == "" else str(cell).strip()
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def iter_sheet_rows(ws, skip_rows=0):
+    """
+    Yield (header, row_iterator) for a read-only worksheet, mirroring
+    pd.read_excel(skiprows=skip_rows): skip raw rows, then blank rows, first row left is the header.
+    """
+    rows = ws.iter_rows(values_only=True)
+    for _ in range(skip_rows):
+        if next(rows, None) is None:
+            return [], iter(())
+    for row in rows:
+        if any(v is not None and str(v).strip() != "" for v in row):
+            return header_names(row), rows
+    return [], iter(())
+
+
+def to_number(value):
+    """Scalar equivalent of pd.to_numeric(errors='coerce').fillna(0)."""
+    if value is None or isinstance(value, (datetime, date, time)):
+        return 0.0
+    if isinstance(value, (int, float)):
+        return 0.0 if value != value else float(value)
+    try:
+        number = float(str(value).strip())
+    except ValueError:
+        return 0.0
+    return 0.0 if number != number else number
+
+
+def sheet_skip_rows(skip_rows, sheet_name):
+    """skip_rows is one count for every sheet or a {sheet: header row} mapping (auto-detected headers)."""
+    if isinstance(skip_rows, dict):
+        return int(skip_rows.get(sheet_name, 0))
+    return int(skip_rows)
+
+
+def scan_sheet(ws, sheet_name, skip_rows, cost_col, dept_col):
+    """Stream one worksheet and return its cost summary row."""
+    header, rows = iter_sheet_rows(ws, sheet_skip_rows(skip_rows, sheet_name))
+    actual_cost_col = find_cost_column(header, cost_col)
+    if not actual_cost_col:
+        return cost_row(sheet_name, 0, 0, STATUS_NO_COST)
+
+    cost_idx = header.index(actual_cost_col)
+    actual_dept_col = find_department_column(header, dept_col)
+    dept_idx = header.index(actual_dept_col) if actual_dept_col else None
+
+    all_cost = 0.0
+    exclude_maint_cost = 0.0
+    for row in rows:
+        cost = to_number(row[cost_idx]) if cost_idx < len(row) else 0.0
+        all_cost += cost
+        if dept_idx is None or dept_idx >= len(row) or not is_maintenance(row[dept_idx]):
+            exclude_maint_cost += cost
+    return cost_row(sheet_name, all_cost, exclude_maint_cost, STATUS_OK)
+
+
+def summarize_frame(df, sheet_name, cost_col=None, dept_col=None):
+    """Cost summary row for a sheet that is already loaded as a DataFrame."""
+    actual_cost_col = find_cost_column(df.columns, cost_col)
+    if not actual_cost_col:
+        return cost_row(sheet_name, 0, 0, STATUS_NO_COST)
+    costs = pd.to_numeric(df[actual_cost_col], errors='coerce').fillna(0)
+    all_cost = float(costs.sum())
+    actual_dept_col = find_department_column(df.columns, dept_col)
+    if actual_dept_col:
+        exclude_maint_cost = float(costs[~maintenance_mask(df[actual_dept_col])].sum())
+    else:
+        exclude_maint_cost = all_cost
+    return cost_row(sheet_name, all_cost, exclude_maint_cost, STATUS_OK)
+
+
+def cost_row(sheet_name, all_cost, exclude_maint_cost, status):
+    return {
+        "Sheet Name": sheet_name,
+        "All Repair Cost": round(all_cost, 2),
+        "Exclude MAINTENANCE": round(exclude_maint_cost, 2),
+        "Status": status,
+    }
+
+
+def error_row(sheet_name, err):
+    return cost_row(sheet_name, 0, 0, f"❌ Error: {str(err)[:30]}...")
+
+
+def open_workbook(data):
+    from openpyxl import load_workbook
+    return load_workbook(BytesIO(data), read_only=True, data_only=True)
+
+
+def _init_worker(data):
+    global _worker_data, _worker_book
+    _worker_data = data
+    _worker_book = None
+
+
+def _scan_in_worker(sheet_name, skip_rows, cost_col, dept_col):
+    global _worker_book
+    try:
+        if _worker_book is None:
+            _worker_book = open_workbook(_worker_data)
+        return scan_sheet(_worker_book[sheet_name], sheet_name, skip_rows, cost_col, dept_col)
+    except Exception as e:
+        return error_row(sheet_name, e)
+
+
+def scan_costs(data, skip_rows=0, cost_col=None, dept_col=None, sheet_names=None, max_workers=None):
+    """
+    Cost summary rows (same shape as the dashboard's summary_data) for every sheet.
+    Sheets are spread over a process pool; small workbooks, a single sheet or
+    max_workers=1 run in-process.
+    """
+    if sheet_names is None:
+        book = open_workbook(data)
+        sheet_names = list(book.sheetnames)
+        book.close()
+    sheet_names = list(sheet_names)
+    if not sheet_names:
+        return []
+
+    if max_workers is None and len(data) < PARALLEL_MIN_BYTES:
+        max_workers = 1
+    max_workers = min(max_workers or os.cpu_count() or 1, len(sheet_names))
+    if max_workers <= 1:
+        book = open_workbook(data)
+        try:
+            rows = []
+            for s_name in sheet_names:
+                try:
+                    rows.append(scan_sheet(book[s_name], s_name, skip_rows, cost_col, dept_col))
+                except Exception as e:
+                    rows.append(error_row(s_name, e))
+            return rows
+        finally:
+            book.close()
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(data,)) as pool:
+        futures = [
+            pool.submit(_scan_in_worker, s_name, skip_rows, cost_col, dept_col) for s_name in sheet_names
+        ]
+        return [f.result() for f in futures]
+
+
+PARTIAL_KEYS = ('Department', 'Reason', 'Month')
+UNDATED = 'Undated'
+DEFAULT_EXCLUDED = ('MAINTENANCE',)
+MAX_CACHED_PARTIALS = 16     # workbooks
+MAX_CACHED_CUBES = 8         # cost/department selections per workbook
+
+
+def candidate_costs(df):
+    """float64 values (blank/text -> 0) of every column a cost selection could sum: all columns with numbers."""
+    out = {}
+    for name in df.columns:
+        col = df[name]
+        if pd.api.types.is_bool_dtype(col.dtype) or pd.api.types.is_datetime64_any_dtype(col.dtype):
+            continue
+        if not pd.api.types.is_numeric_dtype(col.dtype):
+            col = pd.to_numeric(col.astype(object), errors='coerce')
+            if not col.notna().any():
+                continue
+        out[name] = np.nan_to_num(col.to_numpy(dtype=np.float64, na_value=np.nan), nan=0.0)
+    return out
+
+
+def record_months(df, date_col):
+    """'YYYY-MM' per record, UNDATED where the sheet has no usable date."""
+    if date_col is None:
+        return np.full(len(df), UNDATED, dtype=object)
+    from timeaware import parse_timestamps
+    stamps = parse_timestamps(df, date_col)
+    months = np.datetime_as_string(stamps.astype('datetime64[M]'), unit='M').astype(object)
+    months[np.isnat(stamps)] = UNDATED
+    return months
+
+
+@dataclass(frozen=True)
+class SheetPartial:
+    sheet: str
+    department_column: str      # resolved department column, None when the sheet has none
+    groups: pd.DataFrame        # PARTIAL_KEYS + Records, one row per group
+    sums: pd.DataFrame          # row-aligned with groups, one column per candidate cost column
+
+
+def sheet_partial(df, schema, sheet_name, dept_col=None):
+    """One sheet reduced to record counts and cost sums per department x reason x month."""
+    actual_dept_col = find_department_column(df.columns, dept_col)
+    keys = [
+        pd.Series(group_labels(df, actual_dept_col, UNSPECIFIED, upper=True), name='Department'),
+        pd.Series(group_labels(df, schema.column('reason'), UNSPECIFIED), name='Reason'),
+        pd.Series(record_months(df, schema.column('date')), name='Month'),
+    ]
+    # Group by arrays, not column names: a cost column may itself be called "Department"
+    grouped = pd.DataFrame(candidate_costs(df), index=df.index).groupby(keys, sort=False)
+    records = grouped.size()
+    sums = grouped.sum().reindex(records.index)
+    return SheetPartial(sheet_name, actual_dept_col, records.rename('Records').reset_index(),
+                        sums.reset_index(drop=True))
+
+
+class CostCube:
+    """Cost per sheet x department x reason x month for one cost/department selection."""
+
+    def __init__(self, frame, statuses):
+        self.frame = frame          # Sheet, Department, Reason, Month, Records, Cost
+        self.statuses = statuses    # {sheet: status} in sheet order
+
+    def departments(self):
+        return sorted(self.frame['Department'].unique())
+
+    def summary(self, excluded=DEFAULT_EXCLUDED):
+        """Cost summary rows as scan_costs() returns them; 'Exclude MAINTENANCE' leaves out every excluded department."""
+        cost = self.frame.groupby('Sheet', sort=False)['Cost'].sum()
+        kept = self.frame[~self.frame['Department'].isin(set(excluded))].groupby('Sheet', sort=False)['Cost'].sum()
+        return [cost_row(s_name, float(cost.get(s_name, 0.0)), float(kept.get(s_name, 0.0)), status)
+                for s_name, status in self.statuses.items()]
+
+    def pivot(self, value='Cost'):
+        """Sheet x department table of cost (or record counts), with totals."""
+        table = (self.frame.groupby(['Sheet', 'Department'], sort=False)[value].sum()
+                 .unstack('Department', fill_value=0))
+        table = table.reindex(index=[s for s in self.statuses if s in table.index], columns=sorted(table.columns))
+        table['Total'] = table.sum(axis=1)
+        table.loc['Total'] = table.sum()
+        return table
+
+
+class CostPartials:
+    """SheetPartials of one workbook, built on first use per (sheet, resolved department column)."""
+
+    def __init__(self, workbook):
+        self.workbook = workbook
+        self._partials = {}
+        self._cubes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def partial(self, s_name, dept_col=None):
+        df = self.workbook.sheet(s_name)
+        key = (s_name, find_department_column(df.columns, dept_col))
+        with self._lock:
+            partial = self._partials.get(key)
+        if partial is None:
+            partial = sheet_partial(df, self.workbook.schema(s_name), s_name, dept_col)
+            with self._lock:
+                self._partials[key] = partial
+        return partial
+
+    def cube(self, cost_col=None, dept_col=None, sheet_names=None):
+        key = (cost_col, dept_col, None if sheet_names is None else tuple(sheet_names))
+        with self._lock:
+            if key in self._cubes:
+                self._cubes.move_to_end(key)
+                return self._cubes[key]
+        cube = self._build_cube(cost_col, dept_col, sheet_names)
+        with self._lock:
+            self._cubes[key] = cube
+            while len(self._cubes) > MAX_CACHED_CUBES:
+                self._cubes.popitem(last=False)
+        return cube
+
+    def _build_cube(self, cost_col, dept_col, sheet_names):
+        parts, statuses = [], {}
+        for s_name in self.workbook.sheet_names if sheet_names is None else sheet_names:
+            try:
+                partial = self.partial(s_name, dept_col)
+            except Exception as e:
+                statuses[s_name] = error_row(s_name, e)['Status']
+                continue
+            actual_cost_col = find_cost_column(self.workbook.sheet(s_name).columns, cost_col)
+            if not actual_cost_col:
+                statuses[s_name] = STATUS_NO_COST
+                continue
+            statuses[s_name] = STATUS_OK
+            # A cost column without a single number sums to 0, as in the streaming scan
+            cost = partial.sums[actual_cost_col] if actual_cost_col in partial.sums else 0.0
+            parts.append(partial.groups.assign(Sheet=s_name, Cost=cost))
+        columns = ['Sheet', *PARTIAL_KEYS, 'Records', 'Cost']
+        frame = pd.concat(parts, ignore_index=True)[columns] if parts else pd.DataFrame(columns=columns)
+        return CostCube(frame, statuses)
+
+
+# Partials per (content hash, skip_rows), shared by reruns and sessions
+_partials_cache = OrderedDict()
+_partials_lock = threading.Lock()
+
+
+def cost_partials(workbook):
+    key = (workbook.data_hash, workbook.skip_rows)
+    with _partials_lock:
+        partials = _partials_cache.get(key)
+        if partials is None:
+            partials = _partials_cache[key] = CostPartials(workbook)
+        _partials_cache.move_to_end(key)
+        while len(_partials_cache) > MAX_CACHED_PARTIALS:
+            _partials_cache.popitem(last=False)
+        return partials
@@ -0,0 +1,253 @@
+"""
+Workbook loading layer.
+
+Every sheet of an uploaded workbook is parsed once per (file content hash,
+skip_rows) pair and kept in a bounded LRU cache, so Streamlit reruns (unit
+changes, sheet switches, column picks) never go back to openpyxl for a file
+that has already been read. Parsed sheets are also written to a columnar
+sidecar (see sidecar.py), so reopening a known workbook skips openpyxl too.
+With skip_rows='auto' the header row of each sheet is detected instead, and
+every sheet carries its inferred column roles (see schema.py).
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+import sidecar
+from schema import AUTO_SKIP, NUMERIC_ROLES, SheetSchema, detect_header_rows, infer_roles
+
+# Cache bounds - override through the environment on small/large servers
+MAX_WORKBOOKS = int(os.environ.get("RELIABILITY_CACHE_WORKBOOKS", 8))
+MAX_CACHE_MB = float(os.environ.get("RELIABILITY_CACHE_MB", 512))
+
+
+def read_source_bytes(source):
+    """Return the raw bytes of an uploaded file, a path or a bytes object."""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    source.seek(0)
+    return source.read()
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def normalize_skip_rows(skip_rows):
+    return AUTO_SKIP if skip_rows == AUTO_SKIP else int(skip_rows)
+
+
+# Share of non-blank cells that must parse as numbers before a duration/cost text column is stored as numeric
+NUMERIC_THRESHOLD = 0.9
+
+
+def clean_frame(df, roles=None):
+    """
+    Clean a freshly parsed sheet once, so cached frames and sidecars need no re-cleaning:
+    strip header names, coerce mostly-numeric text in the schema's duration/cost columns with
+    pd.to_numeric(errors='coerce') (the coercion Workbook.fetch applies anyway) and turn other
+    mixed-type object columns (e.g. datetime/time cells, or codes like 101 and "PUMP") into strings.
+    """
+    df.columns = [str(c).strip() for c in df.columns]
+    if roles is None:
+        roles = infer_roles(df.columns)
+    numeric_cols = {roles[r] for r in NUMERIC_ROLES if r in roles}
+    for i in range(df.shape[1]):
+        col = df.iloc[:, i]
+        if not (col.dtype == object or pd.api.types.is_string_dtype(col.dtype)):
+            continue
+        present = col.notna() & (col.astype(str).str.strip() != "")
+        n_present = int(present.sum())
+        if n_present == 0:
+            continue
+        numeric = pd.to_numeric(col, errors="coerce") if df.columns[i] in numeric_cols else None
+        if numeric is not None and int((numeric.notna() & present).sum()) >= NUMERIC_THRESHOLD * n_present:
+            df.isetitem(i, numeric)
+        elif col.dtype == object and col[present].map(type).nunique() > 1:
+            df.isetitem(i, col.map(lambda v: v if pd.isna(v) else str(v)))
+    return df
+
+
+# Text columns with at most this share of distinct values are stored as categoricals
+CATEGORY_MAX_RATIO = 0.5
+CATEGORY_ROLES = ('department', 'reason', 'equipment')
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+
+def compact_column(col, categorical=False):
+    """Smallest lossless dtype for a cleaned column (float64 values are never rounded)."""
+    if pd.api.types.is_float_dtype(col.dtype) or pd.api.types.is_integer_dtype(col.dtype):
+        values = col.to_numpy(dtype=np.float64, na_value=np.nan)
+        finite = values[~np.isnan(values)]
+        if len(finite) == len(values) and np.array_equal(finite, np.round(finite)) and (
+                len(finite) == 0 or (finite.min() >= INT32_MIN and finite.max() <= INT32_MAX)):
+            return col.astype(np.int32)
+        as_f32 = values.astype(np.float32)
+        if np.array_equal(as_f32.astype(np.float64), values, equal_nan=True):
+            return col.astype(np.float32)
+        return col
+    if col.dtype == object or pd.api.types.is_string_dtype(col.dtype):
+        if len(col) and (categorical or col.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(col)):
+            return col.astype('category')
+    return col
+
+
+def compact_frame(df, roles=None):
+    """
+    Downcast a cleaned sheet in place: int32/float32 where the values survive the
+    round trip, categoricals for department/reason/equipment and repetitive text.
+    """
+    category_cols = {roles[r] for r in CATEGORY_ROLES if roles and r in roles}
+    for i, name in enumerate(df.columns):
+        df.isetitem(i, compact_column(df.iloc[:, i], categorical=name in category_cols))
+    return df
+
+
+def numeric_column(df, col):
+    """A column as float64 minutes/costs with blanks and text as 0 (the dashboard's coercion)."""
+    values = df[col]
+    if not pd.api.types.is_numeric_dtype(values):
+        values = pd.to_numeric(values, errors='coerce')
+    return np.nan_to_num(values.to_numpy(dtype=np.float64, na_value=np.nan), nan=0.0)
+
+
+class Workbook:
+    """All sheets of one workbook, parsed with a fixed skip_rows (or auto-detected header rows)."""
+
+    def __init__(self, data_hash, skip_rows, sheet_names, sheets, errors, header_rows=None):
+        self.data_hash = data_hash
+        self.skip_rows = skip_rows
+        self.sheet_names = sheet_names
+        self.sheets = sheets    # sheet name -> cleaned DataFrame
+        self.errors = errors    # sheet name -> exception raised while parsing
+        # sheet name -> raw rows skipped above the header
+        if header_rows is None:
+            header_rows = {name: 0 if skip_rows == AUTO_SKIP else int(skip_rows) for name in sheet_names}
+        self.header_rows = header_rows
+        self.schemas = {
+            name: SheetSchema(self.header_rows.get(name, 0), infer_roles(df.columns))
+            for name, df in sheets.items()
+        }
+        self.nbytes = sum(int(df.memory_usage(index=True, deep=True).sum()) for df in sheets.values())
+
+    def sheet(self, name):
+        """Return the cached frame for a sheet, re-raising its parse error if it failed."""
+        if name in self.errors:
+            raise self.errors[name]
+        return self.sheets[name]
+
+    def schema(self, name):
+        self.sheet(name)
+        return self.schemas[name]
+
+    def fetch(self, name, role):
+        """
+        Typed values of a sheet's column for a canonical role (None if the sheet has none):
+        float64 arrays for durations/costs (blank -> 0), the cleaned column otherwise.
+        """
+        col = self.schema(name).column(role)
+        if col is None:
+            return None
+        if role in NUMERIC_ROLES:
+            return numeric_column(self.sheets[name], col)
+        return self.sheets[name][col]
+
+
+def parse_workbook(data, skip_rows=0, data_hash=None):
+    """Parse every sheet of a workbook exactly once (one openpyxl load for all sheets)."""
+    data_hash = data_hash or content_hash(data)
+    header_rows = detect_header_rows(data) if skip_rows == AUTO_SKIP else None
+    sheets, errors = {}, {}
+    with pd.ExcelFile(BytesIO(data)) as xls:
+        sheet_names = list(xls.sheet_names)
+        if header_rows is None:
+            header_rows = {name: int(skip_rows) for name in sheet_names}
+        for s_name in sheet_names:
+            try:
+                df = xls.parse(s_name, skiprows=header_rows.get(s_name, 0))
+                roles = infer_roles([str(c).strip() for c in df.columns])
+                sheets[s_name] = compact_frame(clean_frame(df, roles), roles)
+            except Exception as e:
+                errors[s_name] = e
+    return Workbook(data_hash, skip_rows, sheet_names, sheets, errors, header_rows)
+
+
+def ingest_workbook(data, skip_rows=0, data_hash=None):
+    """Memory-map the workbook's columnar sidecar, or parse it with openpyxl and write one."""
+    data_hash = data_hash or content_hash(data)
+    if sidecar.SIDECAR_ENABLED:
+        stored = sidecar.read_sidecar(data_hash, skip_rows)
+        if stored is not None:
+            return Workbook(data_hash, skip_rows, *stored)
+
+    workbook = parse_workbook(data, skip_rows, data_hash)
+    if sidecar.SIDECAR_ENABLED:
+        try:
+            sidecar.write_sidecar(data_hash, skip_rows, workbook.sheet_names, workbook.sheets, workbook.errors,
+                                  header_rows=workbook.header_rows)
+        except Exception:
+            # The sidecar only speeds up later loads (e.g. read-only install dir) - never fail the upload
+            pass
+    return workbook
+
+
+class WorkbookCache:
+    """LRU cache of parsed workbooks bounded by entry count and memory."""
+
+    def __init__(self, max_entries=MAX_WORKBOOKS, max_bytes=MAX_CACHE_MB * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return sum(wb.nbytes for wb in self._entries.values())
+
+    def get(self, data, skip_rows=0, data_hash=None):
+        data_hash = data_hash or content_hash(data)
+        skip_rows = normalize_skip_rows(skip_rows)
+        key = (data_hash, skip_rows)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        # Load outside the lock so other sessions are not blocked meanwhile
+        workbook = ingest_workbook(data, skip_rows, data_hash)
+
+        with self._lock:
+            self._entries[key] = workbook
+            self._entries.move_to_end(key)
+            self._evict()
+        return workbook
+
+    def _evict(self):
+        # Always keep the most recently used workbook, even if it alone exceeds the cap
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.nbytes > self.max_bytes
+        ):
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Module level cache survives Streamlit reruns (the script re-executes, imports do not)
+_cache = WorkbookCache()
+
+
+def load_workbook(source, skip_rows=0, data_hash=None):
+    """Return the cached Workbook for an upload/path, parsing it on first use (data_hash skips re-hashing)."""
+    return _cache.get(read_source_bytes(source), skip_rows, data_hash)
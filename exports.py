@@ -0,0 +1,302 @@
+"""
+Report exports (Excel and PDF), built lazily and memoized.
+
+Building the xlsxwriter workbook and the ReportLab PDF (with its kaleido
+chart renders) is the most expensive part of a dashboard run, so nothing is
+built until the user asks for it. Finished reports are cached by a hash of
+their inputs, and PDFs are produced on a background worker so the dashboard
+keeps responding while they build.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+import pandas as pd
+
+from chart_render import chart_renderer
+
+MAX_CACHED_REPORTS = 16
+PDF_WORKERS = 2
+
+
+def export_key(kind, *inputs):
+    """Stable hash of everything a report depends on (data hash, columns, period, units...)."""
+    return hashlib.sha256(repr((kind,) + inputs).encode("utf-8")).hexdigest()
+
+
+def build_excel_report(pdf_data_store, df, derived=None):
+    """
+    Summary metrics + the processed sheet as an .xlsx file (bytes). `derived` maps
+    column names to arrays (coerced columns, operating time) merged in only here.
+    """
+    unit_conv = pdf_data_store['unit_conv']
+    excel_buffer = BytesIO()
+    with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
+        # Summary Sheet
+        summary_export_data = {
+            'Metric': ['Total Failures', f'Total Operating Time ({unit_conv})', 
+                      f'MTTF ({unit_conv})', 'Failure Rate (λ)',
+                      'Total Repairs', f'Total Repair Time ({unit_conv})',
+                      f'MTTR ({unit_conv})', 'Repair Rate (μ)'],
+            'Value': [pdf_data_store['num_failures'], f"{pdf_data_store['total_op_time']:.2f}",
+                     f"{pdf_data_store['mttf']:.2f}", f"{pdf_data_store['failure_rate']:.6f}",
+                     pdf_data_store['num_repairs'], f"{pdf_data_store['total_repair_time']:.2f}",
+                     f"{pdf_data_store['mttr']:.2f}", f"{pdf_data_store['repair_rate']:.6f}"]
+        }
+        summary_df_export = pd.DataFrame(summary_export_data)
+        summary_df_export.to_excel(writer, sheet_name='Summary', index=False)
+        
+        # Raw Data Sheet
+        raw = df.assign(**derived) if derived else df
+        raw.to_excel(writer, sheet_name='Raw Data', index=False)
+
+    return excel_buffer.getvalue()
+
+
+def chart_flowables(png, height, label, styles, spacer=True):
+    """ReportLab flowables for a rendered chart, or a note when rendering failed."""
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Image as RLImage, Paragraph, Spacer
+
+    if isinstance(png, BaseException):
+        return [Paragraph(f"{label} unavailable: {str(png)[:50]}", styles['Normal'])]
+    flowables = [RLImage(BytesIO(png), width=5.5*inch, height=height)]
+    if spacer:
+        flowables.append(Spacer(1, 0.1*inch))
+    return flowables
+
+
+def build_pdf_report(pdf_data_store, risk, fig_bar, fig_pie, fig_risk, summary_data):
+    """
+    Full dashboard report as a PDF (bytes). `risk` is the dashboard's risk summary
+    (None skips the ML section); fig_pie/fig_risk are None when those charts were not drawn.
+    """
+    # ReportLab is only needed here; importing it lazily keeps it off the dashboard's cold start
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+    from reportlab.lib.units import inch
+
+    pdf_buffer = BytesIO()
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Custom Styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        textColor=colors.HexColor('#1e3a8a'),
+        spaceAfter=6,
+        alignment=1  # Center
+    )
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=14,
+        textColor=colors.HexColor('#1e3a8a'),
+        spaceBefore=12,
+        spaceAfter=6
+    )
+
+    # Title Page
+    elements.append(Paragraph("🏭 Equipment Reliability & Failure Analytics Report", title_style))
+    elements.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
+    elements.append(Spacer(1, 0.2*inch))
+
+    # 1. Failure Rate Analysis
+    elements.append(Paragraph("🛑 Failure Rate Analysis", heading_style))
+    failure_data = [
+        ['Metric', 'Value'],
+        ['Total Failures', f"{pdf_data_store['num_failures']:,}"],
+        [f"Total Operating Time ({pdf_data_store['unit_conv']})", f"{pdf_data_store['total_op_time']:,.2f}"],
+        [f"MTTF ({pdf_data_store['unit_conv']})", f"{pdf_data_store['mttf']:,.2f}"],
+        ['Failure Rate (λ)', f"{pdf_data_store['failure_rate']:.6f}"]
+    ]
+    failure_table = Table(failure_data, colWidths=[3.5*inch, 2*inch])
+    failure_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    elements.append(failure_table)
+    elements.append(Spacer(1, 0.2*inch))
+
+    # 2. Repair Rate Analysis
+    elements.append(Paragraph("🔧 Repair Rate Analysis", heading_style))
+    repair_data = [
+        ['Metric', 'Value'],
+        ['Total Repairs', f"{pdf_data_store['num_repairs']:,}"],
+        [f"Total Repair Time ({pdf_data_store['unit_conv']})", f"{pdf_data_store['total_repair_time']:,.2f}"],
+        [f"MTTR ({pdf_data_store['unit_conv']})", f"{pdf_data_store['mttr']:,.2f}"],
+        ['Repair Rate (μ)', f"{pdf_data_store['repair_rate']:.6f}"]
+    ]
+    repair_table = Table(repair_data, colWidths=[3.5*inch, 2*inch])
+    repair_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    elements.append(repair_table)
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Rasterize all charts in memory through the warm kaleido renderer (no temp files)
+    charts = {'bar': (fig_bar, 800, 400)}
+    if fig_pie is not None:
+        charts['pie'] = (fig_pie, 800, 500)
+    if fig_risk is not None:
+        charts['risk'] = (fig_risk, 800, 350)
+    chart_png = chart_renderer.render(charts)
+
+    # 3. Charts as Images
+    elements.append(Paragraph("📊 Visualizations", heading_style))
+    
+    elements.extend(chart_flowables(chart_png['bar'], 2.75*inch, "Bar chart", styles))
+
+    if fig_pie is not None:
+        elements.extend(chart_flowables(chart_png['pie'], 3.4*inch, "Pie chart", styles))
+
+    # 4. Cost Summary (if available)
+    if summary_data:
+        elements.append(PageBreak())
+        elements.append(Paragraph("💰 Multi-Sheet Cost Summary", heading_style))
+
+        cost_table_data = [['Sheet Name', 'All Repair Cost', 'Exclude MAINTENANCE', 'Status']]
+        grand_all = 0
+        grand_excl = 0
+
+        for item in summary_data:
+            cost_table_data.append([
+                item['Sheet Name'],
+                f"{item['All Repair Cost']:,.2f}",
+                f"{item['Exclude MAINTENANCE']:,.2f}",
+                item.get('Status', 'OK')
+            ])
+            if item['Sheet Name'] != '✨ GRAND TOTAL':
+                grand_all += item['All Repair Cost']
+                grand_excl += item['Exclude MAINTENANCE']
+
+        # Add Grand Total Row
+        cost_table_data.append([
+            '✨ GRAND TOTAL',
+            f"{grand_all:,.2f}",
+            f"{grand_excl:,.2f}",
+            'SUMMARY'
+        ])
+
+        cost_table = Table(cost_table_data, colWidths=[1.5*inch, 1.5*inch, 1.5*inch, 1*inch])
+        cost_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#fef3c7')),  # Highlight grand total
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        elements.append(cost_table)
+
+    # 5. ML Predictions (if available)
+    if risk is not None:
+        elements.append(PageBreak())
+        elements.append(Paragraph("🤖 AI/ML Predictive Analytics", heading_style))
+        ml_metrics_data = [
+            ['Metric', 'Value'],
+            ['Current Risk Score', f"{risk.current_risk:.1f}/100"],
+            ['Average Risk Score', f"{risk.avg_risk:.1f}/100"],
+            ['Recent Failures (Last 10)', f"{risk.recent_failures}"],
+            ['Failure Frequency', f"{(risk.recent_failures/10)*100:.0f}%"],
+            ['Equipment Health', risk.health]
+        ]
+
+        ml_table = Table(ml_metrics_data, colWidths=[3.5*inch, 2*inch])
+        ml_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        elements.append(ml_table)
+        elements.append(Spacer(1, 0.1*inch))
+
+        if fig_risk is not None:
+            elements.extend(chart_flowables(chart_png['risk'], 2.4*inch, "Risk chart", styles, spacer=False))
+
+    # Build PDF
+    doc.build(elements)
+
+    return pdf_buffer.getvalue()
+
+
+class ExportCache:
+    """
+    Finished (or in-flight) reports keyed by export_key().
+    Entries are Futures, so a PDF still building on the worker is shared by every rerun.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_REPORTS, workers=PDF_WORKERS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-export")
+
+    def get(self, key):
+        """Future for a report that was already requested, else None."""
+        with self._lock:
+            future = self._entries.get(key)
+            if future is not None:
+                self._entries.move_to_end(key)
+            return future
+
+    def build(self, key, fn, *args):
+        """Build synchronously (memoized) and return the report bytes."""
+        future = self.get(key)
+        if future is None or (future.done() and future.exception() is not None):
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            self._store(key, future)
+        return future.result()
+
+    def submit(self, key, fn, *args):
+        """Start a background build unless one is cached/running; returns its Future."""
+        future = self.get(key)
+        if future is None or (future.done() and future.exception() is not None):
+            future = self._pool.submit(fn, *args)
+            self._store(key, future)
+        return future
+
+    def _store(self, key, future):
+        with self._lock:
+            self._entries[key] = future
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# Module level so cached reports and running builds survive Streamlit reruns
+export_cache = ExportCache()
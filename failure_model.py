@@ -0,0 +1,248 @@
+"""
+Learned next-failure model.
+
+A RandomForestRegressor predicts "records until the next failure" from the
+rolling features of the reliability engine (downtime, avg_downtime,
+downtime_trend, failure_frequency, records since the last failure) plus the
+label-encoded department and reason. It is trained once per workbook across
+all sheets with a parallel fit (n_jobs), written to MODEL_DIR under a
+fingerprint of the data and model settings, and kept in memory afterwards:
+reruns and re-uploads of the same file load it warm instead of retraining.
+Only the newest record of a sheet is scored (the dashboard shows nothing
+else), and the forecast is cached per model fingerprint and sheet.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from reliability import compute_risk
+
+MODEL_DIR = os.environ.get(
+    "RELIABILITY_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".model_cache"),
+)
+MODEL_VERSION = 1
+MODEL_PARAMS = dict(n_estimators=200, min_samples_leaf=5, max_features=0.6, oob_score=True, random_state=0)
+MAX_TRAIN_ROWS = 250_000       # rows sampled for the fit on very large workbooks
+MIN_TRAIN_ROWS = 30
+UNKNOWN = "__unknown__"
+MAX_LOADED_MODELS = 8
+MAX_CACHED_FORECASTS = 64
+
+FEATURES = ("downtime", "avg_downtime", "downtime_trend", "failure_frequency",
+            "records_since_failure", "department", "reason")
+
+
+@dataclass(frozen=True)
+class ModelForecast:
+    estimated_next_failure: float    # records until the next failure, for the newest record
+    confidence: float                # 0-100, from the spread of the individual trees
+    oob_r2: float
+
+
+class FailureModel:
+    """A fitted forest plus the label encoders it was trained with."""
+
+    def __init__(self, forest, encoders, n_train):
+        self.forest = forest
+        self.encoders = encoders      # 'department' / 'reason' -> fitted LabelEncoder
+        self.n_train = n_train
+
+    def encode(self, name, labels):
+        encoder = self.encoders[name]
+        labels = np.asarray(labels, dtype=object)
+        known = np.isin(labels, encoder.classes_)
+        return encoder.transform(np.where(known, labels, UNKNOWN))
+
+    def forecast(self, workbook, sheet_name):
+        """Predict the newest record of a sheet; None if the sheet has no downtime column."""
+        frame = sheet_features(workbook, sheet_name)
+        if frame is None:
+            return None
+        X = self.matrix({name: values[-1:] for name, values in frame.items()})
+        # The forest estimate is the mean over its trees, so one pass gives both estimate and spread
+        per_tree = np.array([tree.predict(X)[0] for tree in self.forest.estimators_])
+        mean = float(per_tree.mean())
+        confidence = max(0.0, 100 - per_tree.std() / mean * 100) if mean > 0 else 0.0
+        return ModelForecast(
+            estimated_next_failure=mean,
+            confidence=float(confidence),
+            oob_r2=float(getattr(self.forest, "oob_score_", np.nan)),
+        )
+
+    def matrix(self, frame):
+        return np.column_stack([
+            frame["downtime"], frame["avg_downtime"], frame["downtime_trend"], frame["failure_frequency"],
+            frame["records_since_failure"],
+            self.encode("department", frame["department"]), self.encode("reason", frame["reason"]),
+        ]).astype(np.float32)
+
+
+def _labels(workbook, sheet_name, role, n):
+    values = workbook.fetch(sheet_name, role)
+    if values is None:
+        return np.full(n, UNKNOWN, dtype=object)
+    labels = values.astype(str).str.strip().str.upper().to_numpy(dtype=object)
+    labels[values.isna().to_numpy()] = UNKNOWN
+    return labels
+
+
+def sheet_features(workbook, sheet_name):
+    """Per-record features and the 'records until next failure' target (NaN after the last failure)."""
+    try:
+        downtime = workbook.fetch(sheet_name, "downtime")
+    except Exception:
+        return None
+    if downtime is None or len(downtime) == 0:
+        return None
+    n = len(downtime)
+    risk = compute_risk(downtime)
+    index = np.arange(n)
+    failed = risk.failure_flag.astype(bool)
+
+    last_failure = np.maximum.accumulate(np.where(failed, index, -1))
+    records_since = np.where(last_failure >= 0, index - last_failure, index + 1)
+    # First failure strictly after each record
+    next_at_or_after = np.minimum.accumulate(np.where(failed, index, n)[::-1])[::-1]
+    next_after = np.append(next_at_or_after[1:], n)
+    target = np.where(next_after < n, next_after - index, np.nan)
+
+    return {
+        "downtime": downtime,
+        "avg_downtime": risk.avg_downtime,
+        "downtime_trend": risk.downtime_trend,
+        "failure_frequency": risk.failure_frequency,
+        "records_since_failure": records_since,
+        "department": _labels(workbook, sheet_name, "department", n),
+        "reason": _labels(workbook, sheet_name, "reason", n),
+        "target": target,
+    }
+
+
+def model_fingerprint(workbook):
+    """Key of the persisted model: the data, how it was read, and the model settings."""
+    digest = hashlib.sha256()
+    digest.update(workbook.data_hash.encode())
+    digest.update(repr(sorted(workbook.header_rows.items())).encode())
+    digest.update(repr((MODEL_VERSION, sorted(MODEL_PARAMS.items()), MAX_TRAIN_ROWS)).encode())
+    return digest.hexdigest()
+
+
+def train_model(workbook, n_jobs=-1):
+    """Fit one forest on the rows of every sheet; None when there is too little failure history."""
+    # scikit-learn takes over a second to import - only pay for it when a model is actually trained
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.preprocessing import LabelEncoder
+
+    frames = [f for f in (sheet_features(workbook, s) for s in workbook.sheet_names) if f is not None]
+    if not frames:
+        return None
+    encoders = {}
+    for name in ("department", "reason"):
+        encoder = LabelEncoder()
+        encoder.fit(np.concatenate([f[name] for f in frames] + [np.array([UNKNOWN], dtype=object)]))
+        encoders[name] = encoder
+    model = FailureModel(None, encoders, 0)
+
+    X = np.concatenate([model.matrix(f) for f in frames])
+    y = np.concatenate([f["target"] for f in frames])
+    trainable = ~np.isnan(y)
+    X, y = X[trainable], y[trainable]
+    if len(y) < MIN_TRAIN_ROWS:
+        return None
+    if len(y) > MAX_TRAIN_ROWS:
+        keep = np.random.default_rng(0).choice(len(y), MAX_TRAIN_ROWS, replace=False)
+        X, y = X[keep], y[keep]
+
+    model.forest = RandomForestRegressor(n_jobs=n_jobs, **MODEL_PARAMS).fit(X, y)
+    model.n_train = len(y)
+    return model
+
+
+class ModelStore:
+    """Fitted models in memory (LRU) backed by joblib files keyed by model_fingerprint."""
+
+    def __init__(self, root=None, max_loaded=MAX_LOADED_MODELS):
+        self.root = root or MODEL_DIR
+        self.max_loaded = max_loaded
+        self._models = OrderedDict()
+        self._forecasts = OrderedDict()   # (model fingerprint, sheet) -> ModelForecast
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key}.joblib")
+
+    def get(self, workbook, train=True):
+        key = model_fingerprint(workbook)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+
+        model = self._load(key)
+        trained = model is None and train
+        if trained:
+            model = train_model(workbook)
+            if model is not None:
+                self._save(key, model)
+        # Too little history is remembered too (as None), so reruns do not rebuild features and retrain
+        if model is not None or trained:
+            with self._lock:
+                self._models[key] = model
+                while len(self._models) > self.max_loaded:
+                    self._models.popitem(last=False)
+        return model
+
+    def forecast(self, workbook, sheet_name):
+        """Cached FailureModel.forecast for a sheet; None when no model is available (never trains)."""
+        key = (model_fingerprint(workbook), sheet_name)
+        with self._lock:
+            if key in self._forecasts:
+                self._forecasts.move_to_end(key)
+                return self._forecasts[key]
+        model = self.get(workbook, train=False)
+        if model is None:
+            return None
+        result = model.forecast(workbook, sheet_name)
+        with self._lock:
+            self._forecasts[key] = result
+            while len(self._forecasts) > MAX_CACHED_FORECASTS:
+                self._forecasts.popitem(last=False)
+        return result
+
+    def _load(self, key):
+        import joblib
+        try:
+            return joblib.load(self.path(key))
+        except Exception:
+            # Missing, corrupt or written by an incompatible scikit-learn - retrain
+            return None
+
+    def _save(self, key, model):
+        import joblib
+        tmp = None
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=".tmp_", dir=self.root)
+            os.close(fd)
+            joblib.dump(model, tmp)
+            os.replace(tmp, self.path(key))
+            tmp = None
+        except OSError:
+            # Persistence only saves later retrains - never fail the run
+            pass
+        finally:
+            if tmp is not None:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+
+
+# Module level so models survive Streamlit reruns
+model_store = ModelStore()
@@ -1,16 +1,199 @@
+"""
+Synthetic failure logs shaped like the plant exports, at any scale.
+
+    python generate_test_data.py                              # failure_data_new.xlsx, 4 sheets x 250 rows
+    python generate_test_data.py --rows 2000000 --sheets 12 -o big.xlsx
+    python generate_test_data.py --rows 10000000 --sheets 50 --format csv -o logs/
+
+Sheets carry what real exports carry: a skewed (Zipf) reason distribution,
+a MAINTENANCE share in the department column, messy header spellings
+("Repairing  cost   ", "Dept."), title rows above the header on some sheets,
+blank/zero downtime rows and the odd non-numeric cell. Excel sheets are
+capped at 1,048,576 rows, so very large runs spill into extra sheets; CSV
+output writes one file per sheet.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
 import pandas as pd
 
-# Creating a sample failure data file as per user requirements
-data = {
-    "Date": pd.date_range(start="2024-01-01", periods=10, freq="D"),
-    "Downtime_Minutes": [45, 0, 120, 0, 30, 0, 0, 60, 15, 0],
-    "Repair_Time_Minutes": [45, 0, 120, 0, 30, 0, 0, 60, 15, 0],
-    "Comments": ["Motor issue", "OK", "Belt break", "OK", "Sensor clean", "OK", "OK", "Oil leak", "Loose screw", "OK"]
+EXCEL_MAX_ROWS = 1_048_576 - 10   # header and title rows included
+SHEET_KINDS = ["Electrical", "Mechanical", "Process", "Thermal", "Hydraulic", "Utility", "Instrumentation", "Civil"]
+DEPARTMENTS = ["PROCESS", "CCM", "PANEL", "ELECTRICAL", "MECHANICAL", "UTILITY", "QUALITY", "PRODUCTION"]
+REASON_STEMS = ["PANEL PROBLEM", "MOTOR TRIP", "BELT BREAK", "OIL LEAK", "SENSOR FAULT", "INTERLOCK TRIP",
+                "BEARING FAILURE", "HYDRAULIC LEAK", "POWER FAILURE", "COOLING WATER", "LOOSE SCREW",
+                "NOZZLE JAM", "GEARBOX NOISE", "PUMP FAILURE", "CABLE DAMAGE", "VALVE STUCK"]
+
+# Header spellings seen in the field; every sheet picks one per column
+HEADER_VARIANTS = {
+    "start_date": ["Start Date", "Start Date ", "START DATE"],
+    "end_date": ["End Date", "End  Date"],
+    "start_time": ["Downtime start time", "Downtime Start Time "],
+    "end_time": ["Downtime end time", "Downtime End Time"],
+    "downtime": ["Equipment Downtime (Minutes)", "Equipment  Downtime (Minutes) ", "equipment downtime (min)"],
+    "loss": ["Production loss time (Minutes)", "Production Loss Time"],
+    "department": ["Department", "Dept.", "Department "],
+    "department_1": ["Department-1", "Section"],
+    "equipment": ["Equipment", "Machine", "Equipment Name"],
+    "cost": ["Repairing cost", "Repairing  cost   ", "Repairing cost         ", "Repair Cost"],
+    "reason": ["Reason", "Reason ", "Failure Reason"],
 }
 
-df = pd.DataFrame(data)
 
-# Save to Excel
-file_path = "failure_data_new.xlsx"
-df.to_excel(file_path, index=False)
-print(f"Sample file generated: {file_path}")
+def split_rows(total_rows, n_sheets, rng):
+    """Uneven but deterministic split of the rows over the sheets (every sheet gets at least one)."""
+    weights = rng.uniform(0.5, 1.5, n_sheets)
+    counts = np.floor(weights / weights.sum() * total_rows).astype(np.int64)
+    counts = np.maximum(counts, 1)
+    counts[0] += total_rows - counts.sum()
+    return counts
+
+
+def sheet_frame(n_rows, sheet_kind, rng, maintenance_share=0.5, zipf_a=1.4, n_reasons=60):
+    """One sheet of events in time order, with canonical column keys."""
+    reasons = np.array([f"{REASON_STEMS[i % len(REASON_STEMS)]}" + (f" {i // len(REASON_STEMS)}" if i >= len(REASON_STEMS) else "")
+                        for i in range(n_reasons)], dtype=object)
+    start = np.datetime64("2022-07-01T00:00")
+    # Events spread over ~15 months, several per day on busy days and none on others
+    minutes = np.sort(rng.integers(0, 450 * 1440, n_rows))
+    starts = start + minutes.astype("timedelta64[m]")
+    downtime = np.where(rng.random(n_rows) < 0.85, np.round(rng.lognormal(3.3, 1.0, n_rows)), 0).astype(np.float64)
+    downtime = np.minimum(downtime, 1440)
+    ends = starts + downtime.astype("timedelta64[m]")
+
+    maintenance = rng.random(n_rows) < maintenance_share
+    department = np.where(maintenance, "MAINTENANCE",
+                          np.array(DEPARTMENTS, dtype=object)[rng.integers(0, len(DEPARTMENTS), n_rows)])
+    reason_idx = np.minimum(rng.zipf(zipf_a, n_rows), n_reasons) - 1
+    cost = np.round(rng.gamma(2.0, 20.0, n_rows) * (1 + downtime / 120))
+
+    frame = pd.DataFrame({
+        "start_date": starts.astype("datetime64[D]").astype("datetime64[ns]"),
+        "end_date": ends.astype("datetime64[D]").astype("datetime64[ns]"),
+        "start_time": pd.to_datetime(starts).strftime("%H:%M:%S"),
+        "end_time": pd.to_datetime(ends).strftime("%H:%M:%S"),
+        "downtime": downtime,
+        "loss": downtime,
+        "department": department,
+        "department_1": sheet_kind,
+        "equipment": np.char.add(f"{sheet_kind[:4].upper()}-M", rng.integers(1, 13, n_rows).astype(str)).astype(object),
+        "cost": cost,
+        "reason": reasons[reason_idx],
+    })
+    # Export noise: a few blank downtime cells and text where a number belongs
+    blanks = rng.random(n_rows) < 0.002
+    frame["downtime"] = frame["downtime"].astype(object)
+    frame.loc[blanks, "downtime"] = None
+    frame.loc[rng.random(n_rows) < 0.0005, "downtime"] = "n/a"
+    return frame
+
+
+def messy_headers(frame, rng, messy=True):
+    names = {key: (variants[rng.integers(len(variants))] if messy else variants[0])
+             for key, variants in HEADER_VARIANTS.items()}
+    return frame.rename(columns=names)
+
+
+def title_rows(sheet_name, rng, enabled=True):
+    """0-3 rows written above the header (titles and blank spacer rows)."""
+    if not enabled or rng.random() < 0.5:
+        return []
+    rows = [[f"{sheet_name} failure data"]]
+    if rng.random() < 0.5:
+        rows.append([f"Plant {rng.integers(1, 9)} - exported {pd.Timestamp('2023-10-01'):%d.%m.%Y}"])
+    if rng.random() < 0.5:
+        rows.append([])
+    return rows
+
+
+def generate(rows=1000, sheets=4, seed=0, maintenance_share=0.5, messy=True, titles=True):
+    """Yield (sheet_name, title_rows, frame) for every sheet."""
+    rng = np.random.default_rng(seed)
+    for i, n_rows in enumerate(split_rows(rows, sheets, rng)):
+        kind = SHEET_KINDS[i % len(SHEET_KINDS)]
+        name = kind if i < len(SHEET_KINDS) else f"{kind} {i // len(SHEET_KINDS) + 1}"
+        # Excel cannot hold more than ~1M rows per sheet; spill the rest into continuation sheets
+        for part, offset in enumerate(range(0, int(n_rows), EXCEL_MAX_ROWS)):
+            part_rows = min(EXCEL_MAX_ROWS, int(n_rows) - offset)
+            part_name = name if part == 0 else f"{name} ({part + 1})"
+            frame = sheet_frame(part_rows, kind, rng, maintenance_share)
+            yield part_name[:31], title_rows(part_name, rng, titles), messy_headers(frame, rng, messy)
+
+
+def write_xlsx(path, sheets):
+    """
+    Write sheets row by row. xlsxwriter's constant_memory mode streams each row to disk
+    and can only write rows in order, so the rows are written here instead of by
+    DataFrame.to_excel (which writes column by column and would lose most cells).
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+    try:
+        for name, titles, frame in sheets:
+            worksheet = workbook.add_worksheet(name)
+            for r, row in enumerate(titles):
+                worksheet.write_row(r, 0, row)
+            header_row = len(titles)
+            worksheet.write_row(header_row, 0, list(frame.columns))
+            # Runs of adjacent columns that share a cell format: one write_row call per run
+            dates = [pd.api.types.is_datetime64_any_dtype(dtype) for dtype in frame.dtypes]
+            runs, start = [], 0
+            for c in range(1, len(dates) + 1):
+                if c == len(dates) or dates[c] != dates[start]:
+                    runs.append((start, c, date_format if dates[start] else None))
+                    start = c
+            values = frame.astype(object).where(frame.notna(), None)
+            for r, row in enumerate(values.itertuples(index=False, name=None), start=header_row + 1):
+                for lo, hi, cell_format in runs:
+                    worksheet.write_row(r, lo, row[lo:hi], cell_format)
+            print(f"  {name}: {len(frame):,} rows", file=sys.stderr)
+    finally:
+        workbook.close()
+
+
+def write_csv(directory, sheets):
+    os.makedirs(directory, exist_ok=True)
+    for name, titles, frame in sheets:
+        path = os.path.join(directory, f"{name}.csv")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            for row in titles:
+                f.write(",".join(str(v) for v in row) + "\n")
+            frame.to_csv(f, index=False)
+        print(f"  {path}: {len(frame):,} rows", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic failure logs for testing and benchmarks.")
+    parser.add_argument("--rows", type=int, default=1000, help="Total events over all sheets (1k-10M)")
+    parser.add_argument("--sheets", type=int, default=4, help="Number of sheets (1-200)")
+    parser.add_argument("--format", choices=["xlsx", "csv"], default="xlsx")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Output .xlsx file, or directory for CSV (default: failure_data_new.xlsx / synthetic_csv/)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--maintenance-share", type=float, default=0.5, help="Share of MAINTENANCE rows")
+    parser.add_argument("--clean-headers", action="store_true", help="Canonical header names, no title rows")
+    args = parser.parse_args(argv)
+    if not 1 <= args.sheets <= 200:
+        parser.error("--sheets must be between 1 and 200")
+    if args.rows < args.sheets:
+        parser.error("--rows must be at least --sheets")
+
+    output = args.output or ("failure_data_new.xlsx" if args.format == "xlsx" else "synthetic_csv")
+    sheets = generate(args.rows, args.sheets, args.seed, args.maintenance_share,
+                      messy=not args.clean_headers, titles=not args.clean_headers)
+    start = time.perf_counter()
+    if args.format == "xlsx":
+        write_xlsx(output, sheets)
+    else:
+        write_csv(output, sheets)
+    print(f"Sample data generated: {output} ({args.rows:,} rows, {time.perf_counter() - start:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Reliability metrics per equipment / department / reason across every sheet.
+
+All sheets are concatenated into one event frame and reduced in a single
+group-by pass to additive sums (records, operating time, failures, repair
+time, repairs) at the finest grain: sheet x equipment x department x reason.
+That base table is small and cached per workbook, so any coarser breakdown
+the UI asks for is a re-aggregation of it, not another pass over the rows.
+Formulas are the reliability engine's: MTTF = operating time / failures,
+MTTR = repair time / repairs, and repair figures skip MAINTENANCE rows as
+the dashboard does.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from column_mapping import maintenance_mask
+from reliability import operating_time
+
+GROUP_LEVELS = ('Sheet', 'Equipment', 'Department', 'Reason')
+SUM_COLUMNS = ('Records', 'Op Time', 'Failures', 'Repair Time', 'Repairs')
+UNSPECIFIED = 'Unspecified'
+MAX_CACHED_BASES = 16
+
+
+def group_labels(df, col, fallback, upper=False):
+    """Stripped text labels of a column; blanks become UNSPECIFIED (the fallback when there is no column)."""
+    if col is None:
+        return np.full(len(df), fallback, dtype=object)
+    values = df[col].astype(str).str.strip()
+    if upper:
+        values = values.str.upper()
+    return values.mask(df[col].isna() | (values == '') | (values.str.lower() == 'nan'), UNSPECIFIED).to_numpy(dtype=object)
+
+
+def event_frame(workbook, observation_period=1440):
+    """One row per record of every readable sheet, with the group labels and per-record terms."""
+    parts = []
+    for s_name in workbook.sheet_names:
+        try:
+            df = workbook.sheet(s_name)
+        except Exception:
+            continue
+        # Columns come from the workbook's inferred schema (see schema.py)
+        schema = workbook.schema(s_name)
+        downtime = workbook.fetch(s_name, 'downtime')
+        if downtime is None or len(df) == 0:
+            continue
+        dept_col = schema.column('department')
+        repair_ok = np.ones(len(df), dtype=bool)
+        if dept_col is not None:
+            repair_ok = ~maintenance_mask(df[dept_col])
+        # The repair time column when the sheet has one, else downtime - the dashboard's default
+        repair_values = workbook.fetch(s_name, 'repair_time')
+        repair_time = np.where(repair_ok, downtime if repair_values is None else repair_values, 0.0)
+        parts.append(pd.DataFrame({
+            'Sheet': s_name,
+            'Equipment': group_labels(df, schema.column('equipment'), s_name),
+            # Departments compare case-insensitively everywhere else ("Ccm" == "CCM")
+            'Department': group_labels(df, dept_col, UNSPECIFIED, upper=True),
+            'Reason': group_labels(df, schema.column('reason'), UNSPECIFIED),
+            'Records': 1,
+            'Op Time': operating_time(downtime, observation_period),
+            'Failures': (downtime > 0).astype(np.int64),
+            'Repair Time': repair_time,
+            'Repairs': (repair_time > 0).astype(np.int64),
+        }))
+    if not parts:
+        return pd.DataFrame(columns=list(GROUP_LEVELS + SUM_COLUMNS))
+    events = pd.concat(parts, ignore_index=True)
+    for level in GROUP_LEVELS:
+        events[level] = events[level].astype('category')
+    return events
+
+
+def group_base(workbook, observation_period=1440):
+    """Additive sums per sheet x equipment x department x reason, in minutes (one group-by pass)."""
+    events = event_frame(workbook, observation_period)
+    return (events.groupby(list(GROUP_LEVELS), observed=True, sort=False)[list(SUM_COLUMNS)]
+            .sum().reset_index())
+
+
+def grouped_metrics(base, by, conv_factor=1):
+    """MTTF/MTTR/λ/μ per group for any subset of GROUP_LEVELS, re-aggregated from the base table."""
+    by = [level for level in GROUP_LEVELS if level in by]
+    if by:
+        sums = base.groupby(by, observed=True)[list(SUM_COLUMNS)].sum().reset_index()
+    else:
+        sums = base[list(SUM_COLUMNS)].sum().to_frame().T
+    return metrics_from_sums(sums, by, conv_factor)
+
+
+def metrics_from_sums(sums, by, conv_factor=1):
+    """MTTF/MTTR/λ/μ from one row of SUM_COLUMNS (in minutes) per group, sorted by failures."""
+    op_time = sums['Op Time'].to_numpy(dtype=np.float64) / conv_factor
+    repair_time = sums['Repair Time'].to_numpy(dtype=np.float64) / conv_factor
+    failures = sums['Failures'].to_numpy(dtype=np.float64)
+    repairs = sums['Repairs'].to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mttf = np.where(failures > 0, op_time / failures, 0.0)
+        mttr = np.where(repairs > 0, repair_time / repairs, 0.0)
+        failure_rate = np.where(mttf > 0, 1 / mttf, 0.0)
+        repair_rate = np.where(mttr > 0, 1 / mttr, 0.0)
+    out = sums[by].copy() if by else pd.DataFrame(index=sums.index)
+    out['Records'] = sums['Records'].astype(np.int64).to_numpy()
+    out['Failures'] = failures.astype(np.int64)
+    out['Op Time'] = op_time
+    out['MTTF'] = mttf
+    out['Failure Rate (λ)'] = failure_rate
+    out['Repairs'] = repairs.astype(np.int64)
+    out['Repair Time'] = repair_time
+    out['MTTR'] = mttr
+    out['Repair Rate (μ)'] = repair_rate
+    return out.sort_values('Failures', ascending=False, ignore_index=True)
+
+
+_base_cache = OrderedDict()
+_base_lock = threading.Lock()
+
+
+def cached_group_base(workbook, observation_period=1440):
+    key = (workbook.data_hash, workbook.skip_rows, float(observation_period))
+    with _base_lock:
+        if key in _base_cache:
+            _base_cache.move_to_end(key)
+            return _base_cache[key]
+    base = group_base(workbook, observation_period)
+    with _base_lock:
+        _base_cache[key] = base
+        while len(_base_cache) > MAX_CACHED_BASES:
+            _base_cache.popitem(last=False)
+    return base
@@ -0,0 +1,165 @@
+"""
+History store check and benchmark: the SQL pushdown of history_store.py
+against grouped.py's pandas group-by on the same records.
+
+    python history_benchmark.py --rows 20000 200000 --workbooks 2 --periods 1440 30
+
+Generated workbooks (see generate_test_data.py) are ingested into a scratch
+store. For every group-by (none, one level, all four grouped.py levels),
+observation period and date window, HistoryStore.grouped must match
+grouped.grouped_metrics over grouped.event_frame of the same workbooks,
+filtered to the window by each record's parsed date:
+
+  records, failures, repairs               exactly equal
+  operating/repair time, MTTF/MTTR, λ/μ    equal up to float summation order
+
+The windows cover whole months (read from `monthly`), partial months at
+both ends (read from `events`), a window inside one month and an open end.
+A short period makes records longer than the period common, which
+exercises the operating-time correction. The exit code is 1 when anything
+differs.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_loader import parse_workbook
+from generate_test_data import generate, write_xlsx
+from grouped import SUM_COLUMNS, event_frame, grouped_metrics
+from history_store import HistoryFilter, HistoryStore
+from schema import AUTO_SKIP
+from timeaware import cached_timestamps
+
+RTOL = 1e-9
+EXACT = ("Records", "Failures", "Repairs")
+CLOSE = ("Op Time", "MTTF", "Failure Rate (λ)", "Repair Time", "MTTR", "Repair Rate (μ)")
+GROUPINGS = ((), ("Sheet",), ("Department",), ("Reason",), ("Equipment",), ("Sheet", "Department"),
+             ("Sheet", "Equipment", "Department", "Reason"))
+# Generated events run from 2022-07-01 over ~15 months
+WINDOWS = ((None, None), ("2022-08-17", "2023-02-09"), ("2022-11-03", "2022-11-20"), ("2023-01-15", None))
+
+
+def event_dates(workbook):
+    """'YYYY-MM-DD' (None when undated) for every row of grouped.event_frame, in the same order."""
+    parts = []
+    for s_name in workbook.sheet_names:
+        try:
+            df = workbook.sheet(s_name)
+        except Exception:
+            continue
+        schema = workbook.schema(s_name)
+        if workbook.fetch(s_name, 'downtime') is None or len(df) == 0:
+            continue
+        date_col = schema.column('date')
+        if date_col is None:
+            parts.append(np.full(len(df), None, dtype=object))
+            continue
+        stamps = cached_timestamps(workbook, s_name, date_col, schema.column('start_time'))
+        days = np.datetime_as_string(stamps.astype('datetime64[D]'), unit='D').astype(object)
+        days[np.isnat(stamps)] = None
+        parts.append(days)
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=object)
+
+
+def reference_events(workbooks, observation_period):
+    """grouped.event_frame of every workbook with a Date column, as one frame."""
+    frames = [event_frame(wb, observation_period).assign(Date=event_dates(wb)) for wb in workbooks]
+    events = pd.concat(frames, ignore_index=True)
+    for level in ("Sheet", "Equipment", "Department", "Reason"):
+        events[level] = events[level].astype(str)
+    return events
+
+
+def in_window(events, start, end):
+    if start is None and end is None:
+        return events
+    dates = events["Date"]
+    keep = dates.notna()
+    if start is not None:
+        keep &= dates >= start
+    if end is not None:
+        keep &= dates <= end
+    return events[keep.to_numpy(dtype=bool)]
+
+
+def mismatches(sql, expected, by):
+    """Differences between the store's grouped metrics and grouped.py's, as readable strings."""
+    by = list(by)
+    sql = sql.sort_values(by, ignore_index=True) if by else sql.reset_index(drop=True)
+    expected = expected.sort_values(by, ignore_index=True) if by else expected.reset_index(drop=True)
+    if len(sql) != len(expected):
+        return [f"{len(sql)} groups instead of {len(expected)}"]
+    if by and not (sql[by].astype(str).to_numpy() == expected[by].astype(str).to_numpy()).all():
+        return ["different group keys"]
+    bad = [c for c in EXACT if not np.array_equal(sql[c].to_numpy(np.int64), expected[c].to_numpy(np.int64))]
+    bad += [c for c in CLOSE if not np.allclose(sql[c].to_numpy(np.float64), expected[c].to_numpy(np.float64),
+                                                rtol=RTOL, atol=1e-12)]
+    return bad
+
+
+def run(n_rows, n_workbooks, sheets, periods, scratch):
+    store = HistoryStore(os.path.join(scratch, f"history_{n_rows}.sqlite"))
+    workbooks = []
+    start = time.perf_counter()
+    for seed in range(n_workbooks):
+        path = os.path.join(scratch, f"plant_{n_rows}_{seed}.xlsx")
+        write_xlsx(path, generate(n_rows, sheets, seed))
+        with open(path, "rb") as f:
+            workbook = parse_workbook(f.read(), AUTO_SKIP)
+        store.ingest(workbook, os.path.basename(path))
+        workbooks.append(workbook)
+    record = {"rows": n_rows * n_workbooks, "setup_s": round(time.perf_counter() - start, 2), "cases": 0,
+              "sql_s": 0.0, "pandas_s": 0.0, "mismatches": []}
+
+    for period in periods:
+        events = reference_events(workbooks, period)
+        for start_date, end_date in WINDOWS:
+            for by in GROUPINGS:
+                t = time.perf_counter()
+                window = in_window(events, start_date, end_date)[list(by) + list(SUM_COLUMNS)]
+                expected = grouped_metrics(window.astype({level: "category" for level in by}), by)
+                record["pandas_s"] += time.perf_counter() - t
+                t = time.perf_counter()
+                sql = store.grouped(by, HistoryFilter(start_date, end_date), period)
+                record["sql_s"] += time.perf_counter() - t
+                record["cases"] += 1
+                record["mismatches"] += [f"period {period:g}, {start_date}..{end_date}, by {'/'.join(by) or '-'}: "
+                                         f"{problem}" for problem in mismatches(sql, expected, by)]
+    record["identical"] = not record["mismatches"]
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the history store's SQL aggregates against grouped.py.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[20_000, 200_000], help="Rows per workbook")
+    parser.add_argument("--workbooks", type=int, default=2, help="Workbooks ingested per run")
+    parser.add_argument("--sheets", type=int, default=4)
+    parser.add_argument("--periods", type=float, nargs="+", default=[1440, 30],
+                        help="Observation periods in minutes; short ones exercise the downtime > period correction")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'rows':>10} {'cases':>6} {'setup':>8} {'sql':>9} {'pandas':>9}  identical")
+    with tempfile.TemporaryDirectory(prefix="history_benchmark_") as scratch:
+        for n_rows in args.rows:
+            record = run(n_rows, args.workbooks, args.sheets, args.periods, scratch)
+            results.append(record)
+            print(f"{record['rows']:>10,} {record['cases']:>6} {record['setup_s']:>7.1f}s {record['sql_s']:>8.3f}s "
+                  f"{record['pandas_s']:>8.3f}s  {record['identical']}")
+            for mismatch in record["mismatches"][:10]:
+                print(f"  differs: {mismatch}", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(r["identical"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,564 @@
+"""
+Embedded history store: every ingested workbook in one local SQLite file.
+
+Uploads are otherwise analyzed in isolation, so comparing periods meant
+re-uploading and re-parsing old workbooks. Here each workbook is stored once
+per content hash. Every record of every sheet becomes one row of `events`
+with:
+
+  * its date, sheet, department, reason and equipment;
+  * downtime, repair time and repair cost;
+  * a MAINTENANCE flag.
+
+Labels are cleaned as in grouped.py. Columns come from the inferred schema,
+and repair time falls back to the downtime column, as in the dashboard's
+defaults.
+
+At ingest the events are also summed into `monthly`, one row per sheet x
+month x department x reason x equipment x MAINTENANCE flag, indexed by
+month, sheet, department, reason and equipment. `events` is indexed by date,
+sheet and downtime.
+
+The dashboard's aggregations run as SQL: totals, cost with and without
+MAINTENANCE, MTTF/MTTR per group and reason counts. Filters and group-bys run
+inside SQLite, and only the aggregated rows come back. Whole months are read
+from `monthly`, which is far smaller than `events`. Date bounds inside a
+month are read from `events` through its date index.
+
+Operating time depends on the observation period, so it is never stored.
+It is computed as
+
+    sum(max(P - downtime, 0)) = P * records - sum(downtime) + sum(downtime - P over downtime > P)
+
+The last term touches only the rare records longer than the period, found
+through the downtime index.
+
+A new export of a file that is already stored (same file name, different
+content) replaces the older version only when it extends it: every stored
+sheet is still there and starts with exactly the stored rows. Then the rows
+they share are not counted twice. Any other workbook under the same name is
+kept next to the stored one (versions are keyed by content hash), and
+remove() drops a name explicitly. Set RELIABILITY_STORE=0 to disable the store and
+RELIABILITY_STORE_PATH to move it.
+
+    python history_store.py plant_exports/ "archive/*.xlsx"     # backfill, then time the queries
+"""
+import argparse
+import calendar
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from column_mapping import maintenance_mask
+from grouped import SUM_COLUMNS, UNSPECIFIED, group_labels, metrics_from_sums
+
+STORE_PATH = os.environ.get(
+    "RELIABILITY_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.sqlite"),
+)
+STORE_ENABLED = os.environ.get("RELIABILITY_STORE", "1") != "0"
+INSERT_BATCH = 50_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workbooks (
+    id          INTEGER PRIMARY KEY,
+    data_hash   TEXT NOT NULL UNIQUE,
+    name        TEXT NOT NULL,
+    ingested_at TEXT NOT NULL,
+    rows        INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sheets (
+    id          INTEGER PRIMARY KEY,
+    workbook_id INTEGER NOT NULL REFERENCES workbooks(id),
+    name        TEXT NOT NULL,
+    rows        INTEGER NOT NULL,
+    first_date  TEXT,
+    last_date   TEXT,
+    UNIQUE (workbook_id, name)
+);
+CREATE TABLE IF NOT EXISTS events (
+    sheet_id    INTEGER NOT NULL REFERENCES sheets(id),
+    seq         INTEGER NOT NULL,       -- record index within the sheet
+    event_date  TEXT,                   -- 'YYYY-MM-DD', NULL without a usable date
+    department  TEXT NOT NULL,
+    reason      TEXT NOT NULL,
+    equipment   TEXT NOT NULL,
+    downtime    REAL NOT NULL,          -- minutes
+    repair_time REAL NOT NULL,          -- minutes
+    cost        REAL NOT NULL,
+    maintenance INTEGER NOT NULL        -- 1 for MAINTENANCE rows (left out of repair figures)
+);
+CREATE TABLE IF NOT EXISTS monthly (
+    sheet_id    INTEGER NOT NULL REFERENCES sheets(id),
+    month       TEXT,                   -- 'YYYY-MM', NULL for undated events
+    department  TEXT NOT NULL,
+    reason      TEXT NOT NULL,
+    equipment   TEXT NOT NULL,
+    maintenance INTEGER NOT NULL,
+    records     INTEGER NOT NULL,
+    failures    INTEGER NOT NULL,
+    downtime    REAL NOT NULL,
+    repair_time REAL NOT NULL,
+    repairs     INTEGER NOT NULL,
+    cost        REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_date ON events (event_date);
+CREATE INDEX IF NOT EXISTS events_sheet ON events (sheet_id, seq);
+CREATE INDEX IF NOT EXISTS events_downtime ON events (downtime);
+CREATE INDEX IF NOT EXISTS monthly_month ON monthly (month);
+CREATE INDEX IF NOT EXISTS monthly_sheet ON monthly (sheet_id);
+CREATE INDEX IF NOT EXISTS monthly_department ON monthly (department);
+CREATE INDEX IF NOT EXISTS monthly_reason ON monthly (reason);
+CREATE INDEX IF NOT EXISTS monthly_equipment ON monthly (equipment);
+CREATE INDEX IF NOT EXISTS sheets_name ON sheets (name);
+"""
+
+MONTHLY_KEYS = ['month', 'department', 'reason', 'equipment', 'maintenance']
+
+# Group level -> SQL expression over a table aliased t (events or monthly)
+GROUP_EXPRESSIONS = {
+    'Workbook': "w.name",
+    'Sheet': "s.name",
+    'Equipment': "t.equipment",
+    'Department': "t.department",
+    'Reason': "t.reason",
+    'Year': "substr({month}, 1, 4)",
+    'Month': "{month}",
+}
+STORE_GROUP_LEVELS = tuple(GROUP_EXPRESSIONS)
+COST_COLUMNS = ('All Repair Cost', 'Exclude MAINTENANCE')
+SUMMED = SUM_COLUMNS + ('Downtime',) + COST_COLUMNS
+
+# The SUM_COLUMNS of grouped.py plus total downtime and the cost totals, in minutes
+EVENT_AGGREGATES = f"""
+    COUNT(*) AS "Records",
+    SUM(MAX(:period - t.downtime, 0)) AS "Op Time",
+    SUM(t.downtime > 0) AS "Failures",
+    SUM(CASE WHEN t.maintenance = 0 THEN t.repair_time ELSE 0 END) AS "Repair Time",
+    SUM(t.maintenance = 0 AND t.repair_time > 0) AS "Repairs",
+    SUM(t.downtime) AS "Downtime",
+    SUM(t.cost) AS "{COST_COLUMNS[0]}",
+    SUM(CASE WHEN t.maintenance = 0 THEN t.cost ELSE 0 END) AS "{COST_COLUMNS[1]}"
+"""
+# Op Time here still lacks the downtime > period correction (see the module docstring)
+MONTHLY_AGGREGATES = f"""
+    SUM(t.records) AS "Records",
+    :period * SUM(t.records) - SUM(t.downtime) AS "Op Time",
+    SUM(t.failures) AS "Failures",
+    SUM(CASE WHEN t.maintenance = 0 THEN t.repair_time ELSE 0 END) AS "Repair Time",
+    SUM(CASE WHEN t.maintenance = 0 THEN t.repairs ELSE 0 END) AS "Repairs",
+    SUM(t.downtime) AS "Downtime",
+    SUM(t.cost) AS "{COST_COLUMNS[0]}",
+    SUM(CASE WHEN t.maintenance = 0 THEN t.cost ELSE 0 END) AS "{COST_COLUMNS[1]}"
+"""
+CORRECTION_AGGREGATES = 'SUM(t.downtime - :period) AS "Op Time"'
+
+
+@dataclass(frozen=True)
+class HistoryFilter:
+    """Which stored events a query covers; empty fields do not filter."""
+    start: str = None           # 'YYYY-MM-DD', inclusive; a date bound drops undated events
+    end: str = None             # 'YYYY-MM-DD', inclusive
+    workbooks: tuple = ()
+    sheets: tuple = ()
+    departments: tuple = ()
+    reasons: tuple = ()
+    equipment: tuple = ()
+
+    def where(self, params):
+        """SQL condition on everything but the dates, over a table aliased t; adds to `params`."""
+        clauses = []
+        for column, values, subquery in (
+            ("t.sheet_id", self.workbooks,
+             "SELECT s2.id FROM sheets s2 JOIN workbooks w2 ON w2.id = s2.workbook_id WHERE w2.name IN ({})"),
+            ("t.sheet_id", self.sheets, "SELECT s2.id FROM sheets s2 WHERE s2.name IN ({})"),
+            ("t.department", self.departments, "{}"),
+            ("t.reason", self.reasons, "{}"),
+            ("t.equipment", self.equipment, "{}"),
+        ):
+            if not values:
+                continue
+            names = []
+            for value in values:
+                names.append(f"p{len(params)}")
+                params[names[-1]] = str(value)
+            clauses.append(f"{column} IN ({subquery.format(', '.join(':' + n for n in names))})")
+        return " AND ".join(clauses) or "1"
+
+
+def _month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def split_dates(start=None, end=None):
+    """
+    (whole months, day ranges) covering [start, end]: whole months as a (first, last) pair of
+    month-start dates read from `monthly` (None for an unbounded side, the pair None when no
+    month fits), the partial months at either edge as (first, last) day pairs read from `events`.
+    """
+    start = date.fromisoformat(str(start)) if start else None
+    end = date.fromisoformat(str(end)) if end else None
+    first = None if start is None else start if start.day == 1 else _month_end(start) + timedelta(days=1)
+    last = None if end is None else end.replace(day=1) if end == _month_end(end) else \
+        end.replace(day=1) - timedelta(days=1)
+    if last is not None:
+        last = last.replace(day=1)
+    if first is not None and last is not None and first > last:
+        return None, [(start, end)] if start <= end else []
+    edges = []
+    if start is not None and start != first:
+        edges.append((start, first - timedelta(days=1)))
+    if end is not None and end != _month_end(end):
+        edges.append((end.replace(day=1), end))
+    return (first, last), edges
+
+
+@dataclass(frozen=True)
+class IngestResult:
+    workbook_id: int
+    sheets: int
+    rows: int
+    seconds: float
+    stored: bool                # False when the content hash was already in the store
+    replaced: int = 0           # earlier versions of the same file that this one extends, dropped
+
+
+def _dates(workbook, s_name, schema):
+    """'YYYY-MM-DD' per record (None where the sheet has no usable date)."""
+    date_col = schema.column('date')
+    if date_col is None:
+        return np.full(len(workbook.sheet(s_name)), None, dtype=object)
+    from timeaware import cached_timestamps
+    try:
+        stamps = cached_timestamps(workbook, s_name, date_col, schema.column('start_time'))
+    except Exception:
+        return np.full(len(workbook.sheet(s_name)), None, dtype=object)
+    days = np.datetime_as_string(stamps.astype('datetime64[D]'), unit='D').astype(object)
+    days[np.isnat(stamps)] = None
+    return days
+
+
+def sheet_events(workbook, s_name):
+    """Rows of `events` for one sheet (without sheet_id), or None if the sheet has no downtime column."""
+    from data_loader import numeric_column
+    df = workbook.sheet(s_name)
+    schema = workbook.schema(s_name)
+    downtime = workbook.fetch(s_name, 'downtime')
+    if downtime is None:
+        return None
+    repair_time = workbook.fetch(s_name, 'repair_time')
+    cost_col = schema.column('cost')
+    dept_col = schema.column('department')
+    maintenance = maintenance_mask(df[dept_col]) if dept_col else np.zeros(len(df), dtype=bool)
+    return pd.DataFrame({
+        'seq': np.arange(len(df)),
+        'event_date': _dates(workbook, s_name, schema),
+        'department': group_labels(df, dept_col, UNSPECIFIED, upper=True),
+        'reason': group_labels(df, schema.column('reason'), UNSPECIFIED),
+        'equipment': group_labels(df, schema.column('equipment'), s_name),
+        'downtime': downtime,
+        'repair_time': downtime if repair_time is None else repair_time,
+        'cost': numeric_column(df, cost_col) if cost_col else np.zeros(len(df)),
+        'maintenance': maintenance.astype(np.int64),
+    })
+
+
+def monthly_rows(events):
+    """The `monthly` rows (without sheet_id) summing one sheet's events."""
+    parts = events.assign(
+        month=events['event_date'].str[:7],
+        failures=(events['downtime'] > 0).astype(np.int64),
+        repairs=(events['repair_time'] > 0).astype(np.int64),
+        records=1,
+    )
+    return (parts.groupby(MONTHLY_KEYS, dropna=False, sort=False)
+            [['records', 'failures', 'downtime', 'repair_time', 'repairs', 'cost']].sum().reset_index())
+
+
+def _values(series):
+    """A column as the Python values SQLite stores (None for missing)."""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _insert(conn, table, sheet_id, frame):
+    columns = [_values(frame[c]) for c in frame.columns]
+    sql = f"INSERT INTO {table} (sheet_id, {', '.join(frame.columns)}) VALUES ({', '.join('?' * (len(columns) + 1))})"
+    for lo in range(0, len(frame), INSERT_BATCH):
+        hi = min(lo + INSERT_BATCH, len(frame))
+        conn.executemany(sql, zip([sheet_id] * (hi - lo), *(c[lo:hi] for c in columns)))
+
+
+class HistoryStore:
+    """One SQLite file shared by every session; a connection per thread, writes serialized."""
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._pending = {}
+        self._executor = None
+        with self._write_lock:
+            self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=60)
+            # WAL: dashboard queries keep reading while an upload is being ingested
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA cache_size=-65536")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+        return conn
+
+    # --- ingest ---
+
+    def has_workbook(self, data_hash):
+        row = self.connection().execute("SELECT 1 FROM workbooks WHERE data_hash = ?", (data_hash,)).fetchone()
+        return row is not None
+
+    def ingest(self, workbook, name):
+        """Store every sheet of a workbook once per content hash; replaces versions of `name` it extends."""
+        start = time.perf_counter()
+        conn = self.connection()
+        with self._write_lock:
+            row = conn.execute("SELECT id, rows FROM workbooks WHERE data_hash = ?", (workbook.data_hash,)).fetchone()
+            if row is not None:
+                return IngestResult(row[0], 0, row[1], time.perf_counter() - start, stored=False)
+            frames = {}
+            for s_name in workbook.sheet_names:
+                try:
+                    events = sheet_events(workbook, s_name)
+                except Exception:
+                    continue
+                if events is not None:
+                    frames[s_name] = events
+            rows = sum(len(f) for f in frames.values())
+
+            with conn:
+                older = [r[0] for r in conn.execute("SELECT id FROM workbooks WHERE name = ?", (name,)).fetchall()
+                         if self._extends(conn, r[0], frames)]
+                for workbook_id in older:
+                    self._delete(conn, workbook_id)
+                workbook_id = conn.execute(
+                    "INSERT INTO workbooks (data_hash, name, ingested_at, rows) VALUES (?, ?, ?, ?)",
+                    (workbook.data_hash, name, datetime.now().isoformat(timespec='seconds'), rows)).lastrowid
+                for s_name, events in frames.items():
+                    dated = events['event_date'].dropna()
+                    sheet_id = conn.execute(
+                        "INSERT INTO sheets (workbook_id, name, rows, first_date, last_date) VALUES (?, ?, ?, ?, ?)",
+                        (workbook_id, s_name, len(events),
+                         dated.min() if len(dated) else None, dated.max() if len(dated) else None)).lastrowid
+                    _insert(conn, 'events', sheet_id, events)
+                    _insert(conn, 'monthly', sheet_id, monthly_rows(events))
+        return IngestResult(workbook_id, len(frames), rows, time.perf_counter() - start, stored=True,
+                            replaced=len(older))
+
+    @staticmethod
+    def _extends(conn, workbook_id, frames):
+        """True when every stored sheet of a workbook is a prefix of the same sheet in `frames`."""
+        stored = conn.execute("SELECT id, name, rows FROM sheets WHERE workbook_id = ?", (workbook_id,)).fetchall()
+        for sheet_id, s_name, rows in stored:
+            events = frames.get(s_name)
+            if events is None or len(events) < rows:
+                return False
+            columns = [c for c in events.columns if c != 'seq']
+            old = conn.execute(f"SELECT {', '.join(columns)} FROM events WHERE sheet_id = ? ORDER BY seq",
+                               (sheet_id,)).fetchall()
+            if old != list(zip(*(_values(events[c].iloc[:rows]) for c in columns))):
+                return False
+        return True
+
+    @staticmethod
+    def _delete(conn, workbook_id):
+        for table in ('events', 'monthly'):
+            conn.execute(f"DELETE FROM {table} WHERE sheet_id IN (SELECT id FROM sheets WHERE workbook_id = ?)",
+                         (workbook_id,))
+        conn.execute("DELETE FROM sheets WHERE workbook_id = ?", (workbook_id,))
+        conn.execute("DELETE FROM workbooks WHERE id = ?", (workbook_id,))
+
+    def remove(self, name):
+        """Drop every stored version of a workbook name."""
+        conn = self.connection()
+        with self._write_lock, conn:
+            for (workbook_id,) in conn.execute("SELECT id FROM workbooks WHERE name = ?", (name,)).fetchall():
+                self._delete(conn, workbook_id)
+
+    def submit(self, workbook, name):
+        """Ingest on a background thread (once per content hash); returns the future, None if already stored."""
+        if workbook.data_hash in self._pending:
+            return self._pending[workbook.data_hash]
+        if self.has_workbook(workbook.data_hash):
+            return None
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-ingest")
+        future = self._pending[workbook.data_hash] = self._executor.submit(self.ingest, workbook, name)
+        future.add_done_callback(lambda f: self._pending.pop(workbook.data_hash, None))
+        return future
+
+    # --- queries ---
+
+    def _query(self, sql, params=None):
+        return pd.read_sql_query(sql, self.connection(), params=params or {})
+
+    def workbooks(self):
+        return self._query("""
+            SELECT w.name AS "Workbook", w.ingested_at AS "Ingested", COUNT(s.id) AS "Sheets", w.rows AS "Records",
+                   MIN(s.first_date) AS "First Date", MAX(s.last_date) AS "Last Date"
+            FROM workbooks w LEFT JOIN sheets s ON s.workbook_id = w.id
+            GROUP BY w.id ORDER BY w.ingested_at DESC""")
+
+    def date_range(self):
+        """(first, last) stored event date as 'YYYY-MM-DD', (None, None) if nothing is dated."""
+        return tuple(self.connection().execute("SELECT MIN(first_date), MAX(last_date) FROM sheets").fetchone())
+
+    def distinct(self, level):
+        """Stored values of one group level (workbooks, sheets, departments, ...), sorted."""
+        if level in ('Workbook', 'Sheet'):
+            sql = f"SELECT DISTINCT name FROM {'workbooks' if level == 'Workbook' else 'sheets'} ORDER BY 1"
+        else:
+            expression = GROUP_EXPRESSIONS[level].format(month="t.month")
+            sql = f"SELECT DISTINCT {expression} FROM monthly t WHERE {expression} IS NOT NULL ORDER BY 1"
+        return [r[0] for r in self.connection().execute(sql)]
+
+    def _select(self, table, aggregates, by, condition, params, index=None):
+        month = "t.month" if table == 'monthly' else "substr(t.event_date, 1, 7)"
+        joins = ""
+        if 'Sheet' in by or 'Workbook' in by:
+            joins += " JOIN sheets s ON s.id = t.sheet_id"
+        if 'Workbook' in by:
+            joins += " JOIN workbooks w ON w.id = s.workbook_id"
+        select = "".join(f'{GROUP_EXPRESSIONS[level].format(month=month)} AS "{level}", ' for level in by)
+        group = f" GROUP BY {', '.join(str(i + 1) for i in range(len(by)))}" if by else ""
+        # The planner would otherwise walk a group-by column's index and look up every row
+        indexed = f" INDEXED BY {index}" if index else ""
+        return self._query(f"SELECT {select}{aggregates} FROM {table} t{indexed}{joins} WHERE {condition}{group}",
+                           params)
+
+    def sums(self, by=(), history_filter=None, observation_period=1440):
+        """SUM_COLUMNS, total downtime and both cost totals (minutes) per group of `by`, in SQL."""
+        history_filter = history_filter or HistoryFilter()
+        by = [level for level in STORE_GROUP_LEVELS if level in by]
+        params = {'period': float(observation_period)}
+        where = history_filter.where(params)
+        months, edges = split_dates(history_filter.start, history_filter.end)
+
+        parts = []
+        if months is not None:
+            first, last = months
+            month_bounds, day_bounds = [where], [where, "t.downtime > :period"]
+            if first is not None:
+                params['m_first'], params['d_first'] = first.strftime('%Y-%m'), first.isoformat()
+                month_bounds.append("t.month >= :m_first")
+                day_bounds.append("t.event_date >= :d_first")
+            if last is not None:
+                params['m_last'], params['d_last'] = last.strftime('%Y-%m'), _month_end(last).isoformat()
+                month_bounds.append("t.month <= :m_last")
+                day_bounds.append("t.event_date <= :d_last")
+            parts.append(self._select('monthly', MONTHLY_AGGREGATES, by, " AND ".join(month_bounds), params))
+            parts.append(self._select('events', CORRECTION_AGGREGATES, by, " AND ".join(day_bounds), params,
+                                      index='events_downtime'))
+        for i, (lo, hi) in enumerate(edges):
+            params[f'lo{i}'], params[f'hi{i}'] = lo.isoformat(), hi.isoformat()
+            parts.append(self._select('events', EVENT_AGGREGATES, by,
+                                      f"{where} AND t.event_date BETWEEN :lo{i} AND :hi{i}", params,
+                                      index='events_date'))
+
+        sums = pd.concat([p for p in parts if len(p)] or [pd.DataFrame(columns=by + list(SUMMED))],
+                         ignore_index=True)
+        sums = sums.reindex(columns=by + list(SUMMED)).fillna({c: 0 for c in SUMMED})
+        if by:
+            # Undated events group under a NULL month/year
+            return sums.groupby(by, dropna=False, sort=False)[list(SUMMED)].sum().reset_index()
+        return sums[list(SUMMED)].sum().to_frame().T
+
+    def totals(self, history_filter=None, observation_period=1440, conv_factor=1):
+        """Records, failures, downtime, MTTF/MTTR and both cost totals of the filtered events."""
+        sums = self.sums((), history_filter, observation_period)
+        metrics = metrics_from_sums(sums, [], conv_factor).iloc[0].to_dict()
+        metrics['Downtime'] = float(sums['Downtime'].iloc[0]) / conv_factor
+        for column in COST_COLUMNS:
+            metrics[column] = float(sums[column].iloc[0])
+        return metrics
+
+    def grouped(self, by, history_filter=None, observation_period=1440, conv_factor=1):
+        """MTTF/MTTR/λ/μ and cost totals per group (any of STORE_GROUP_LEVELS), most failures first."""
+        by = [level for level in STORE_GROUP_LEVELS if level in by]
+        sums = self.sums(by, history_filter, observation_period)
+        out = metrics_from_sums(sums, by, conv_factor)
+        if by:
+            return out.merge(sums[by + list(COST_COLUMNS)], on=by, how='left')
+        return out.assign(**{c: sums[c].to_numpy() for c in COST_COLUMNS})
+
+    def reason_counts(self, history_filter=None, limit=10):
+        """Failure counts per reason, most frequent first; the rest summed into an OTHERS row."""
+        sums = self.sums(['Reason'], history_filter)
+        counts = (sums.loc[sums['Failures'] > 0, ['Reason', 'Failures']]
+                  .rename(columns={'Failures': 'Count'})
+                  .sort_values(['Count', 'Reason'], ascending=[False, True], ignore_index=True))
+        counts['Count'] = counts['Count'].astype(np.int64)
+        if limit and len(counts) > limit:
+            others = pd.DataFrame([{'Reason': 'OTHERS', 'Count': int(counts['Count'].iloc[limit:].sum())}])
+            counts = pd.concat([counts.head(limit), others], ignore_index=True)
+        return counts
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def history_store(path=None):
+    """The shared store (module level, so it survives Streamlit reruns)."""
+    global _store
+    with _store_lock:
+        if _store is None or (path and os.path.abspath(path) != os.path.abspath(_store.path)):
+            _store = HistoryStore(path or STORE_PATH)
+        return _store
+
+
+def main(argv=None):
+    from batch_metrics import expand_inputs, skip_rows_arg
+    from data_loader import ingest_workbook, read_source_bytes
+    from schema import AUTO_SKIP
+
+    parser = argparse.ArgumentParser(description="Ingest workbooks into the history store and time its queries.")
+    parser.add_argument("inputs", nargs="*", help="Workbook files, directories or glob patterns to ingest")
+    parser.add_argument("--store", default=STORE_PATH, help="SQLite file (default: %(default)s)")
+    parser.add_argument("--skip-rows", type=skip_rows_arg, default=AUTO_SKIP,
+                        help="Title rows above the header, or 'auto' to detect the header row of each sheet")
+    parser.add_argument("--group-by", nargs="*", default=['Department', 'Month'], choices=STORE_GROUP_LEVELS,
+                        help="Group levels of the timed query")
+    args = parser.parse_args(argv)
+
+    store = history_store(args.store)
+    for path in expand_inputs(args.inputs):
+        try:
+            result = store.ingest(ingest_workbook(read_source_bytes(path), args.skip_rows), os.path.basename(path))
+        except Exception as e:
+            print(f"{path}: ❌ {str(e)[:80]}", file=sys.stderr)
+            continue
+        status = f"{result.rows:,} rows, {result.sheets} sheets" if result.stored else "already stored"
+        print(f"{path}: {status} ({result.seconds:.1f}s)", file=sys.stderr)
+
+    for label, fn in (("totals", lambda: store.totals()),
+                      ("grouped " + "/".join(args.group_by), lambda: store.grouped(args.group_by)),
+                      ("reason counts", lambda: store.reason_counts())):
+        start = time.perf_counter()
+        result = fn()
+        rows = len(result) if isinstance(result, pd.DataFrame) else 1
+        print(f"{label:<32} {(time.perf_counter() - start) * 1000:>8.1f} ms  {rows:,} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
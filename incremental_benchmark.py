@@ -0,0 +1,146 @@
+"""
+Incremental metrics check and benchmark: IncrementalStore.update on weekly
+re-uploads of an append-only sheet against a full recompute with the
+reliability engine.
+
+    python incremental_benchmark.py --rows 10000 100000 1000000 --uploads 5
+
+A synthetic sheet is uploaded --uploads times, each export being the
+previous one plus new rows at the bottom (a new workbook hash each time, the
+same sheet and column selection, as in the dashboard). The store must fold
+every re-upload in as an append, and its snapshot must match
+compute_reliability / compute_risk / predict_next_failure on the whole
+export:
+
+  counts, per-record operating time and risk scores   exactly equal
+  MTTF/MTTR, op/repair time sums, average risk,        equal up to float
+  interval mean/std and the next-failure estimate      summation order
+
+A last upload with one edited historical record must fall back to a full
+rebuild and match as well. The exit code is 1 when anything differs.
+"""
+import argparse
+import json
+import math
+import sys
+import time
+
+import numpy as np
+
+from incremental import IncrementalStore
+from reliability import compute_reliability, compute_risk, predict_next_failure
+from risk_benchmark import synthetic_downtime
+
+OBSERVATION_PERIOD = 1440
+CONV_FACTOR = 60
+RTOL = 1e-9
+
+EXACT = ("num_failures", "num_repairs", "recent_failures", "total_failures", "records_since_failure")
+CLOSE = ("total_op_time", "mttf", "failure_rate", "total_repair_time", "mttr", "repair_rate", "current_risk",
+         "avg_risk", "avg_interval", "std_interval", "estimated_next_failure", "confidence")
+
+
+def synthetic_sheet(n_rows, seed=0):
+    """Downtime, repair time and the non-MAINTENANCE mask of one sheet."""
+    rng = np.random.default_rng(seed + 1)
+    downtime = synthetic_downtime(n_rows, seed)
+    repair_time = np.where(downtime > 0, downtime * rng.uniform(0.2, 1.0, n_rows), 0.0).round(1)
+    repair_mask = rng.random(n_rows) >= 0.15
+    return downtime, repair_time, repair_mask
+
+
+def flat(reliability, risk, prediction):
+    values = {name: getattr(reliability, name) for name in
+              ("num_failures", "num_repairs", "total_op_time", "mttf", "failure_rate", "total_repair_time", "mttr",
+               "repair_rate")}
+    values.update(current_risk=risk.current_risk, avg_risk=risk.avg_risk,
+                  recent_failures=risk.recent_failures, total_failures=risk.total_failures)
+    if prediction is not None:
+        values.update({name: getattr(prediction, name) for name in
+                       ("records_since_failure", "avg_interval", "std_interval", "estimated_next_failure",
+                        "confidence")})
+    return values
+
+
+def recompute(downtime, repair_time, repair_mask):
+    reliability = compute_reliability(downtime, repair_time, OBSERVATION_PERIOD, CONV_FACTOR, repair_mask)
+    risk = compute_risk(downtime)
+    return reliability, risk, predict_next_failure(risk.failure_flag)
+
+
+def mismatches(snapshot, full):
+    """Names of the metrics where an incremental snapshot differs from the full recompute."""
+    reliability, risk, prediction = full
+    got, want = flat(snapshot.reliability, snapshot.risk, snapshot.prediction), flat(reliability, risk, prediction)
+    bad = [name for name in sorted(set(got) | set(want))
+           if name not in got or name not in want
+           or (got[name] != want[name] if name in EXACT
+               else not math.isclose(got[name], want[name], rel_tol=RTOL, abs_tol=1e-12))]
+    if not np.array_equal(snapshot.reliability.operating_time, reliability.operating_time):
+        bad.append("operating_time series")
+    if not np.array_equal(snapshot.risk.risk_score, risk.risk_score):
+        bad.append("risk_score series")
+    return bad
+
+
+def run(n_rows, uploads, seed=0):
+    downtime, repair_time, repair_mask = synthetic_sheet(n_rows, seed)
+    store = IncrementalStore()
+    lineage = ("Sheet1", "Downtime", "Repair Time", "Department", OBSERVATION_PERIOD)
+    ends = np.linspace(n_rows // uploads, n_rows, uploads).astype(int)
+    record = {"rows": n_rows, "uploads": uploads, "mismatches": [], "modes": []}
+
+    def upload(i, columns, n):
+        start = time.perf_counter()
+        snap = store.update((f"export-{i}",) + lineage, *(c[:n] for c in columns),
+                            observation_period=OBSERVATION_PERIOD, conv_factor=CONV_FACTOR, lineage=lineage)
+        seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        full = recompute(*(c[:n] for c in columns))
+        full_seconds = time.perf_counter() - start
+        record["modes"].append(snap.mode)
+        record["mismatches"] += [f"upload {i}: {name}" for name in mismatches(snap, full)]
+        return seconds, full_seconds
+
+    columns = (downtime, repair_time, repair_mask)
+    for i, n in enumerate(ends):
+        record["incremental_s"], record["full_s"] = upload(i, columns, n)
+
+    # Edited history: the store must notice and rebuild
+    edited = downtime.copy()
+    edited[len(edited) // 2] += 1
+    upload(uploads, (edited, repair_time, repair_mask), n_rows)
+
+    expected = ["full"] + ["append"] * (uploads - 1) + ["full"]
+    record["modes_ok"] = record["modes"] == expected
+    record["identical"] = record["modes_ok"] and not record["mismatches"]
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check incremental re-uploads against a full recompute.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--uploads", type=int, default=5, help="Exports per sheet, each appending rows")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'rows':>10} {'uploads':>8} {'last append':>12} {'full':>9}  identical")
+    for n_rows in args.rows:
+        record = run(n_rows, max(args.uploads, 2), args.seed)
+        results.append(record)
+        print(f"{n_rows:>10,} {record['uploads']:>8} {record['incremental_s']:>11.4f}s {record['full_s']:>8.4f}s  "
+              f"{record['identical']}")
+        if not record["modes_ok"]:
+            print(f"  unexpected modes: {record['modes']}", file=sys.stderr)
+        for mismatch in record["mismatches"][:10]:
+            print(f"  differs: {mismatch}", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(r["identical"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
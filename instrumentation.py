@@ -0,0 +1,286 @@
+"""
+Per-stage timing, memory and profiling for the dashboard.
+
+Each stage of a rerun runs inside `run.stage(name)`. Stages are loading,
+column mapping, calculations, each chart, the cost summary, grouped metrics,
+the ML section and the exports. With instrumentation off, a stage is a shared
+no-op context manager, so the dashboard pays one method call per stage.
+
+With instrumentation on, each stage records three things:
+
+  * wall time;
+  * rows processed;
+  * peak memory: the process peak-RSS counter, reset per stage on Linux, plus
+    Python allocation peaks when trace_allocations is set.
+
+The run is then appended as one JSON line to LOG_DIR/stage_runs.jsonl.
+Builds that finish on a background worker (the PDF report) log their own
+line when they complete.
+
+Allocation tracing is process-wide, so it is shared: it stays on while any
+live run of any session asks for it. Streamlit interrupts a rerun without
+reaching run.finish(); such a run stops owning the tracing when its session
+starts the next run, or when the run object is collected, whichever is
+first. Every new run then stops tracing that no run owns.
+
+A single rerun can also be captured with cProfile, or with pyinstrument when
+it is installed. The profile is written to LOG_DIR/profiles.
+
+Peak RSS is process-wide: with several sessions running at once, a stage's
+peak includes their allocations too.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+LOG_DIR = os.environ.get(
+    "RELIABILITY_LOG_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs"),
+)
+STAGE_LOG = "stage_runs.jsonl"
+DEBUG_DEFAULT = os.environ.get("RELIABILITY_DEBUG", "0") == "1"
+PROFILE_TOP = 30
+MAX_BACKGROUND_RECORDS = 50
+
+_log_lock = threading.Lock()
+# Finished background stages, newest last: (session, record dict)
+background_records = deque(maxlen=MAX_BACKGROUND_RECORDS)
+
+# Runs that want tracemalloc on; interrupted runs drop out when collected
+_tracing_runs = weakref.WeakSet()
+_tracing_lock = threading.Lock()
+_tracing_started = False     # True while tracing runs because a run started it (not PYTHONTRACEMALLOC)
+
+
+def _claim_tracing(run, wanted):
+    """Register (or release) a run's use of tracemalloc and start/stop tracing to match the live owners."""
+    global _tracing_started
+    with _tracing_lock:
+        # A session runs one script at a time, so its earlier runs are over (finished or interrupted)
+        for other in [r for r in _tracing_runs if r is not run and r.session == run.session]:
+            _tracing_runs.discard(other)
+        if wanted:
+            _tracing_runs.add(run)
+        else:
+            _tracing_runs.discard(run)
+        if _tracing_runs and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started = True
+        elif not _tracing_runs and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+def rss_kb(field):
+    """A memory field of /proc/self/status ('VmRSS', 'VmHWM') in kB; None where unavailable."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Reset the process peak-RSS counter (Linux); False where that is not possible."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+@dataclass
+class StageRecord:
+    stage: str
+    rows: int = None
+    seconds: float = None
+    peak_rss_mb: float = None
+    py_peak_mb: float = None
+    error: str = None
+
+    def as_dict(self):
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+
+@dataclass(frozen=True)
+class ProfileResult:
+    tool: str           # 'cProfile' or 'pyinstrument'
+    path: str           # .prof (pstats) or .html file, None if it could not be written
+    text: str           # top functions / call tree as plain text
+
+
+class _NullStage:
+    """Stage used when instrumentation is off; accepts `.rows = n` and records nothing."""
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, run, record):
+        self.run = run
+        self.record = record
+
+    def __enter__(self):
+        self.peak_resettable = reset_peak_rss()
+        self.rss_before = rss_kb("VmRSS")
+        if self.run.trace_allocations:
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        record = self.record
+        record.seconds = round(time.perf_counter() - self.start, 4)
+        if self.run.trace_allocations:
+            record.py_peak_mb = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        if self.peak_resettable and self.rss_before is not None:
+            record.peak_rss_mb = round(max(rss_kb("VmHWM") - self.rss_before, 0) / 1024, 1)
+        # Streamlit's rerun/stop signals are BaseExceptions, not errors
+        if exc_type is not None and issubclass(exc_type, Exception):
+            record.error = f"{exc_type.__name__}: {str(exc)[:200]}"
+        self.run.stages.append(record)
+        return False
+
+
+def _start_profiler():
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    profiler = Profiler(async_mode="disabled")
+    profiler.start()
+    return profiler
+
+
+def _stop_profiler(profiler, stem):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        tool, suffix, text, save = "cProfile", ".prof", out.getvalue(), profiler.dump_stats
+    else:
+        profiler.stop()
+        html = profiler.output_html()
+
+        def save(path):
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(html)
+        tool, suffix, text = "pyinstrument", ".html", profiler.output_text(unicode=False, color=False)
+    path = os.path.join(LOG_DIR, "profiles", stem + suffix)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        save(path)
+    except OSError:
+        path = None
+    return ProfileResult(tool, path, text)
+
+
+def write_log(entry, log_dir=None):
+    log_dir = log_dir or LOG_DIR
+    try:
+        os.makedirs(log_dir, exist_ok=True)
+        line = json.dumps(entry, default=str)
+        with _log_lock, open(os.path.join(log_dir, STAGE_LOG), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError:
+        # Diagnostics must never break the dashboard
+        pass
+
+
+class RunRecorder:
+    """Stage records of one script run; a no-op unless `enabled` (or `profile`) is set."""
+
+    def __init__(self, enabled=False, trace_allocations=False, profile=False, session=None, run_id=0):
+        self.enabled = enabled
+        self.trace_allocations = enabled and trace_allocations
+        self.session = session
+        self.run_id = run_id
+        self.stages = []
+        self.context = {}
+        self.profile = None
+        self.started = time.perf_counter()
+        self.timestamp = datetime.now()
+        _claim_tracing(self, self.trace_allocations)
+        self._profiler = _start_profiler() if profile else None
+
+    def stage(self, name, rows=None):
+        """Context manager timing one stage; `as s` gives the record, so `s.rows` can be set inside."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, StageRecord(name, rows))
+
+    def annotate(self, **context):
+        """Attach run context (file hash, sheet, ...) to the log line."""
+        if self.enabled:
+            self.context.update(context)
+
+    def background(self, name, fn, rows=None):
+        """Wrap fn for a worker thread so it logs its own stage record when it finishes."""
+        if not self.enabled:
+            return fn
+        session, run_id, context = self.session, self.run_id, dict(self.context)
+
+        def timed(*args):
+            record = StageRecord(name, rows)
+            start = time.perf_counter()
+            try:
+                return fn(*args)
+            except Exception as e:
+                record.error = f"{type(e).__name__}: {str(e)[:200]}"
+                raise
+            finally:
+                record.seconds = round(time.perf_counter() - start, 4)
+                background_records.append((session, record.as_dict()))
+                write_log({"timestamp": datetime.now().isoformat(timespec="seconds"), "session": session,
+                           "run": run_id, "background": True, **context, "stages": [record.as_dict()]})
+        return timed
+
+    def finish(self):
+        """Stop profiling, write the run's log line and return it (None when disabled)."""
+        total = time.perf_counter() - self.started
+        if self._profiler is not None:
+            stem = f"{self.timestamp:%Y%m%d_%H%M%S}_{self.session}_{self.run_id}"
+            self.profile = _stop_profiler(self._profiler, stem)
+            self._profiler = None
+        _claim_tracing(self, False)
+        if not self.enabled:
+            return None
+        entry = {
+            "timestamp": self.timestamp.isoformat(timespec="seconds"),
+            "session": self.session,
+            "run": self.run_id,
+            **self.context,
+            "total_seconds": round(total, 4),
+            "stages": [r.as_dict() for r in self.stages],
+        }
+        if self.profile is not None:
+            entry["profile"] = self.profile.path
+        write_log(entry)
+        return entry
+
+    def session_background(self):
+        """Background stage records of this session, newest first."""
+        return [rec for session, rec in reversed(background_records) if session == self.session]
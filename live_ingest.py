@@ -0,0 +1,253 @@
+"""
+Live ingest: tail CSV failure logs as the plant historian appends to them.
+
+The source is one CSV file or a drop folder of them (each file is treated
+like a sheet). A poll reads only the bytes past each file's last offset and
+parses only the complete lines among them; a half-written last line waits for
+the next poll. The parsed rows are then folded into running state:
+
+  * the incremental reliability state (MTTF/MTTR, failure/repair rates,
+    next-failure estimate, causal risk; see incremental.advance_state);
+  * cost totals with and without MAINTENANCE;
+  * a bounded tail of risk scores for the trend chart.
+
+History is never re-read. The exception is a file that was truncated or
+replaced (smaller than its offset, or a new inode): it is rebuilt from its
+first line. Title rows above the header are skipped with the same
+header detection as Excel sheets, and column roles come from the schema
+synonyms. One poll parses at most MAX_POLL_BYTES per file, so a burst of
+events is absorbed over a few refreshes instead of stalling one.
+"""
+import csv
+import glob
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from column_mapping import maintenance_mask
+from incremental import advance_state, snapshot
+from schema import HEADER_SCAN_ROWS, detect_header_row, header_score, infer_roles
+
+MAX_POLL_BYTES = 32 * 2**20     # per file and poll
+TREND_POINTS = 5000             # risk scores kept per file for the trend chart
+HEADER_SCAN_BYTES = 256 * 2**10
+MAX_FEEDS = 8
+
+
+def _scan_value(value):
+    """CSV cells are all text; numbers must not look like header labels."""
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+class CsvTail:
+    """Byte offset into one growing CSV file, past its header."""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.columns = None
+        self.identity = None
+
+    def read(self, max_bytes=MAX_POLL_BYTES):
+        """
+        (complete new lines as bytes, reset) - reset is True when the file was truncated or replaced.
+        The offset stays put until advance(): lines that could not be folded in are read again.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return b"", False
+        identity = (stat.st_dev, stat.st_ino)
+        reset = self.identity is not None and (identity != self.identity or stat.st_size < self.offset)
+        if reset or self.identity is None:
+            self.identity, self.offset, self.columns = identity, 0, None
+        if stat.st_size <= self.offset:
+            return b"", reset
+
+        with open(self.path, "rb") as f:
+            if self.columns is None and not self._read_header(f):
+                return b"", reset
+            f.seek(self.offset)
+            data = f.read(min(stat.st_size - self.offset, max_bytes))
+        return data[:data.rfind(b"\n") + 1], reset
+
+    def advance(self, n_bytes):
+        """Mark n_bytes past the offset (a chunk from read) as consumed."""
+        self.offset += n_bytes
+
+    def _read_header(self, f):
+        head = f.read(HEADER_SCAN_BYTES)
+        lines = head.splitlines(keepends=True)
+        if lines and not lines[-1].endswith(b"\n"):
+            lines.pop()
+        rows = [next(csv.reader([line.decode("utf-8-sig", errors="replace")]), [])
+                for line in lines[:HEADER_SCAN_ROWS]]
+        if not any(rows):
+            return False
+        scanned = [[_scan_value(v) for v in row] for row in rows]
+        header = detect_header_row(scanned)
+        if header_score(scanned[header])[1] < 2:
+            return False    # only title rows so far - wait for the header line
+        self.columns = [c.strip() or f"Unnamed: {i}" for i, c in enumerate(rows[header])]
+        self.offset = sum(len(line) for line in lines[:header + 1])
+        return True
+
+
+@dataclass(frozen=True)
+class LiveFileView:
+    name: str
+    rows: int
+    snapshot: object            # incremental.IncrementalSnapshot, None before the first row
+    cost_all: float
+    cost_excl_maintenance: float
+    risk_trend: np.ndarray      # causal risk score of the last TREND_POINTS records
+    trend_start: int            # record index of risk_trend[0]
+    error: str = None
+
+
+class LiveFile:
+    """Running state of one tailed CSV file."""
+
+    def __init__(self, path, observation_period):
+        self.path = path
+        self.observation_period = observation_period
+        self.tail = CsvTail(path)
+        self._clear()
+
+    def _clear(self):
+        self.state = None
+        self.roles = None
+        self.cost_all = 0.0
+        self.cost_excl = 0.0
+        self.risk_trend = np.zeros(0)
+        self.error = None
+
+    def poll(self, max_bytes=MAX_POLL_BYTES):
+        """
+        Parse and fold in the newly appended rows; returns how many there were. Rows that cannot
+        be folded in (no downtime column yet, a parse error) stay unread and are retried next poll.
+        """
+        chunk, reset = self.tail.read(max_bytes)
+        if reset:
+            self._clear()
+        if not chunk:
+            return 0
+        if self.roles is None:
+            self.roles = infer_roles(self.tail.columns)
+        downtime_col = self.roles.get("downtime")
+        if downtime_col is None:
+            self.error = "No downtime column"
+            return 0
+
+        try:
+            frame = pd.read_csv(io.BytesIO(chunk), header=None, names=self.tail.columns, index_col=False,
+                                skip_blank_lines=True, encoding="utf-8", encoding_errors="replace")
+            rows = len(frame)
+            if rows:
+                downtime = _numeric(frame[downtime_col])
+                repair_col = self.roles.get("repair_time", downtime_col)
+                repair_time = downtime if repair_col == downtime_col else _numeric(frame[repair_col])
+                dept_col = self.roles.get("department")
+                repair_mask = ~maintenance_mask(frame[dept_col]) if dept_col else None
+                state, risk = advance_state(self.state, downtime, repair_time, repair_mask, self.observation_period)
+                cost_col = self.roles.get("cost")
+                cost = _numeric(frame[cost_col]) if cost_col else np.zeros(0)
+                cost_excl = cost[repair_mask] if repair_mask is not None and cost_col else cost
+        except Exception as e:
+            self.error = f"Could not parse new rows: {str(e)[:80]}"
+            return 0
+
+        # Everything parsed: update the running state, then move past the chunk
+        if rows:
+            self.state = state
+            self.cost_all += float(cost.sum())
+            self.cost_excl += float(cost_excl.sum())
+            self.risk_trend = np.concatenate([self.risk_trend, risk.risk_score])[-TREND_POINTS:]
+        self.tail.advance(len(chunk))
+        self.error = None
+        return rows
+
+    def view(self, conv_factor):
+        rows = self.state.n if self.state else 0
+        return LiveFileView(
+            name=os.path.basename(self.path),
+            rows=rows,
+            snapshot=snapshot(self.state, conv_factor) if self.state else None,
+            cost_all=self.cost_all,
+            cost_excl_maintenance=self.cost_excl,
+            risk_trend=self.risk_trend.copy(),
+            trend_start=rows - len(self.risk_trend),
+            error=self.error,
+        )
+
+
+def _numeric(series):
+    return pd.to_numeric(series, errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class PollResult:
+    files: list                 # LiveFileView per file, in name order
+    new_rows: int
+    seconds: float
+
+
+class LiveFeed:
+    """All CSV files of a path (one file or a directory), polled together."""
+
+    def __init__(self, path, observation_period=1440):
+        self.path = os.path.abspath(path)
+        self.observation_period = observation_period
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def _discover(self):
+        if os.path.isdir(self.path):
+            paths = glob.glob(os.path.join(self.path, "*.csv"))
+        else:
+            paths = [self.path] if os.path.exists(self.path) else []
+        for path in paths:
+            if path not in self._files:
+                self._files[path] = LiveFile(path, self.observation_period)
+
+    def poll(self, conv_factor=1, max_bytes=MAX_POLL_BYTES):
+        """Read what was appended since the last poll, in every file; safe to call from several sessions."""
+        with self._lock:
+            start = time.perf_counter()
+            self._discover()
+            new_rows = sum(f.poll(max_bytes) for f in self._files.values())
+            views = [self._files[p].view(conv_factor) for p in sorted(self._files)]
+            return PollResult(views, new_rows, time.perf_counter() - start)
+
+
+class LiveFeeds:
+    """Feeds by (path, observation period), shared by every session (LRU)."""
+
+    def __init__(self, max_feeds=MAX_FEEDS):
+        self.max_feeds = max_feeds
+        self._feeds = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, observation_period=1440):
+        key = (os.path.abspath(path), observation_period)
+        with self._lock:
+            feed = self._feeds.get(key)
+            if feed is None:
+                feed = self._feeds[key] = LiveFeed(path, observation_period)
+            self._feeds.move_to_end(key)
+            while len(self._feeds) > self.max_feeds:
+                self._feeds.popitem(last=False)
+            return feed
+
+
+# Module level so offsets and running state survive Streamlit reruns
+live_feeds = LiveFeeds()
@@ -0,0 +1,152 @@
+"""
+Peak memory of the per-sheet pipeline, before and after compact dtypes.
+
+    python memory_benchmark.py --rows 1000000 3000000
+
+Every (mode, rows) pair runs in a fresh interpreter on a synthetic sheet
+shaped like the plant exports:
+
+  legacy   object/float64 frame as read_excel returns it, processed the way
+           app.py used to: df.copy(), coerced columns and Operating_Time added
+           to the frame, a filtered repair_df copy, and ml_df / ml_df_pdf copies
+           carrying the rolling risk features as float64 columns.
+  compact  the frame compacted as data_loader does (int32/float32, categorical
+           department/reason), processed the way app.py does now: masks and
+           separate NumPy arrays, the cached frame left untouched.
+
+Reported per million rows: the frame itself, RSS once loaded, and peak RSS
+while computing (Linux peak-RSS counter, reset after loading).
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+MODES = ("legacy", "compact")
+DEPARTMENTS = ["MAINTENANCE", "PROCESS", "CCM", "PANEL", "ELECTRICAL", "MECHANICAL", "UTILITY", "QUALITY"]
+
+
+def synthetic_sheet(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    downtime = np.where(rng.random(n_rows) < 0.7, rng.integers(5, 480, n_rows), 0).astype(np.float64)
+    downtime[rng.random(n_rows) < 0.01] = np.nan
+    reasons = np.array([f"REASON {i:03d}" for i in range(200)], dtype=object)
+    times = np.array([f"{h:02d}:{m:02d}:00" for h in range(24) for m in range(0, 60, 15)], dtype=object)
+    return pd.DataFrame({
+        "Start Date": pd.Timestamp("2022-07-01") + pd.to_timedelta(np.sort(rng.integers(0, 450, n_rows)), unit="D"),
+        "Downtime start time": times[rng.integers(0, len(times), n_rows)],
+        "Equipment Downtime (Minutes)": downtime,
+        "Department": np.array(DEPARTMENTS, dtype=object)[rng.integers(0, len(DEPARTMENTS), n_rows)],
+        "Repairing cost": rng.integers(10, 500, n_rows).astype(np.float64),
+        "Reason": reasons[np.minimum(rng.zipf(1.5, n_rows), 200) - 1],
+    })
+
+
+def legacy_pipeline(df, downtime_col, dept_col):
+    """The old app.py data path: full copies and derived float64 columns on the frame."""
+    df = df.copy()
+    df[downtime_col] = pd.to_numeric(df[downtime_col], errors="coerce").fillna(0)
+    df["Operating_Time"] = (1440 - df[downtime_col]).clip(lower=0)
+    repair_df = df.copy()
+    repair_df = repair_df[repair_df[dept_col].astype(str).str.strip().str.upper() != "MAINTENANCE"]
+    results = [df["Operating_Time"].sum(), repair_df[downtime_col].sum()]
+    for _ in range(2):  # ml_df and ml_df_pdf
+        ml_df = df.copy()
+        ml_df["avg_downtime"] = ml_df[downtime_col].rolling(3, min_periods=1).mean()
+        ml_df["downtime_trend"] = ml_df[downtime_col].diff().fillna(0)
+        ml_df["failure_flag"] = (ml_df[downtime_col] > 0).astype(int)
+        ml_df["failure_frequency"] = ml_df["failure_flag"].rolling(10, min_periods=1).sum()
+        ml_df["risk_score"] = (ml_df[downtime_col] / ml_df[downtime_col].max()
+                               + ml_df["avg_downtime"] / ml_df["avg_downtime"].max()
+                               + ml_df["failure_frequency"] / 10) / 3 * 100
+        results.append(ml_df["risk_score"].iloc[-1])
+    return results
+
+
+def compact_pipeline(df, downtime_col, dept_col):
+    """The current app.py data path: arrays and masks next to an untouched frame."""
+    from column_mapping import maintenance_mask
+    from data_loader import numeric_column
+    from reliability import compute_reliability, compute_risk
+
+    downtime = numeric_column(df, downtime_col)
+    repair_mask = ~maintenance_mask(df[dept_col])
+    metrics = compute_reliability(downtime, downtime, 1440, 60, repair_mask)
+    risk = compute_risk(downtime)
+    return [metrics.total_op_time, metrics.total_repair_time, risk.current_risk]
+
+
+def _status_kb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def _reset_peak():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure(mode, n_rows):
+    """Run one pipeline in this process and return its memory figures in MB."""
+    df = synthetic_sheet(n_rows)
+    if mode == "compact":
+        from data_loader import compact_frame
+        from schema import infer_roles
+        df = compact_frame(df, infer_roles(df.columns))
+    gc.collect()
+    frame_mb = df.memory_usage(index=True, deep=True).sum() / 2**20
+    exact_peak = _reset_peak()
+    loaded_mb = _status_kb("VmRSS") / 1024
+    pipeline = legacy_pipeline if mode == "legacy" else compact_pipeline
+    pipeline(df, "Equipment Downtime (Minutes)", "Department")
+    peak_mb = _status_kb("VmHWM") / 1024
+    return {"mode": mode, "rows": n_rows, "frame_mb": frame_mb, "loaded_rss_mb": loaded_mb,
+            "peak_rss_mb": peak_mb, "exact_peak": exact_peak}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Peak RSS per million rows, legacy vs compact pipeline.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "ROWS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure(args.child[0], int(args.child[1]))))
+        return 0
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for n_rows in args.rows:
+        for mode in MODES:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode, str(n_rows)],
+                                 cwd=here, check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{'mode':<8} {'rows':>10} {'frame MB/M':>11} {'loaded MB/M':>12} {'peak MB/M':>10} {'compute MB/M':>13}")
+    for r in results:
+        per_m = 1_000_000 / r["rows"]
+        print(f"{r['mode']:<8} {r['rows']:>10,} {r['frame_mb'] * per_m:>11.1f} {r['loaded_rss_mb'] * per_m:>12.1f} "
+              f"{r['peak_rss_mb'] * per_m:>10.1f} {(r['peak_rss_mb'] - r['loaded_rss_mb']) * per_m:>13.1f}")
+    if not all(r["exact_peak"] for r in results):
+        print("note: peak RSS could not be reset here; peaks include data generation", file=sys.stderr)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,519 @@
+"""
+Local HTTP/JSON API for the dashboard's reliability, cost and risk figures.
+
+    python metrics_api.py --port 8502 --workers 4
+
+    curl --data-binary @"failure data new.xlsx" localhost:8502/workbooks
+    curl "localhost:8502/workbooks/<hash>/reliability?units=hours"
+    curl "localhost:8502/workbooks/<hash>/costs"
+    curl "localhost:8502/workbooks/<hash>/risk?sheet=Electrical&trend=200"
+
+The figures come from the dashboard's own modules, with the column defaults
+of the upload page:
+
+  * reliability per sheet: MTTF/MTTR, λ/μ, repair figures without MAINTENANCE;
+  * cost summary: every sheet plus the grand totals;
+  * risk per sheet: current/average risk score, health, next-failure estimate,
+    and optionally the tail of the risk trend.
+
+An uploaded workbook is spooled to disk under its content hash. Every
+figure is addressed by that hash and the query parameters.
+
+The front end is a single asyncio loop: it reads requests, answers /health
+and cached results directly, and never runs pandas itself. Parsing and
+computation go to a bounded process pool. Workers load workbooks through
+data_loader, so a workbook one worker has parsed is memory-mapped from its
+sidecar by the others. Results are cached by (hash, endpoint, parameters).
+Identical requests that arrive while one is being computed share that
+computation. Past MAX_PENDING_JOBS queued jobs, requests get 503 with
+Retry-After instead of piling up.
+
+MetricsClient below is a small stdlib client; api_benchmark.py drives a
+server with many concurrent clients.
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+import numpy as np
+
+SPOOL_DIR = os.environ.get(
+    "RELIABILITY_API_SPOOL",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".api_uploads"),
+)
+DEFAULT_PORT = 8502
+MAX_UPLOAD_MB = float(os.environ.get("RELIABILITY_API_MAX_UPLOAD_MB", 200))
+MAX_PENDING_JOBS = 64
+MAX_CACHED_RESULTS = 512
+MAX_TREND_POINTS = 10_000
+KEEPALIVE_SECONDS = 15
+UNIT_FACTORS = {"minutes": 1, "hours": 60}
+
+
+class ApiError(Exception):
+    """An error with its HTTP status; raised in workers and handlers alike."""
+
+    def __init__(self, status, message):
+        super().__init__(status, message)
+        self.status = status
+        self.message = message
+
+
+# --- computations (run in the worker processes) ---
+
+def _json_value(value):
+    """Plain JSON types; NaN/inf become null."""
+    if isinstance(value, dict):
+        return {str(k): _json_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_json_value(v) for v in value]
+    if isinstance(value, (np.integer, np.bool_)):
+        return value.item()
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        return value if math.isfinite(value) else None
+    return value
+
+
+def _workbook(path, data_hash, skip_rows):
+    from data_loader import load_workbook
+    return load_workbook(path, skip_rows, data_hash)
+
+
+def _sheets(workbook, sheet):
+    if sheet is None:
+        return [name for name in workbook.sheet_names if name not in workbook.errors]
+    if sheet not in workbook.sheet_names:
+        raise ApiError(HTTPStatus.NOT_FOUND, f"No sheet named {sheet!r}")
+    return [sheet]
+
+
+def _sheet_inputs(workbook, name):
+    """Downtime, repair time and repair mask with the upload page's default columns."""
+    from column_mapping import maintenance_mask
+    downtime = workbook.fetch(name, 'downtime')
+    if downtime is None:
+        return None
+    repair_time = workbook.fetch(name, 'repair_time')
+    dept_col = workbook.schema(name).column('department')
+    repair_mask = ~maintenance_mask(workbook.sheets[name][dept_col]) if dept_col else None
+    return downtime, downtime if repair_time is None else repair_time, repair_mask
+
+
+def describe_job(path, data_hash, skip_rows):
+    workbook = _workbook(path, data_hash, skip_rows)
+    return _json_value({
+        "hash": data_hash,
+        "skip_rows": skip_rows,
+        "rows": sum(len(df) for df in workbook.sheets.values()),
+        "sheets": [{"name": name, "rows": len(workbook.sheets[name]),
+                    "header_row": workbook.schema(name).header_row, "columns": workbook.schema(name).roles}
+                   for name in workbook.sheet_names if name not in workbook.errors],
+        "errors": {name: str(err)[:200] for name, err in workbook.errors.items()},
+    })
+
+
+def reliability_job(path, data_hash, skip_rows, sheet, observation_period, units):
+    from reliability import compute_reliability
+    workbook = _workbook(path, data_hash, skip_rows)
+    out = []
+    for name in _sheets(workbook, sheet):
+        inputs = _sheet_inputs(workbook, name)
+        if inputs is None:
+            out.append({"sheet": name, "error": "No downtime column"})
+            continue
+        downtime, repair_time, repair_mask = inputs
+        metrics = compute_reliability(downtime, repair_time, observation_period, UNIT_FACTORS[units], repair_mask)
+        row = {"sheet": name, "records": len(downtime), **metrics.as_dict(units)}
+        row.pop("unit_conv")
+        out.append(row)
+    return _json_value({"hash": data_hash, "units": units, "observation_period": observation_period,
+                        "sheets": out})
+
+
+def costs_job(path, data_hash, skip_rows, cost_column, department_column):
+    from cost_scan import summarize_frame
+    workbook = _workbook(path, data_hash, skip_rows)
+    rows = []
+    for name in workbook.sheet_names:
+        if name in workbook.errors:
+            rows.append({"Sheet Name": name, "All Repair Cost": 0, "Exclude MAINTENANCE": 0,
+                         "Status": f"❌ Error: {str(workbook.errors[name])[:30]}..."})
+            continue
+        schema = workbook.schema(name)
+        rows.append(summarize_frame(workbook.sheets[name], name, cost_column or schema.column('cost'),
+                                    department_column or schema.column('department')))
+    return _json_value({
+        "hash": data_hash,
+        "sheets": rows,
+        "grand_total": sum(r["All Repair Cost"] for r in rows),
+        "grand_total_excl_maintenance": sum(r["Exclude MAINTENANCE"] for r in rows),
+    })
+
+
+def risk_job(path, data_hash, skip_rows, sheet, trend):
+    from reliability import compute_risk, predict_next_failure
+    workbook = _workbook(path, data_hash, skip_rows)
+    out = []
+    for name in _sheets(workbook, sheet):
+        downtime = workbook.fetch(name, 'downtime')
+        # As on the dashboard, risk needs at least 10 records
+        if downtime is None or len(downtime) < 10:
+            out.append({"sheet": name, "error": "No downtime column" if downtime is None else "Fewer than 10 records"})
+            continue
+        risk = compute_risk(downtime)
+        prediction = predict_next_failure(risk.failure_flag)
+        row = {
+            "sheet": name,
+            "records": len(downtime),
+            "current_risk": risk.current_risk,
+            "avg_risk": risk.avg_risk,
+            "recent_failures": risk.recent_failures,
+            "total_failures": risk.total_failures,
+            "health": risk.health,
+            "next_failure": None if prediction is None else {
+                "estimated_records": prediction.estimated_next_failure,
+                "confidence": prediction.confidence,
+                "avg_interval": prediction.avg_interval,
+                "records_since_failure": prediction.records_since_failure,
+            },
+        }
+        if trend:
+            row["trend_start"] = max(len(downtime) - trend, 0)
+            row["risk_trend"] = np.round(risk.risk_score[-trend:], 3)
+        out.append(row)
+    return _json_value({"hash": data_hash, "sheets": out})
+
+
+# --- HTTP front end ---
+
+def _param(query, name, default=None, convert=str, choices=None):
+    values = query.get(name)
+    if not values or values[-1] == "":
+        return default
+    try:
+        value = convert(values[-1])
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid value for {name!r}: {values[-1]!r}")
+    if choices is not None and value not in choices:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{name!r} must be one of {', '.join(map(str, choices))}")
+    return value
+
+
+def _skip_rows(value):
+    from schema import AUTO_SKIP
+    return AUTO_SKIP if value == AUTO_SKIP else int(value)
+
+
+def _positive(value):
+    value = float(value)
+    if not value > 0:
+        raise ValueError(value)
+    return value
+
+
+def _trend(value):
+    return max(0, min(int(value), MAX_TREND_POINTS))
+
+
+class MetricsServer:
+    """asyncio HTTP/1.1 server; CPU work runs on a process pool, results are cached by workbook hash."""
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, workers=None, spool_dir=SPOOL_DIR,
+                 max_pending=MAX_PENDING_JOBS, max_cached=MAX_CACHED_RESULTS):
+        self.host = host
+        self.port = port
+        self.workers = workers or max(1, min(os.cpu_count() or 1, 8))
+        self.spool_dir = spool_dir
+        self.max_pending = max_pending
+        self.max_cached = max_cached
+        self._results = OrderedDict()
+        self._inflight = {}
+        self._pending = 0
+        self._pool = None
+        self._server = None
+        self.started = time.time()
+        self.stats = {"requests": 0, "cache_hits": 0, "jobs": 0, "rejected": 0}
+
+    async def start(self):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        # spawn: the workers must not inherit the event loop and its threads
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self._server = await asyncio.start_server(self._connection, self.host, self.port,
+                                                  limit=2**16)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            # Drop queued jobs and join the workers off the loop, so none outlive the server
+            pool, self._pool = self._pool, None
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: pool.shutdown(wait=True, cancel_futures=True))
+
+    # --- jobs ---
+
+    async def run_job(self, key, fn, *args):
+        """Cached result for key, the in-flight computation of it, or a new job on the pool."""
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return self._results[key]
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        if self._pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise ApiError(HTTPStatus.SERVICE_UNAVAILABLE, "Worker pool is busy, retry shortly")
+
+        self._pending += 1
+        self.stats["jobs"] += 1
+        future = asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+        self._inflight[key] = future
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            self._pending -= 1
+            self._inflight.pop(key, None)
+        self._results[key] = result
+        while len(self._results) > self.max_cached:
+            self._results.popitem(last=False)
+        return result
+
+    def _spool_path(self, data_hash):
+        if len(data_hash) != 64 or any(c not in "0123456789abcdef" for c in data_hash):
+            raise ApiError(HTTPStatus.NOT_FOUND, "Unknown workbook")
+        path = os.path.join(self.spool_dir, data_hash + ".xlsx")
+        if not os.path.exists(path):
+            raise ApiError(HTTPStatus.NOT_FOUND, "Unknown workbook - POST it to /workbooks first")
+        return path
+
+    def _spool(self, data):
+        """Write an upload under its content hash (runs on a thread); returns the hash."""
+        from data_loader import content_hash
+        data_hash = content_hash(data)
+        path = os.path.join(self.spool_dir, data_hash + ".xlsx")
+        if not os.path.exists(path):
+            fd, tmp = tempfile.mkstemp(dir=self.spool_dir, suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return data_hash
+
+    # --- routing ---
+
+    async def route(self, method, path, query, body):
+        parts = [p for p in path.split("/") if p]
+        if parts == ["health"]:
+            return HTTPStatus.OK, {"status": "ok", "workers": self.workers, "pending_jobs": self._pending,
+                                   "cached_results": len(self._results),
+                                   "uptime_seconds": round(time.time() - self.started, 1), **self.stats}
+        if parts == ["workbooks"] and method == "GET":
+            names = sorted(f[:-5] for f in os.listdir(self.spool_dir) if f.endswith(".xlsx"))
+            return HTTPStatus.OK, {"workbooks": names}
+        if parts == ["workbooks"] and method == "POST":
+            if not body:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "POST the workbook bytes as the request body")
+            skip_rows = _param(query, "skip_rows", "auto", _skip_rows)
+            data_hash = await asyncio.to_thread(self._spool, body)
+            result = await self.run_job((data_hash, "describe", skip_rows), describe_job,
+                                        self._spool_path(data_hash), data_hash, skip_rows)
+            return HTTPStatus.CREATED, result
+
+        if len(parts) != 3 or parts[0] != "workbooks":
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No route for {path}")
+        if method != "GET":
+            raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not supported on {path}")
+        data_hash, endpoint = parts[1], parts[2]
+        spool = self._spool_path(data_hash)
+        skip_rows = _param(query, "skip_rows", "auto", _skip_rows)
+        sheet = _param(query, "sheet")
+        if endpoint == "sheets":
+            key, job = (data_hash, "describe", skip_rows), (describe_job,)
+        elif endpoint == "reliability":
+            period = _param(query, "observation_period", 1440.0, _positive)
+            units = _param(query, "units", "hours", choices=UNIT_FACTORS)
+            key = (data_hash, endpoint, skip_rows, sheet, period, units)
+            job = (reliability_job, sheet, period, units)
+        elif endpoint == "costs":
+            cost_column, dept_column = _param(query, "cost_column"), _param(query, "department_column")
+            key = (data_hash, endpoint, skip_rows, cost_column, dept_column)
+            job = (costs_job, cost_column, dept_column)
+        elif endpoint == "risk":
+            trend = _param(query, "trend", 0, _trend)
+            key = (data_hash, endpoint, skip_rows, sheet, trend)
+            job = (risk_job, sheet, trend)
+        else:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No endpoint {endpoint!r}")
+        return HTTPStatus.OK, await self.run_job(key, job[0], spool, data_hash, skip_rows, *job[1:])
+
+    # --- HTTP/1.1 ---
+
+    async def _connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEPALIVE_SECONDS)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if request is None:
+                    break
+                keep_alive, status, payload = await self._respond(*request)
+                body = json.dumps(payload, ensure_ascii=False, allow_nan=False).encode("utf-8")
+                headers = [f"HTTP/1.1 {status.value} {status.phrase}",
+                           "Content-Type: application/json; charset=utf-8",
+                           f"Content-Length: {len(body)}",
+                           f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                if status == HTTPStatus.SERVICE_UNAVAILABLE:
+                    headers.append("Retry-After: 1")
+                writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        """(method, target, headers, body, error) of the next request; None at the end of the connection."""
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, version = line.decode("latin-1").split()
+        except ValueError:
+            return "GET", "/", {}, b"", ApiError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+        headers = {}
+        while True:
+            header = await reader.readline()
+            if header in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = header.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        headers[":version"] = version
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            return method, target, headers, b"", ApiError(HTTPStatus.LENGTH_REQUIRED, "Send a Content-Length body")
+        length = headers.get("content-length") or "0"
+        if not (length.isascii() and length.isdigit()):
+            return method, target, headers, b"", ApiError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        length = int(length)
+        if length > MAX_UPLOAD_MB * 2**20:
+            return method, target, headers, b"", ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                                          f"Uploads are limited to {MAX_UPLOAD_MB:g} MB")
+        body = await reader.readexactly(length) if length else b""
+        return method, target, headers, body, None
+
+    async def _respond(self, method, target, headers, body, error):
+        self.stats["requests"] += 1
+        keep_alive = (headers.get("connection", "").lower() != "close" and headers.get(":version") == "HTTP/1.1"
+                      and error is None)
+        url = urllib.parse.urlsplit(target)
+        try:
+            if error is not None:
+                raise error
+            status, payload = await self.route(method, url.path, urllib.parse.parse_qs(url.query), body)
+        except ApiError as e:
+            status, payload = HTTPStatus(e.status), {"error": e.message}
+        except Exception as e:
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {str(e)[:200]}"}
+        return keep_alive, status, payload
+
+
+async def serve(host="127.0.0.1", port=DEFAULT_PORT, workers=None, spool_dir=SPOOL_DIR):
+    server = await MetricsServer(host, port, workers, spool_dir).start()
+    print(f"Serving reliability metrics on http://{server.host}:{server.port} "
+          f"({server.workers} workers, spool {server.spool_dir})", file=sys.stderr)
+    # SIGTERM (service managers, Popen.terminate) stops serving and shuts the worker pool down cleanly
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except (NotImplementedError, AttributeError):
+        pass    # Windows event loops have no signal handlers
+    try:
+        await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await server.close()
+
+
+# --- client ---
+
+class MetricsClient:
+    """Blocking client for a running MetricsServer; errors raise ApiError."""
+
+    def __init__(self, base_url=f"http://127.0.0.1:{DEFAULT_PORT}", timeout=300):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, **params):
+        params = {k: v for k, v in params.items() if v is not None}
+        url = self.base_url + path + ("?" + urllib.parse.urlencode(params) if params else "")
+        req = urllib.request.Request(url, data=body, method=method,
+                                     headers={"Content-Type": "application/octet-stream"} if body else {})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise ApiError(e.code, message) from None
+
+    def health(self):
+        return self.request("GET", "/health")
+
+    def upload(self, source, skip_rows="auto"):
+        """Upload a workbook (path or bytes); returns its description, including the hash."""
+        from data_loader import read_source_bytes
+        return self.request("POST", "/workbooks", read_source_bytes(source), skip_rows=skip_rows)
+
+    def reliability(self, data_hash, sheet=None, units="hours", observation_period=None, skip_rows=None):
+        return self.request("GET", f"/workbooks/{data_hash}/reliability", sheet=sheet, units=units,
+                            observation_period=observation_period, skip_rows=skip_rows)
+
+    def costs(self, data_hash, cost_column=None, department_column=None, skip_rows=None):
+        return self.request("GET", f"/workbooks/{data_hash}/costs", cost_column=cost_column,
+                            department_column=department_column, skip_rows=skip_rows)
+
+    def risk(self, data_hash, sheet=None, trend=None, skip_rows=None):
+        return self.request("GET", f"/workbooks/{data_hash}/risk", sheet=sheet, trend=trend, skip_rows=skip_rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve reliability, cost and risk metrics as JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: local only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="0 picks a free port")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: cores, at most 8)")
+    parser.add_argument("--spool", default=SPOOL_DIR, help="Directory for uploaded workbooks")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.spool))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
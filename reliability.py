@@ -0,0 +1,339 @@
+"""
+Reliability engine: MTTF/MTTR, failure and repair rates, the rolling risk
+score and the failure-interval prediction, computed on NumPy arrays.
+
+The dashboard, the PDF report and batch jobs all call these functions, so
+each figure has exactly one implementation (and one hot path to optimize).
+Inputs are plain 1-D arrays of minutes; NaN cells should already be
+replaced by 0, as the dashboard does for the selected columns.
+
+The risk score is causal: every record is normalized by the maxima up to
+that record, so scores never change as records are appended. It is
+computed by a batch path (advance_risk / compute_risk, array operations)
+and a streaming path (RiskStream, O(1) per record). Both add in the same
+order and give identical scores.
+"""
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+
+RISK_AVG_WINDOW = 3         # records in the rolling downtime average
+RISK_FREQUENCY_WINDOW = 10  # records in the rolling failure count
+MIN_FAILURES_FOR_PREDICTION = 5
+
+
+@dataclass(frozen=True)
+class ReliabilityResult:
+    num_failures: int
+    total_op_time: float      # in display units (minutes / conv_factor)
+    mttf: float
+    failure_rate: float
+    num_repairs: int
+    total_repair_time: float
+    mttr: float
+    repair_rate: float
+    operating_time: np.ndarray  # per record, in minutes (None from live feeds)
+
+    def as_dict(self, unit_conv):
+        """Flat metrics in the shape the report builders expect."""
+        return {
+            'num_failures': self.num_failures,
+            'total_op_time': self.total_op_time,
+            'mttf': self.mttf,
+            'failure_rate': self.failure_rate,
+            'num_repairs': self.num_repairs,
+            'total_repair_time': self.total_repair_time,
+            'mttr': self.mttr,
+            'repair_rate': self.repair_rate,
+            'unit_conv': unit_conv,
+        }
+
+
+@dataclass(frozen=True)
+class RiskResult:
+    avg_downtime: np.ndarray
+    downtime_trend: np.ndarray
+    failure_flag: np.ndarray
+    failure_frequency: np.ndarray
+    risk_score: np.ndarray
+    current_risk: float
+    avg_risk: float
+    recent_failures: int
+    total_failures: int
+
+    @property
+    def health(self):
+        if self.current_risk > 75:
+            return 'Critical'
+        return 'Warning' if self.current_risk > 50 else 'Good'
+
+
+@dataclass(frozen=True)
+class FailurePrediction:
+    failure_indices: np.ndarray  # None from incremental updates
+    avg_interval: float
+    std_interval: float
+    records_since_failure: int
+    estimated_next_failure: float
+    confidence: float
+
+
+def as_float_array(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+def operating_time(downtime, observation_period):
+    """Operating Time = Obs Period - Downtime, never below zero."""
+    return np.clip(observation_period - as_float_array(downtime), 0, None)
+
+
+def compute_reliability(downtime, repair_time, observation_period=1440, conv_factor=1, repair_mask=None):
+    """
+    Failure metrics use every record; repair metrics only the records where
+    repair_mask is True (the dashboard excludes MAINTENANCE there).
+    """
+    downtime = as_float_array(downtime)
+    repair_time = as_float_array(repair_time)
+    if repair_mask is not None:
+        repair_time = repair_time[np.asarray(repair_mask, dtype=bool)]
+
+    op_time = operating_time(downtime, observation_period)
+    total_op_time = op_time.sum() / conv_factor
+    num_failures = int(np.count_nonzero(downtime > 0))
+
+    total_repair_time = repair_time.sum() / conv_factor
+    num_repairs = int(np.count_nonzero(repair_time > 0))
+
+    mttf = total_op_time / num_failures if num_failures > 0 else 0
+    failure_rate = 1 / mttf if mttf > 0 else 0
+    mttr = total_repair_time / num_repairs if num_repairs > 0 else 0
+    repair_rate = 1 / mttr if mttr > 0 else 0
+
+    return ReliabilityResult(
+        num_failures=num_failures,
+        total_op_time=float(total_op_time),
+        mttf=float(mttf),
+        failure_rate=float(failure_rate),
+        num_repairs=num_repairs,
+        total_repair_time=float(total_repair_time),
+        mttr=float(mttr),
+        repair_rate=float(repair_rate),
+        operating_time=op_time,
+    )
+
+
+def rolling_sum(values, window):
+    """Trailing window sum with min_periods=1 (same as pandas .rolling(window, min_periods=1).sum())."""
+    values = as_float_array(values)
+    n = len(values)
+    if n == 0:
+        return values
+    padded = np.concatenate([np.zeros(window - 1), values])
+    # Shifted adds, oldest value first: the order RiskStream adds its ring buffer in
+    out = padded[:n].copy()
+    for k in range(1, window):
+        out += padded[k:k + n]
+    return out
+
+
+def rolling_mean(values, window):
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return rolling_sum(values, window) / counts
+
+
+@dataclass(frozen=True)
+class RiskState:
+    """What the causal risk score needs to continue a series: window tails, running maxima, sums."""
+    n: int = 0
+    tail_downtime: np.ndarray = field(default_factory=lambda: np.zeros(0))   # last RISK_AVG_WINDOW - 1
+    tail_flags: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))  # last RISK_FREQUENCY_WINDOW - 1
+    max_downtime: float = 0.0
+    max_avg: float = 0.0
+    risk_sum: float = 0.0
+    last_risk: float = 0.0
+    last_frequency: float = 0.0
+    total_failures: int = 0
+
+    @property
+    def avg_risk(self):
+        return self.risk_sum / self.n if self.n else 0.0
+
+
+def _normalized(values, running_max):
+    out = np.zeros_like(values)
+    np.divide(values, running_max, out=out, where=running_max > 0)
+    return out
+
+
+def advance_risk(state, downtime):
+    """
+    Batch path of the causal risk score: the features of `downtime`, the records that
+    follow `state` (None at the start of a series), as one pass of array operations.
+    Returns (RiskResult for these records, state after them); the scalar summaries
+    of the result cover the whole series so far.
+    """
+    downtime = as_float_array(downtime)
+    if len(downtime) == 0:
+        raise ValueError("Risk score needs at least one record")
+    state = state or RiskState()
+    start, n = state.n, len(downtime)
+
+    ext_d = np.concatenate([state.tail_downtime, downtime])
+    counts = np.minimum(np.arange(start + 1, start + n + 1), RISK_AVG_WINDOW)
+    avg_downtime = rolling_sum(ext_d, RISK_AVG_WINDOW)[len(state.tail_downtime):] / counts
+    downtime_trend = np.diff(downtime, prepend=state.tail_downtime[-1] if start else downtime[0])
+    failure_flag = (downtime > 0).astype(np.int64)
+    ext_f = np.concatenate([state.tail_flags, failure_flag])
+    failure_frequency = rolling_sum(ext_f, RISK_FREQUENCY_WINDOW)[len(state.tail_flags):]
+
+    # Risk Score Calculation (0-100): each factor normalized to 0-1 by its maximum *so far*,
+    # so a record's score never changes when later records arrive
+    max_downtime = np.maximum.accumulate(downtime)
+    np.maximum(max_downtime, state.max_downtime, out=max_downtime)
+    max_avg = np.maximum.accumulate(avg_downtime)
+    np.maximum(max_avg, state.max_avg, out=max_avg)
+    risk_factors = [
+        _normalized(downtime, max_downtime),
+        _normalized(avg_downtime, max_avg),
+        failure_frequency / RISK_FREQUENCY_WINDOW,
+    ]
+    risk_score = np.clip(sum(risk_factors) / len(risk_factors) * 100, 0, 100)
+    # Sequential (cumulative) sum, the same order of additions as the streaming path
+    risk_sum = float(np.cumsum(np.concatenate([[state.risk_sum], risk_score]))[-1])
+
+    new_state = RiskState(
+        n=start + n,
+        tail_downtime=ext_d[len(ext_d) - min(len(ext_d), RISK_AVG_WINDOW - 1):],
+        tail_flags=ext_f[len(ext_f) - min(len(ext_f), RISK_FREQUENCY_WINDOW - 1):],
+        max_downtime=float(max_downtime[-1]),
+        max_avg=float(max_avg[-1]),
+        risk_sum=risk_sum,
+        last_risk=float(risk_score[-1]),
+        last_frequency=float(failure_frequency[-1]),
+        total_failures=state.total_failures + int(failure_flag.sum()),
+    )
+    result = RiskResult(
+        avg_downtime=avg_downtime,
+        downtime_trend=downtime_trend,
+        failure_flag=failure_flag,
+        failure_frequency=failure_frequency,
+        risk_score=risk_score,
+        current_risk=new_state.last_risk,
+        avg_risk=new_state.avg_risk,
+        recent_failures=int(new_state.last_frequency),
+        total_failures=new_state.total_failures,
+    )
+    return result, new_state
+
+
+def compute_risk(downtime):
+    """Rolling features and the causal 0-100 risk score for every record."""
+    return advance_risk(None, downtime)[0]
+
+
+class RiskStream:
+    """
+    Streaming path of the causal risk score: O(1) work per record, with ring buffers
+    for the 3- and 10-record windows and running maxima. push() and extend() can be
+    mixed freely; both give exactly the scores compute_risk gives for the whole series.
+    """
+
+    def __init__(self, state=None):
+        self._load(state or RiskState())
+
+    def _load(self, state):
+        self.n = state.n
+        self.max_downtime = state.max_downtime
+        self.max_avg = state.max_avg
+        self.risk_sum = state.risk_sum
+        self.last_risk = state.last_risk
+        self.last_frequency = state.last_frequency
+        self.total_failures = state.total_failures
+        # Zero-padded like the batch windows, so the additions happen in the same order
+        self._downtime = deque([0.0] * (RISK_AVG_WINDOW - len(state.tail_downtime)), maxlen=RISK_AVG_WINDOW)
+        self._downtime.extend(float(v) for v in state.tail_downtime)
+        self._flags = deque([0] * (RISK_FREQUENCY_WINDOW - len(state.tail_flags)), maxlen=RISK_FREQUENCY_WINDOW)
+        self._flags.extend(int(v) for v in state.tail_flags)
+
+    def push(self, downtime):
+        """Add one record; returns its risk score."""
+        downtime = float(downtime)
+        self.n += 1
+        self._downtime.append(downtime)
+        flag = 1 if downtime > 0 else 0
+        self._flags.append(flag)
+        self.total_failures += flag
+
+        avg = sum(self._downtime) / min(self.n, RISK_AVG_WINDOW)
+        frequency = float(sum(self._flags))
+        self.max_downtime = max(self.max_downtime, downtime)
+        self.max_avg = max(self.max_avg, avg)
+        score = ((downtime / self.max_downtime if self.max_downtime > 0 else 0.0)
+                 + (avg / self.max_avg if self.max_avg > 0 else 0.0)
+                 + frequency / RISK_FREQUENCY_WINDOW) / 3 * 100
+        score = min(max(score, 0.0), 100.0)
+        self.risk_sum += score
+        self.last_risk, self.last_frequency = score, frequency
+        return score
+
+    def extend(self, downtime):
+        """Add a block of records through the batch path; returns their RiskResult."""
+        result, state = advance_risk(self.state(), downtime)
+        self._load(state)
+        return result
+
+    def state(self):
+        tail_downtime = list(self._downtime)[RISK_AVG_WINDOW - min(self.n, RISK_AVG_WINDOW - 1):]
+        tail_flags = list(self._flags)[RISK_FREQUENCY_WINDOW - min(self.n, RISK_FREQUENCY_WINDOW - 1):]
+        return RiskState(
+            n=self.n,
+            tail_downtime=np.array(tail_downtime, dtype=np.float64),
+            tail_flags=np.array(tail_flags, dtype=np.int64),
+            max_downtime=self.max_downtime,
+            max_avg=self.max_avg,
+            risk_sum=self.risk_sum,
+            last_risk=self.last_risk,
+            last_frequency=self.last_frequency,
+            total_failures=self.total_failures,
+        )
+
+    @property
+    def current_risk(self):
+        return self.last_risk
+
+    @property
+    def avg_risk(self):
+        return self.risk_sum / self.n if self.n else 0.0
+
+    @property
+    def recent_failures(self):
+        return int(self.last_frequency)
+
+
+def predict_next_failure(failure_flag, min_failures=MIN_FAILURES_FOR_PREDICTION):
+    """
+    Records until the next failure from the mean/std of the gaps between failure
+    indices. Returns None when there are too few failures to estimate.
+    """
+    failure_flag = np.asarray(failure_flag)
+    failure_indices = np.flatnonzero(failure_flag)
+    if len(failure_indices) < max(min_failures, 2):
+        return None
+
+    failure_intervals = np.diff(failure_indices)
+    avg_interval = failure_intervals.mean()
+    std_interval = failure_intervals.std()
+    records_since_failure = (len(failure_flag) - 1) - failure_indices[-1]
+
+    estimated_next_failure = max(0, avg_interval - records_since_failure)
+    confidence = max(0, 100 - (std_interval / avg_interval * 100)) if avg_interval > 0 else 0
+
+    return FailurePrediction(
+        failure_indices=failure_indices,
+        avg_interval=float(avg_interval),
+        std_interval=float(std_interval),
+        records_since_failure=int(records_since_failure),
+        estimated_next_failure=float(estimated_next_failure),
+        confidence=float(confidence),
+    )
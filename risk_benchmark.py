@@ -0,0 +1,131 @@
+"""
+Risk-score engine benchmark: the pandas implementation against the NumPy
+batch path and the streaming path of reliability.py.
+
+    python risk_benchmark.py --rows 10000 100000 1000000 --events 50
+
+Full history: every implementation scores a whole synthetic sheet.
+
+  pandas         the dashboard's former code - rolling windows on a Series,
+                 normalized by the maximum of the whole series
+  pandas_causal  the same with running maxima (cummax), i.e. today's definition
+  numpy_batch    reliability.compute_risk
+  stream         reliability.RiskStream.push, one record at a time
+
+Online: a history of the same size is scored once, then --events records
+arrive one by one. pandas has to rescore the whole history for every event,
+because the global maximum may change. The streaming engine does O(1) work
+per event, and the batch path continues from a RiskState.
+
+The batch and streaming scores are checked for exact equality, and
+pandas_causal for closeness.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from reliability import RiskStream, advance_risk, compute_risk
+
+
+def synthetic_downtime(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.where(rng.random(n_rows) < 0.7, rng.lognormal(3.3, 1.0, n_rows).round(), 0.0)
+
+
+def pandas_risk(downtime, causal=False):
+    s = pd.Series(downtime)
+    avg = s.rolling(3, min_periods=1).mean()
+    s.diff().fillna(0)  # downtime_trend, computed alongside as the dashboard did
+    flags = (s > 0).astype(int)
+    freq = flags.rolling(10, min_periods=1).sum()
+    max_downtime = s.cummax() if causal else s.max()
+    max_avg = avg.cummax() if causal else avg.max()
+    risk = (s / max_downtime).fillna(0) + (avg / max_avg).fillna(0) + freq / 10
+    return (risk / 3 * 100).clip(0, 100).to_numpy()
+
+
+def stream_risk(downtime):
+    stream = RiskStream()
+    return np.array([stream.push(x) for x in downtime])
+
+
+def timed(fn, *args, repeat=1):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return result, best
+
+
+def full_history(downtime, repeat):
+    scores, record = {}, {}
+    for name, fn in (("pandas", pandas_risk),
+                     ("pandas_causal", lambda d: pandas_risk(d, causal=True)),
+                     ("numpy_batch", lambda d: compute_risk(d).risk_score),
+                     ("stream", stream_risk)):
+        scores[name], record[name] = timed(fn, downtime, repeat=1 if name == "stream" else repeat)
+    record["batch_equals_stream"] = bool(np.array_equal(scores["numpy_batch"], scores["stream"]))
+    record["pandas_causal_close"] = bool(np.allclose(scores["numpy_batch"], scores["pandas_causal"]))
+    return record
+
+
+def online(downtime, events):
+    history, arriving = downtime[:-events], downtime[-events:]
+    record = {}
+
+    start = time.perf_counter()
+    for i in range(1, events + 1):
+        pandas_risk(downtime[:len(history) + i])
+    record["pandas_per_event"] = (time.perf_counter() - start) / events
+
+    _, state = advance_risk(None, history)
+    start = time.perf_counter()
+    for x in arriving:
+        _, state = advance_risk(state, np.array([x]))
+    record["batch_per_event"] = (time.perf_counter() - start) / events
+
+    stream = RiskStream()
+    stream.extend(history)
+    start = time.perf_counter()
+    for x in arriving:
+        stream.push(x)
+    record["stream_per_event"] = (time.perf_counter() - start) / events
+    record["online_matches_batch"] = stream.current_risk == compute_risk(downtime).current_risk
+    return record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the risk-score engine against the pandas version.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--events", type=int, default=50, help="Records arriving one by one in the online test")
+    parser.add_argument("--repeat", type=int, default=3, help="Best-of repeats for the vectorized paths")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'rows':>10} {'pandas':>9} {'pd causal':>9} {'numpy':>9} {'stream':>9}   "
+          f"{'pandas/ev':>10} {'batch/ev':>10} {'stream/ev':>10}  identical")
+    for n_rows in args.rows:
+        downtime = synthetic_downtime(n_rows)
+        record = {"rows": n_rows, **full_history(downtime, args.repeat),
+                  **online(downtime, min(args.events, n_rows - 1))}
+        results.append(record)
+        print(f"{n_rows:>10,} {record['pandas']:>8.4f}s {record['pandas_causal']:>8.4f}s "
+              f"{record['numpy_batch']:>8.4f}s {record['stream']:>8.4f}s   "
+              f"{record['pandas_per_event'] * 1e3:>8.3f}ms {record['batch_per_event'] * 1e3:>8.3f}ms "
+              f"{record['stream_per_event'] * 1e6:>8.2f}us  "
+              f"{record['batch_equals_stream'] and record['online_matches_batch']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(r["batch_equals_stream"] and r["online_matches_batch"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
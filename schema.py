@@ -0,0 +1,122 @@
+"""
+Schema inference: header-row detection and canonical column roles.
+
+Instead of asking users for skip_rows and re-running substring scans on
+every rerun, each sheet is inspected once per workbook content hash:
+
+  * the first HEADER_SCAN_ROWS raw rows are streamed with openpyxl's
+    read-only reader and the row that looks most like a header (most text
+    cells, most known column names) is taken as the header row;
+  * every header is normalized and looked up in a synonym index that maps
+    it to a canonical role (downtime, repair time, cost, department, reason,
+    date, start time, equipment).
+
+The result is stored on the cached Workbook (see data_loader.py), so later
+reads are a dictionary lookup followed by a direct column fetch.
+"""
+import re
+from dataclasses import dataclass, field
+from io import BytesIO
+
+AUTO_SKIP = 'auto'
+HEADER_SCAN_ROWS = 30
+
+# Canonical role -> header synonyms, most specific first
+ROLE_SYNONYMS = {
+    'downtime': ('equipment downtime', 'downtime', 'down time', 'breakdown time', 'breakdown duration'),
+    'repair_time': ('repair time', 'repairing time', 'time to repair', 'repair duration', 'ttr'),
+    'cost': ('repairing cost', 'repair cost', 'maintenance cost', 'cost', 'amount'),
+    'department': ('department', 'dept', 'section'),
+    'reason': ('reason', 'failure reason', 'cause', 'failure mode', 'problem'),
+    'date': ('start date', 'event date', 'date'),
+    'start_time': ('downtime start time', 'start time'),
+    'equipment': ('equipment', 'equipment name', 'equipment id', 'asset', 'machine'),
+}
+# Words that rule a header out for a role ('Downtime start time' is not a duration)
+ROLE_EXCLUDES = {
+    'downtime': ('start', 'end'),
+    'repair_time': ('start', 'end'),
+    'date': ('time',),
+    'equipment': ('downtime',),
+}
+NUMERIC_ROLES = ('downtime', 'repair_time', 'cost')
+
+
+def normalize_header(name):
+    """'Equipment Downtime (Minutes)  ' -> 'equipment downtime'."""
+    text = re.sub(r'\(.*?\)', ' ', str(name).lower())
+    text = re.sub(r'[^a-z0-9]+', ' ', text)
+    return ' '.join(text.split())
+
+
+# Exact lookups hit the index; anything else falls back to the longest contained synonym
+SYNONYM_INDEX = {syn: role for role, syns in ROLE_SYNONYMS.items() for syn in syns}
+_SUBSTRING_ORDER = sorted(SYNONYM_INDEX.items(), key=lambda item: -len(item[0]))
+
+
+def _excluded(role, normalized):
+    return any(word in normalized.split() for word in ROLE_EXCLUDES.get(role, ()))
+
+
+def match_role(name):
+    """(role, rank) for a header; rank 0 is an exact synonym, 1 a contained one. None if unknown."""
+    normalized = normalize_header(name)
+    role = SYNONYM_INDEX.get(normalized)
+    if role is not None:
+        return role, 0
+    padded = f' {normalized} '
+    for syn, role in _SUBSTRING_ORDER:
+        if f' {syn} ' in padded and not _excluded(role, normalized):
+            return role, 1
+    return None
+
+
+def infer_roles(columns):
+    """Canonical role -> column name; per role the best-ranked, then left-most header wins."""
+    best = {}
+    for position, col in enumerate(columns):
+        match = match_role(col)
+        if match is None:
+            continue
+        role, rank = match
+        if role not in best or (rank, position) < best[role][0]:
+            best[role] = ((rank, position), col)
+    return {role: col for role, (_, col) in best.items()}
+
+
+def header_score(row):
+    text_cells = [v for v in row if isinstance(v, str) and v.strip()]
+    known = sum(1 for v in text_cells if match_role(v) is not None)
+    return len(text_cells) + 2 * known, len(text_cells)
+
+
+def detect_header_row(rows):
+    """Index of the most header-like row among `rows` (raw cell tuples); 0 if none qualifies."""
+    best_row, best_score = 0, -1
+    for i, row in enumerate(rows):
+        score, n_text = header_score(row)
+        if n_text >= 2 and score > best_score:
+            best_row, best_score = i, score
+    return best_row
+
+
+def detect_header_rows(data, max_rows=HEADER_SCAN_ROWS):
+    """Header row per sheet, streaming only the first `max_rows` rows of each."""
+    from openpyxl import load_workbook
+    book = load_workbook(BytesIO(data), read_only=True, data_only=True)
+    try:
+        return {
+            ws.title: detect_header_row(list(ws.iter_rows(max_row=max_rows, values_only=True)))
+            for ws in book.worksheets
+        }
+    finally:
+        book.close()
+
+
+@dataclass(frozen=True)
+class SheetSchema:
+    header_row: int
+    roles: dict = field(default_factory=dict)    # canonical role -> column name
+
+    def column(self, role, default=None):
+        return self.roles.get(role, default)
@@ -0,0 +1,126 @@
+"""
+Columnar on-disk sidecars for parsed workbooks.
+
+On first ingest every cleaned sheet is written as an uncompressed Arrow IPC
+file next to a small JSON manifest, keyed by the workbook content hash and
+skip_rows (or 'auto', with the detected header row of each sheet in the
+manifest). Later loads memory-map those files instead of re-running openpyxl,
+and because the frames were cleaned before writing they need no re-cleaning.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import pyarrow as pa
+
+SIDECAR_DIR = os.environ.get(
+    "RELIABILITY_SIDECAR_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sidecar_cache"),
+)
+SIDECAR_ENABLED = os.environ.get("RELIABILITY_SIDECAR", "1") != "0"
+MANIFEST_NAME = "manifest.json"
+FORMAT_VERSION = 3   # 2: compact dtypes (int32/float32/categorical), 3: only duration/cost text coerced
+
+
+def sidecar_path(data_hash, skip_rows, root=None):
+    return os.path.join(root or SIDECAR_DIR, f"{data_hash}_skip{skip_rows}")
+
+
+def _is_current(target):
+    """True when target holds a readable manifest of the current FORMAT_VERSION."""
+    try:
+        with open(os.path.join(target, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f).get("version") == FORMAT_VERSION
+    except (OSError, ValueError, AttributeError):
+        return False
+
+
+def write_sidecar(data_hash, skip_rows, sheet_names, sheets, errors, root=None, header_rows=None):
+    """
+    Persist cleaned sheets as Arrow files plus a schema manifest. Returns the sidecar dir.
+    A sidecar of an older format (or with an unreadable manifest) is replaced.
+    """
+    target = sidecar_path(data_hash, skip_rows, root)
+    if _is_current(target):
+        return target
+
+    parent = os.path.dirname(target)
+    os.makedirs(parent, exist_ok=True)
+    # Build in a scratch dir and rename, so readers never see a half written sidecar
+    staging = tempfile.mkdtemp(prefix=".staging_", dir=parent)
+    stale = staging + ".stale"
+    try:
+        manifest = {
+            "version": FORMAT_VERSION,
+            "data_hash": data_hash,
+            "skip_rows": skip_rows,
+            "header_rows": dict(header_rows or {}),
+            "sheet_names": list(sheet_names),
+            "sheets": [],
+            "errors": {name: str(err) for name, err in errors.items()},
+        }
+        for idx, name in enumerate(sheet_names):
+            if name not in sheets:
+                continue
+            df = sheets[name]
+            file_name = f"sheet_{idx}.arrow"
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with pa.OSFile(os.path.join(staging, file_name), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            manifest["sheets"].append({
+                "name": name,
+                "file": file_name,
+                "rows": len(df),
+                "columns": [
+                    {"name": str(c), "dtype": str(t)} for c, t in zip(df.columns, df.dtypes)
+                ],
+            })
+        with open(os.path.join(staging, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        if os.path.isdir(target):
+            # A directory cannot be renamed over a non-empty one: move the stale sidecar aside first
+            os.replace(target, stale)
+        os.replace(staging, target)
+    except OSError:
+        # Another process finished (or replaced) the same sidecar first
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.path.isdir(target):
+            raise
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    finally:
+        shutil.rmtree(stale, ignore_errors=True)
+    return target
+
+
+def read_sidecar(data_hash, skip_rows, root=None):
+    """
+    Memory-map a previously written sidecar.
+    Returns (sheet_names, sheets, errors, header_rows) or None when no usable sidecar exists.
+    """
+    target = sidecar_path(data_hash, skip_rows, root)
+    manifest_file = os.path.join(target, MANIFEST_NAME)
+    if not os.path.exists(manifest_file):
+        return None
+    try:
+        with open(manifest_file, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != FORMAT_VERSION:
+            return None
+
+        sheets = {}
+        for entry in manifest["sheets"]:
+            source = pa.memory_map(os.path.join(target, entry["file"]), "r")
+            table = pa.ipc.open_file(source).read_all()
+            df = table.to_pandas(split_blocks=True)
+            # Arrow can carry duplicate names; restore the exact cleaned headers
+            df.columns = [c["name"] for c in entry["columns"]]
+            sheets[entry["name"]] = df
+        errors = {name: ValueError(msg) for name, msg in manifest["errors"].items()}
+        return manifest["sheet_names"], sheets, errors, manifest.get("header_rows") or None
+    except (OSError, ValueError, KeyError, pa.ArrowException):
+        # Corrupt or foreign sidecar - fall back to parsing the workbook
+        return None
@@ -0,0 +1,260 @@
+"""
+Monte Carlo what-if simulation of availability and repair spend.
+
+    models = sheet_models(workbook, observation_period=1440)
+    baseline, scenario = what_if(models, horizon=QUARTER, mttr_scale=0.8)   # MTTR -20%
+    scenario.summary()          # mean and P5/P50/P95 per sheet and for all sheets
+
+Each sheet is an alternating renewal process: exponential up times with the
+sheet's MTTF (1/λ), then exponential repairs with its MTTR (1/μ), scaled by
+mttr_scale. Every failure in the horizon costs one draw from the sheet's
+observed repair costs of failure records, both with and without MAINTENANCE
+rows (the two cost summary columns).
+
+Trajectories are simulated as arrays: a block of cycles is drawn for a whole
+batch of trajectories at once, and cumulative sums place the failures and
+repairs. Only trajectories still inside the horizon continue with another
+block, and each block's failures draw their costs right away, so memory is
+bounded by MAX_BLOCK_VALUES however long the horizon. Batches are sized so
+that trajectories x expected cycles stays within that bound, and seeded from
+SeedSequence children, so a given seed always gives the same first batches.
+A runtime budget is checked after every sheet of every batch: a batch that
+would overrun it is dropped (the first one always completes), and the result
+reports how many trajectories it used. Baseline and scenario use the same
+seed (common random numbers), with separate streams for times and costs, which
+keeps their difference far less noisy than either estimate.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from column_mapping import maintenance_mask
+from grouped import cached_group_base, grouped_metrics
+
+QUARTER = 91 * 1440             # minutes
+DEFAULT_TRAJECTORIES = 100_000
+BATCH = 10_000                  # most trajectories per batch (and per SeedSequence child)
+MAX_BLOCK_VALUES = 2_000_000    # trajectories x cycles drawn at once
+DEFAULT_BUDGET_SECONDS = 3.0
+PERCENTILES = (5, 50, 95)
+MAX_CACHED_RUNS = 16
+
+
+@dataclass(frozen=True)
+class SheetModel:
+    name: str
+    mttf: float                 # minutes; 0 when the sheet had no failures
+    mttr: float                 # minutes
+    cost_all: np.ndarray        # repair cost of each observed failure record
+    cost_excl_maintenance: np.ndarray
+
+
+def sheet_models(workbook, observation_period=1440, cost_col=None, dept_col=None):
+    """
+    SheetModel per sheet with downtime data: λ and μ as in grouped.py, costs from the schema's
+    cost and department columns (or cost_col/dept_col where a sheet has them), as in the dashboard.
+    """
+    metrics = grouped_metrics(cached_group_base(workbook, observation_period), ['Sheet']).set_index('Sheet')
+    models = []
+    for s_name in workbook.sheet_names:
+        if s_name not in metrics.index:
+            continue
+        df = workbook.sheet(s_name)
+        schema = workbook.schema(s_name)
+        failed = workbook.fetch(s_name, 'downtime') > 0
+        cost = np.zeros(int(failed.sum()))
+        cost_excl = cost
+        actual_cost_col = cost_col if cost_col in df.columns else schema.column('cost')
+        if actual_cost_col:
+            values = pd.to_numeric(df[actual_cost_col], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+            cost = cost_excl = values[failed]
+            actual_dept_col = dept_col if dept_col in df.columns else schema.column('department')
+            if actual_dept_col:
+                cost_excl = np.where(maintenance_mask(df[actual_dept_col])[failed], 0.0, cost)
+        row = metrics.loc[s_name]
+        models.append(SheetModel(s_name, float(row['MTTF']), float(row['MTTR']), cost, cost_excl))
+    return models
+
+
+def simulate_sheet(model, n, horizon, mttr_scale, rng, cost_rng=None):
+    """
+    (downtime, failures, cost_all, cost_excl) per trajectory of one sheet over the horizon;
+    repair costs are drawn from cost_rng (rng when not given).
+    """
+    cost_rng = cost_rng or rng
+    downtime = np.zeros(n)
+    failures = np.zeros(n, dtype=np.int64)
+    spend, spend_excl = np.zeros(n), np.zeros(n)
+    if model.mttf > 0:
+        mttr = model.mttr * mttr_scale
+        # Cycles per block from MTTF alone, so baseline and scenario draw identical shapes; the few
+        # trajectories that need more get another block
+        expected = horizon / model.mttf
+        cycles = int(min(expected + 2 * math.sqrt(expected) + 2, max(MAX_BLOCK_VALUES // n, 1)))
+        clock = np.zeros(n)
+        active = np.arange(n)
+        while len(active):
+            # float32 draws and in-place sums: half the memory traffic, ~0.01 min rounding over a quarter
+            ends = rng.standard_exponential((len(active), cycles), dtype=np.float32)
+            ends *= model.mttf
+            down = rng.standard_exponential((len(active), cycles), dtype=np.float32)
+            down *= mttr
+            ends += down
+            np.cumsum(ends, axis=1, out=ends)
+            ends += clock[active, None]
+            starts = ends - down
+            block_failures = (starts < horizon).sum(axis=1)
+            failures[active] += block_failures
+            # Repairs still running at the horizon count up to it; failures after it contribute nothing
+            downtime[active] += np.clip(np.minimum(ends, horizon) - starts, 0, None).sum(axis=1, dtype=np.float64)
+            # This block's failures draw their costs now: at most one block of values at a time
+            total = int(block_failures.sum())
+            if total and len(model.cost_all):
+                picks = cost_rng.integers(0, len(model.cost_all), total)
+                owner = np.repeat(active, block_failures)
+                spend += np.bincount(owner, weights=model.cost_all[picks], minlength=n)
+                spend_excl += np.bincount(owner, weights=model.cost_excl_maintenance[picks], minlength=n)
+            clock[active] = ends[:, -1]
+            active = active[ends[:, -1] < horizon]
+    return downtime, failures, spend, spend_excl
+
+
+def batch_size(models, horizon):
+    """Trajectories per batch: as many as keep trajectories x expected cycles within MAX_BLOCK_VALUES."""
+    cycles = max((horizon / m.mttf for m in models if m.mttf > 0), default=0)
+    return int(min(BATCH, max(MAX_BLOCK_VALUES // max(cycles, 1), 1)))
+
+
+@dataclass(frozen=True)
+class SimulationResult:
+    sheets: list
+    availability: np.ndarray    # (trajectories, sheets), fraction of the horizon
+    failures: np.ndarray
+    cost_all: np.ndarray
+    cost_excl_maintenance: np.ndarray
+    horizon: float
+    mttr_scale: float
+    seed: int
+    requested: int
+    seconds: float
+
+    @property
+    def trajectories(self):
+        return len(self.availability)
+
+    @property
+    def truncated(self):
+        return self.trajectories < self.requested
+
+    def _metrics(self):
+        """(label, per-trajectory values per sheet, all-sheets values): the fleet is the sheets' mean availability."""
+        return (
+            ('Availability (%)', self.availability * 100, self.availability.mean(axis=1) * 100),
+            ('Failures', self.failures, self.failures.sum(axis=1)),
+            ('All Repair Cost', self.cost_all, self.cost_all.sum(axis=1)),
+            ('Exclude MAINTENANCE', self.cost_excl_maintenance, self.cost_excl_maintenance.sum(axis=1)),
+        )
+
+    def totals(self, metric):
+        """All-sheets values of one metric per trajectory (e.g. for a histogram)."""
+        return next(total for label, _, total in self._metrics() if label == metric)
+
+    def summary(self, percentiles=PERCENTILES):
+        """Mean and percentiles of every metric, for all sheets and then per sheet."""
+        metrics = self._metrics()
+        rows = []
+        for i, sheet in enumerate(['All sheets'] + list(self.sheets)):
+            for label, per_sheet, total in metrics:
+                values = total if i == 0 else per_sheet[:, i - 1]
+                rows.append({'Sheet': sheet, 'Metric': label, 'Mean': values.mean(),
+                             **{f'P{p:g}': v for p, v in zip(percentiles, np.percentile(values, percentiles))}})
+        return pd.DataFrame(rows)
+
+
+def simulate(models, horizon=QUARTER, mttr_scale=1.0, n_trajectories=DEFAULT_TRAJECTORIES,
+             budget_seconds=None, seed=0):
+    """
+    Simulate every sheet over the horizon (minutes). With a budget, stops before the next batch
+    if it is not expected to fit, and drops a batch that overruns it; the first batch always completes.
+    """
+    start = time.perf_counter()
+    size = batch_size(models, horizon)
+    n_batches = max(math.ceil(n_trajectories / size), 1)
+    batch_seeds = np.random.SeedSequence(seed).spawn(n_batches)
+    parts = []
+    for b, batch_seed in enumerate(batch_seeds):
+        n = min(size, n_trajectories - b * size)
+        runs = []
+        for model, sheet_seed in zip(models, batch_seed.spawn(len(models))):
+            if parts and budget_seconds is not None and time.perf_counter() - start > budget_seconds:
+                break
+            times_seed, cost_seed = sheet_seed.spawn(2)
+            runs.append(simulate_sheet(model, n, horizon, mttr_scale,
+                                       np.random.default_rng(times_seed), np.random.default_rng(cost_seed)))
+        if len(runs) < len(models):
+            break       # over the budget part way through: drop the incomplete batch
+        parts.append([np.column_stack(values) for values in zip(*runs)] if runs else [np.zeros((n, 0))] * 4)
+        elapsed = time.perf_counter() - start
+        if budget_seconds is not None and elapsed * (b + 2) / (b + 1) > budget_seconds:
+            break
+    downtime, failures, cost_all, cost_excl = (np.concatenate(columns) for columns in zip(*parts))
+    return SimulationResult(
+        sheets=[m.name for m in models],
+        availability=1 - downtime / horizon,
+        failures=failures,
+        cost_all=cost_all,
+        cost_excl_maintenance=cost_excl,
+        horizon=horizon,
+        mttr_scale=mttr_scale,
+        seed=seed,
+        requested=n_trajectories,
+        seconds=time.perf_counter() - start,
+    )
+
+
+def what_if(models, horizon=QUARTER, mttr_scale=0.8, n_trajectories=DEFAULT_TRAJECTORIES,
+            budget_seconds=DEFAULT_BUDGET_SECONDS, seed=0):
+    """(baseline, scenario) with common random numbers; each run gets half the budget."""
+    half = budget_seconds / 2 if budget_seconds is not None else None
+    baseline = simulate(models, horizon, 1.0, n_trajectories, half, seed)
+    # The scenario uses exactly as many trajectories as the baseline managed, so the pairs line up
+    scenario = simulate(models, horizon, mttr_scale, baseline.trajectories, None, seed)
+    return baseline, scenario
+
+
+def compare(baseline, scenario, percentiles=PERCENTILES):
+    """Scenario summary with the change in each statistic against the baseline."""
+    base, out = baseline.summary(percentiles), scenario.summary(percentiles)
+    for column in ['Mean'] + [f'P{p:g}' for p in percentiles]:
+        out[f'Δ {column}'] = out[column] - base[column]
+    return out
+
+
+_run_cache = OrderedDict()
+_run_lock = threading.Lock()
+
+
+def cached_what_if(workbook, observation_period=1440, cost_col=None, dept_col=None, horizon=QUARTER,
+                   mttr_scale=0.8, n_trajectories=DEFAULT_TRAJECTORIES, budget_seconds=DEFAULT_BUDGET_SECONDS,
+                   seed=0, compute=True):
+    """what_if for a workbook, cached per parameters; with compute=False, None unless already cached."""
+    key = (workbook.data_hash, workbook.skip_rows, float(observation_period), cost_col, dept_col, float(horizon),
+           float(mttr_scale), n_trajectories, budget_seconds, seed)
+    with _run_lock:
+        if key in _run_cache:
+            _run_cache.move_to_end(key)
+            return _run_cache[key]
+    if not compute:
+        return None
+    models = sheet_models(workbook, observation_period, cost_col, dept_col)
+    runs = what_if(models, horizon, mttr_scale, n_trajectories, budget_seconds, seed)
+    with _run_lock:
+        _run_cache[key] = runs
+        while len(_run_cache) > MAX_CACHED_RUNS:
+            _run_cache.popitem(last=False)
+    return runs
@@ -0,0 +1,128 @@
+"""
+Cold-start benchmark: time to first render of the dashboard.
+
+    python startup_benchmark.py                                  # landing page, 5 cold starts
+    python startup_benchmark.py --workbook "failure data new.xlsx" --budget 8
+
+Every sample runs in a fresh interpreter, so no module is warm. Each sample
+imports Streamlit, then runs app.py once through Streamlit's AppTest. That is
+the script run a browser's first page load triggers. Reported per sample:
+
+  import_s   Streamlit import in the fresh interpreter
+  render_s   first script run, until every element of the page is produced
+  process_s  wall time of the whole child process, interpreter start included
+
+The loaded_heavy column lists the heavy libraries (scikit-learn, ReportLab,
+plotly.express, openpyxl, ...) that the run ended up importing. The landing
+page should need none of them.
+
+With --workbook the upload widget is fed that file. --cold-caches also points
+the sidecar and model caches at empty directories. With --budget the exit
+code is 1 when the median time to first render exceeds it.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(HERE, "app.py")
+HEAVY_MODULES = ("sklearn", "joblib", "reportlab", "plotly.express", "openpyxl", "xlsxwriter", "kaleido")
+
+# Runs app.py with the upload widget returning the given workbook
+UPLOAD_SCRIPT = """
+import io
+import streamlit as st
+
+class _Upload(io.BytesIO):
+    name = {name!r}
+
+_data = open({path!r}, "rb").read()
+st.sidebar.file_uploader = lambda *args, **kwargs: _Upload(_data)
+exec(compile(open({app!r}, encoding="utf-8").read(), {app!r}, "exec"), {{"__name__": "__main__", "__file__": {app!r}}})
+"""
+
+
+def measure(workbook=None, timeout=300):
+    """One cold start in this (fresh) process; returns its timings."""
+    sys.path.insert(0, HERE)
+    os.chdir(HERE)
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    imported = time.perf_counter()
+    if workbook:
+        script = UPLOAD_SCRIPT.format(name=os.path.basename(workbook), path=os.path.abspath(workbook), app=APP)
+        at = AppTest.from_string(script, default_timeout=timeout)
+    else:
+        at = AppTest.from_file(APP, default_timeout=timeout)
+    at.run()
+    rendered = time.perf_counter()
+    return {
+        "import_s": round(imported - start, 3),
+        "render_s": round(rendered - imported, 3),
+        "elements": len(at.main.children) + len(at.sidebar.children),
+        "exceptions": [str(e.value)[:200] for e in at.exception],
+        "loaded_heavy": [m for m in HEAVY_MODULES if m in sys.modules],
+    }
+
+
+def run_sample(workbook, cold_caches):
+    args = [sys.executable, os.path.abspath(__file__), "--child"]
+    if workbook:
+        args += ["--workbook", os.path.abspath(workbook)]
+    env = dict(os.environ)
+    with tempfile.TemporaryDirectory() as scratch:
+        if cold_caches:
+            env["RELIABILITY_SIDECAR_DIR"] = os.path.join(scratch, "sidecars")
+            env["RELIABILITY_MODEL_DIR"] = os.path.join(scratch, "models")
+        start = time.perf_counter()
+        out = subprocess.run(args, cwd=HERE, env=env, check=True, capture_output=True, text=True).stdout
+        process_s = time.perf_counter() - start
+    result = json.loads(out.strip().splitlines()[-1])
+    result["process_s"] = round(process_s, 3)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the dashboard's time to first render from a cold start.")
+    parser.add_argument("--workbook", help="Feed this workbook to the upload widget (default: landing page)")
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to sample")
+    parser.add_argument("--cold-caches", action="store_true", help="Start with empty sidecar and model caches")
+    parser.add_argument("--budget", type=float, help="Fail when the median time to first render exceeds this (s)")
+    parser.add_argument("-o", "--output", help="Also write the samples to this JSON file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure(args.workbook)))
+        return 0
+
+    samples = []
+    print(f"{'run':>3} {'import_s':>9} {'render_s':>9} {'process_s':>10}  loaded_heavy")
+    for i in range(args.runs):
+        sample = run_sample(args.workbook, args.cold_caches)
+        samples.append(sample)
+        print(f"{i + 1:>3} {sample['import_s']:>9.3f} {sample['render_s']:>9.3f} {sample['process_s']:>10.3f}  "
+              f"{', '.join(sample['loaded_heavy']) or '-'}")
+        for error in sample["exceptions"]:
+            print(f"    exception: {error}", file=sys.stderr)
+
+    median_render = statistics.median(s["render_s"] for s in samples)
+    median_process = statistics.median(s["process_s"] for s in samples)
+    print(f"median time to first render {median_render:.3f}s (process {median_process:.3f}s)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"workbook": args.workbook, "cold_caches": args.cold_caches, "budget": args.budget,
+                       "median_render_s": median_render, "samples": samples}, f, indent=2)
+    if args.budget is not None and median_render > args.budget:
+        print(f"over budget: {median_render:.3f}s > {args.budget:.3f}s", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""
+Weibull lifetime models per equipment, with bootstrap confidence intervals.
+
+    fits = cached_lifetimes(workbook, observation_period=1440, unit='hours')
+    fits.summary()              # per asset: β, η, mean life, B10 and their 95% intervals
+    fits.curve(fits.index('Electrical', 'PUMP 3'))     # R(t) with its interval band
+
+The interval heuristic in reliability.py (mean and spread of the gaps
+between failures) gives one number and an ad hoc confidence. Here each asset
+(sheet x equipment, as grouped.py labels them) gets:
+
+  * a two-parameter Weibull fit by maximum likelihood: shape β and scale η;
+  * its mean life, B10 life (10% of units failed) and reliability curve
+    R(t) = exp(-(t/η)^β);
+  * percentile bootstrap intervals for all of these.
+
+The samples are the gaps between an asset's failures. They are measured in
+calendar time when the sheet has a date column (as in time-aware mode).
+Otherwise, or with calendar=False, record gaps are scaled by the observation
+period. The time since
+the last failure enters the likelihood as a right-censored observation.
+
+The fit is vectorized over many assets at once. All samples sit in one flat
+array with segment offsets, so ragged assets need no padding. Newton
+iterations on the profile likelihood equation for β run for every segment
+together, with segment sums via np.add.reduceat. Bootstrap resamples are
+just more segments. They are split into fixed-size chunks, each seeded from
+its own SeedSequence child and spread over a process pool. Results therefore
+depend on the seed only, never on the number of workers.
+"""
+import math
+import os
+import threading
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from grouped import group_labels
+from timeaware import TIME_UNITS
+
+MIN_FAILURES_FOR_FIT = 3
+DEFAULT_BOOTSTRAP = 1000
+BOOTSTRAP_CHUNK = 50        # resamples per task (and per SeedSequence child)
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-10           # relative step in β at convergence
+MAX_SHAPE = 1e3             # larger β means (numerically) identical intervals - no usable fit
+MAX_CACHED_FITS = 8
+LIFETIME_UNITS = {'minutes': 1, **TIME_UNITS}     # minutes per unit
+
+
+@dataclass(frozen=True)
+class LifetimeSamples:
+    """Failure intervals of many assets in one flat array; asset i owns times[offsets[i]:offsets[i + 1]]."""
+    sheets: np.ndarray          # object, per asset
+    equipment: np.ndarray       # object, per asset
+    times: np.ndarray           # interval lengths in `unit`, > 0
+    failed: np.ndarray          # bool: True for a failure interval, False for the censored tail
+    offsets: np.ndarray         # int64, len(assets) + 1
+    unit: str
+    calendar: np.ndarray        # bool per asset: intervals from timestamps (False: record gaps)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def failures(self):
+        return np.add.reduceat(self.failed.astype(np.int64), self.offsets[:-1]) if len(self) else np.zeros(0, int)
+
+
+def _asset_intervals(positions, last_position):
+    """(intervals, censored tail) from an asset's sorted failure positions; zero gaps are dropped."""
+    gaps = np.diff(positions)
+    return gaps[gaps > 0], last_position - positions[-1]
+
+
+def failure_intervals(workbook, observation_period=1440, unit='hours', calendar=True):
+    """LifetimeSamples for every sheet x equipment with at least one failure (calendar=False: record gaps only)."""
+    minutes_per_unit = LIFETIME_UNITS[unit]
+    sheets, equipment, calendar, times, failed = [], [], [], [], []
+    for s_name in workbook.sheet_names:
+        try:
+            df = workbook.sheet(s_name)
+        except Exception:
+            continue
+        downtime = workbook.fetch(s_name, 'downtime')
+        if downtime is None or len(df) == 0:
+            continue
+        schema = workbook.schema(s_name)
+        # Positions in `unit`: event timestamps when the sheet has a usable date, else record index x period
+        positions, dated = None, False
+        if calendar and schema.column('date') is not None:
+            from timeaware import cached_timestamps
+            stamps = cached_timestamps(workbook, s_name, schema.column('date'), schema.column('start_time'))
+            valid = ~np.isnat(stamps)
+            if valid.sum() >= len(df) / 2:
+                positions = (stamps - stamps[valid].min()) / np.timedelta64(1, 'm') / minutes_per_unit
+                dated = True
+        if positions is None:
+            positions = np.arange(len(df)) * (observation_period / minutes_per_unit)
+        labels = group_labels(df, schema.column('equipment'), s_name)
+        end = np.nanmax(positions)
+        # Each equipment's failures in time order (one stable sort for the whole sheet)
+        frame = pd.DataFrame({'asset': labels, 'position': positions})[(downtime > 0) & ~np.isnan(positions)]
+        frame = frame.sort_values(['asset', 'position'], kind='stable')
+        for asset, group in frame.groupby('asset', sort=True):
+            intervals, tail = _asset_intervals(group['position'].to_numpy(), end)
+            if len(intervals) == 0 and tail <= 0:
+                continue
+            sheets.append(s_name)
+            equipment.append(asset)
+            calendar.append(dated)
+            times.append(intervals)
+            failed.append(np.ones(len(intervals), dtype=bool))
+            if tail > 0:
+                times[-1] = np.append(intervals, tail)
+                failed[-1] = np.append(failed[-1], False)
+    counts = np.array([len(t) for t in times], dtype=np.int64)
+    return LifetimeSamples(
+        sheets=np.array(sheets, dtype=object),
+        equipment=np.array(equipment, dtype=object),
+        times=np.concatenate(times) if times else np.zeros(0),
+        failed=np.concatenate(failed) if failed else np.zeros(0, dtype=bool),
+        offsets=np.concatenate([[0], np.cumsum(counts)]),
+        unit=unit,
+        calendar=np.array(calendar, dtype=bool),
+    )
+
+
+def fit_weibull(times, failed, offsets):
+    """
+    Weibull MLE (shape β, scale η) per segment of a flat sample array, all segments at once.
+    Segments with fewer than MIN_FAILURES_FOR_FIT failures, or without any spread in their
+    intervals, get NaN. Returns (shape, scale).
+    """
+    times = np.asarray(times, dtype=np.float64)
+    failed = np.asarray(failed, dtype=bool)
+    starts = np.asarray(offsets[:-1], dtype=np.int64)
+    n_segments = len(starts)
+    if n_segments == 0:
+        return np.zeros(0), np.zeros(0)
+    counts = np.diff(offsets)
+    segment = np.repeat(np.arange(n_segments), counts)
+
+    def seg_sum(values):
+        return np.add.reduceat(values, starts)
+
+    # β does not depend on the time scale: divide by each segment's largest time so t^β stays <= 1
+    top = np.maximum.reduceat(times, starts)
+    log_t = np.log(times / top[segment])
+    r = seg_sum(failed.astype(np.float64))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_log_fail = seg_sum(np.where(failed, log_t, 0.0)) / r
+        spread = np.sqrt(np.maximum(seg_sum(np.where(failed, log_t, 0.0) ** 2) / r - mean_log_fail ** 2, 0))
+        # Start from the Gumbel moment estimate of β (π/√6 over the std of log failure times)
+        shape = np.where(spread > 0, 1.2825 / spread, 1.0)
+    fit = (r >= MIN_FAILURES_FOR_FIT) & (spread > 1e-12)
+    shape = np.where(fit, shape, 1.0)
+
+    # Newton on g(β) = Σ t^β ln t / Σ t^β - 1/β - mean ln t (failures); g is increasing, so the root is unique
+    active = fit.copy()
+    for _ in range(MAX_ITERATIONS):
+        if not active.any():
+            break
+        tk = np.exp(shape[segment] * log_t)
+        s0, s1, s2 = seg_sum(tk), seg_sum(tk * log_t), seg_sum(tk * log_t * log_t)
+        ratio = s1 / s0
+        g = ratio - 1 / shape - mean_log_fail
+        dg = s2 / s0 - ratio * ratio + 1 / shape ** 2
+        step = np.where(active, g / dg, 0.0)
+        new_shape = shape - step
+        # Never step to a non-positive shape: halve instead
+        new_shape = np.where(new_shape <= 0, shape / 2, new_shape)
+        active &= np.abs(new_shape - shape) > TOLERANCE * new_shape
+        shape = new_shape
+        active &= shape < MAX_SHAPE
+
+    s0 = seg_sum(np.exp(shape[segment] * log_t))
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        scale = top * (s0 / r) ** (1 / shape)
+    ok = fit & np.isfinite(shape) & np.isfinite(scale) & (shape < MAX_SHAPE)
+    return np.where(ok, shape, np.nan), np.where(ok, scale, np.nan)
+
+
+def b_life(shape, scale, p=0.10):
+    """Time by which a fraction p of units has failed (B10 for p = 0.10)."""
+    return scale * (-math.log1p(-p)) ** (1 / np.asarray(shape))
+
+
+def mean_life(shape, scale):
+    shape = np.asarray(shape, dtype=np.float64)
+    gamma = np.exp([math.lgamma(1 + 1 / b) if np.isfinite(b) and b > 0 else np.nan for b in shape.ravel()])
+    return scale * gamma.reshape(shape.shape)
+
+
+def reliability(shape, scale, t):
+    """R(t) = exp(-(t/η)^β); broadcasts parameters (…) against times (t) to (…, len(t))."""
+    shape = np.asarray(shape, dtype=np.float64)[..., None]
+    scale = np.asarray(scale, dtype=np.float64)[..., None]
+    return np.exp(-(np.asarray(t, dtype=np.float64) / scale) ** shape)
+
+
+# --- bootstrap ---
+
+_worker_samples = None
+
+
+def _init_worker(times, failed, offsets):
+    global _worker_samples
+    _worker_samples = (times, failed, offsets)
+
+
+def resample(times, failed, offsets, n_resamples, rng):
+    """n_resamples bootstrap copies of every segment (intervals drawn with replacement within the segment)."""
+    starts, counts = offsets[:-1], np.diff(offsets)
+    n_total = int(counts.sum())
+    # Draw position j of a copy of segment i as starts[i] + floor(u * counts[i])
+    base = np.repeat(starts, counts)
+    size = np.repeat(counts, counts)
+    picks = base[None, :] + np.floor(rng.random((n_resamples, n_total)) * size[None, :]).astype(np.int64)
+    picks = picks.ravel()
+    copy_offsets = np.concatenate([[0], np.cumsum(np.tile(counts, n_resamples))])
+    return times[picks], failed[picks], copy_offsets
+
+
+def _bootstrap_chunk(n_resamples, seed, samples=None):
+    times, failed, offsets = samples or _worker_samples
+    rng = np.random.default_rng(seed)
+    shape, scale = fit_weibull(*resample(times, failed, offsets, n_resamples, rng))
+    n_assets = len(offsets) - 1
+    return shape.reshape(n_resamples, n_assets), scale.reshape(n_resamples, n_assets)
+
+
+def bootstrap_weibull(samples, n_boot=DEFAULT_BOOTSTRAP, seed=0, max_workers=None, chunk=BOOTSTRAP_CHUNK):
+    """(shape, scale) arrays of shape (n_boot, assets); chunks run on a process pool, seeded per chunk."""
+    arrays = (samples.times, samples.failed, samples.offsets)
+    sizes = [min(chunk, n_boot - lo) for lo in range(0, n_boot, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    max_workers = min(max_workers or os.cpu_count() or 1, len(sizes))
+    if max_workers <= 1 or len(samples) == 0:
+        results = [_bootstrap_chunk(n, s, arrays) for n, s in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=arrays) as pool:
+            results = list(pool.map(_bootstrap_chunk, sizes, seeds))
+    if not results:
+        return np.zeros((0, len(samples))), np.zeros((0, len(samples)))
+    return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+
+@dataclass(frozen=True)
+class WeibullFits:
+    samples: LifetimeSamples
+    shape: np.ndarray           # per asset, NaN where no fit
+    scale: np.ndarray
+    boot_shape: np.ndarray      # (n_boot, assets)
+    boot_scale: np.ndarray
+    confidence: float
+    seed: int
+
+    def _interval(self, values):
+        """Percentile interval over the bootstrap axis, ignoring resamples that could not be fitted."""
+        alpha = (1 - self.confidence) / 2
+        if values.shape[0] == 0:
+            nan = np.full(values.shape[1:], np.nan)
+            return nan, nan
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)     # all-NaN columns: assets without a fit
+            return np.nanquantile(values, alpha, axis=0), np.nanquantile(values, 1 - alpha, axis=0)
+
+    def summary(self, p=0.10):
+        """One row per asset: failure intervals, β, η, mean life and B-life with their intervals."""
+        b_label = f"B{p * 100:g}"
+        columns = {
+            'Sheet': self.samples.sheets,
+            'Equipment': self.samples.equipment,
+            'Intervals': self.samples.failures,
+            'Time Basis': np.where(self.samples.calendar, 'calendar', 'records'),
+        }
+        for label, point, boot in (
+            ('Shape β', self.shape, self.boot_shape),
+            ('Scale η', self.scale, self.boot_scale),
+            ('Mean Life', mean_life(self.shape, self.scale), mean_life(self.boot_shape, self.boot_scale)),
+            (b_label, b_life(self.shape, self.scale, p), b_life(self.boot_shape, self.boot_scale, p)),
+        ):
+            lo, hi = self._interval(boot)
+            columns[label] = point
+            columns[f'{label} low'] = lo
+            columns[f'{label} high'] = hi
+        out = pd.DataFrame(columns)
+        out['Fitted'] = np.isfinite(self.shape)
+        return out.sort_values(['Fitted', 'Intervals'], ascending=False, ignore_index=True)
+
+    def index(self, sheet, equipment):
+        return int(np.flatnonzero((self.samples.sheets == sheet) & (self.samples.equipment == equipment))[0])
+
+    def curve(self, index, t=None, points=200):
+        """R(t) of asset `index` with its bootstrap interval; t defaults to 0 .. 3η."""
+        if t is None:
+            t = np.linspace(0, 3 * self.scale[index], points)
+        lo, hi = self._interval(reliability(self.boot_shape[:, index], self.boot_scale[:, index], t))
+        return pd.DataFrame({'t': t, 'R': reliability(self.shape[index], self.scale[index], t), 'R low': lo,
+                             'R high': hi})
+
+
+def fit_lifetimes(samples, n_boot=DEFAULT_BOOTSTRAP, confidence=0.95, seed=0, max_workers=None):
+    shape, scale = fit_weibull(samples.times, samples.failed, samples.offsets)
+    boot_shape, boot_scale = bootstrap_weibull(samples, n_boot, seed, max_workers)
+    return WeibullFits(samples, shape, scale, boot_shape, boot_scale, confidence, seed)
+
+
+_fit_cache = OrderedDict()
+_fit_lock = threading.Lock()
+
+
+def cached_lifetimes(workbook, observation_period=1440, unit='hours', calendar=True, n_boot=DEFAULT_BOOTSTRAP, seed=0,
+                     compute=True):
+    """fit_lifetimes of a workbook, cached per parameters; with compute=False, None unless already cached."""
+    key = (workbook.data_hash, workbook.skip_rows, float(observation_period), unit, calendar, n_boot, seed)
+    with _fit_lock:
+        if key in _fit_cache:
+            _fit_cache.move_to_end(key)
+            return _fit_cache[key]
+    if not compute:
+        return None
+    fits = fit_lifetimes(failure_intervals(workbook, observation_period, unit, calendar), n_boot, seed=seed)
+    with _fit_lock:
+        _fit_cache[key] = fits
+        while len(_fit_cache) > MAX_CACHED_FITS:
+            _fit_cache.popitem(last=False)
+    return fits
@@ -0,0 +1,153 @@
+"""
+Server-side paginated view of a sheet's records.
+
+    view = sheet_view(workbook, sheet_name)
+    page = view.page(filters={'Department': ['CCM']}, sort='Repairing cost', descending=True,
+                     page=0, page_size=100, extra={'Operating_Time': op_time})
+    page.rows                   # at most page_size rows, indexed by record number
+
+Only the visible window of rows is materialized and sent to the browser, so
+the payload is the same for a thousand-row sheet and a million-row one.
+Filtering and sorting run over indexes built once per sheet and cached with
+it:
+
+  * department and reason labels as integer codes (cleaned like grouped.py),
+    so a filter is one lookup-table gather and no string compare;
+  * sort orders as int32 argsorts, per column and direction, built on first
+    use (the most recent MAX_SORT_ORDERS are kept).
+
+A filtered and sorted window is the sort order masked by the filter, then
+sliced. The unfiltered record order is sliced directly.
+"""
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from grouped import UNSPECIFIED, group_labels
+
+PAGE_SIZES = (50, 100, 250, 500)
+MAX_SORT_ORDERS = 4
+MAX_CACHED_VIEWS = 8
+
+
+@dataclass(frozen=True)
+class ViewPage:
+    rows: pd.DataFrame
+    start: int                  # position of the first row among the matching rows
+    total: int                  # rows matching the filters
+    page: int                   # clamped to the last page
+    pages: int
+
+
+def sort_keys(values, descending=False):
+    """Integer sort keys for any column: rank of each distinct value, missing values last in both directions."""
+    try:
+        codes, uniques = pd.factorize(values, sort=True)
+    except TypeError:
+        # Mixed types (numbers and text in one column) sort as text
+        codes, uniques = pd.factorize(values.astype(str).where(values.notna()), sort=True)
+    if descending:
+        codes = np.where(codes >= 0, len(uniques) - 1 - codes, codes)
+    return np.where(codes >= 0, codes, len(uniques))
+
+
+class SheetView:
+    """One sheet with its filter codes and cached sort orders."""
+
+    def __init__(self, df, filter_columns):
+        self.df = df
+        self._filters = {}
+        for label, (col, upper) in filter_columns.items():
+            if col is None:
+                continue
+            codes, categories = pd.factorize(group_labels(df, col, UNSPECIFIED, upper=upper), sort=True)
+            self._filters[label] = (codes.astype(np.int32), list(categories))
+        self._orders = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def filter_labels(self):
+        return list(self._filters)
+
+    def categories(self, label):
+        return self._filters[label][1]
+
+    def mask(self, filters):
+        """Boolean row mask for {label: selected values}, or None when nothing is filtered."""
+        mask = None
+        for label, selected in (filters or {}).items():
+            if not selected:
+                continue
+            codes, categories = self._filters[label]
+            lookup = np.isin(categories, list(selected))
+            mask = lookup[codes] if mask is None else mask & lookup[codes]
+        return mask
+
+    def order(self, column, descending=False):
+        """Row positions sorted by a column (stable: ties keep record order)."""
+        key = (column, descending)
+        with self._lock:
+            if key in self._orders:
+                self._orders.move_to_end(key)
+                return self._orders[key]
+        order = np.argsort(sort_keys(self.df[column], descending), kind='stable').astype(np.int32)
+        with self._lock:
+            self._orders[key] = order
+            while len(self._orders) > MAX_SORT_ORDERS:
+                self._orders.popitem(last=False)
+        return order
+
+    def page(self, filters=None, sort=None, descending=False, page=0, page_size=PAGE_SIZES[1], extra=None):
+        """One window of matching rows; `extra` adds per-record arrays (e.g. Operating_Time) for just that window."""
+        mask = self.mask(filters)
+        if sort is not None:
+            positions = self.order(sort, descending)
+            if mask is not None:
+                positions = positions[mask[positions]]
+        elif mask is not None:
+            positions = np.flatnonzero(mask)
+        else:
+            positions = None
+        total = len(self.df) if positions is None else len(positions)
+        pages = max(math.ceil(total / page_size), 1)
+        page = min(max(int(page), 0), pages - 1)
+        start = page * page_size
+        window = np.arange(start, min(start + page_size, total)) if positions is None \
+            else positions[start:start + page_size]
+        rows = self.df.iloc[window].copy()
+        for name, values in (extra or {}).items():
+            rows[name] = np.asarray(values)[window]
+        return ViewPage(rows, start, total, page, pages)
+
+
+_view_cache = OrderedDict()
+_view_lock = threading.Lock()
+
+
+def sheet_view(workbook, s_name, dept_col=None, reason_col=None):
+    """
+    SheetView of a workbook sheet filtering by department and reason (the schema's columns
+    unless given), cached per workbook, sheet and filter columns.
+    """
+    schema = workbook.schema(s_name)
+    dept_col = dept_col or schema.column('department')
+    reason_col = reason_col or schema.column('reason')
+    key = (workbook.data_hash, workbook.skip_rows, s_name, dept_col, reason_col)
+    with _view_lock:
+        if key in _view_cache:
+            _view_cache.move_to_end(key)
+            return _view_cache[key]
+    # Departments compare case-insensitively everywhere else ("Ccm" == "CCM")
+    view = SheetView(workbook.sheet(s_name), {'Department': (dept_col, True), 'Reason': (reason_col, False)})
+    with _view_lock:
+        _view_cache[key] = view
+        while len(_view_cache) > MAX_CACHED_VIEWS:
+            _view_cache.popitem(last=False)
+    return view
@@ -0,0 +1,212 @@
+"""
+Time-aware reliability from the event timestamps instead of record indices.
+
+The record-based engine assumes every row covers one observation period and
+measures intervals in "records". Here the date (plus the start time, when a
+sheet has one) is parsed once per sheet into datetime64 (cached_timestamps),
+and:
+
+  * operating time is the calendar span covered by the log minus downtime,
+  * time between failures is the real gap between failure timestamps,
+  * the next-failure estimate is given in hours or days,
+  * daily / weekly / monthly figures come from one resample pass.
+
+Everything is a vectorized diff or a group-by over sorted timestamps, so it
+stays linear in the number of events (the sort is skipped when the log is
+already in time order, as exports are).
+
+Text dates are parsed with one explicit format per column, inferred from a
+sample of its values (day-first readings win ties, as in the plant exports),
+so "03-04-2023" means the same day in every row.
+"""
+import threading
+import warnings
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from reliability import MIN_FAILURES_FOR_PREDICTION
+
+TIME_UNITS = {'hours': 60, 'days': 1440}            # minutes per unit
+RESAMPLE_RULES = {'Daily': 'D', 'Weekly': 'W-MON', 'Monthly': 'MS'}
+FORMAT_SAMPLES = 20             # distinct text dates a column's format is guessed from
+MAX_CACHED_TIMESTAMPS = 32
+
+
+@dataclass(frozen=True)
+class TimeReliabilityResult:
+    start: pd.Timestamp
+    end: pd.Timestamp
+    calendar_time: float        # in the requested unit
+    total_downtime: float
+    total_op_time: float
+    num_failures: int
+    mttf: float
+    failure_rate: float         # failures per unit of time
+    mean_tbf: float             # real time between failures
+    std_tbf: float
+    time_since_failure: float
+    estimated_next_failure: float
+    confidence: float
+    has_prediction: bool
+    dropped_rows: int           # records without a usable date
+
+
+def date_formats(texts):
+    """Candidate formats guessed from some date strings, the day-first reading of each first."""
+    from pandas.tseries.api import guess_datetime_format
+    formats = []
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')     # "Parsing dates in %d.%m.%Y format when dayfirst=False..."
+        for text in texts:
+            for dayfirst in (True, False):
+                fmt = guess_datetime_format(text, dayfirst=dayfirst)
+                if fmt and fmt not in formats:
+                    formats.append(fmt)
+    return formats
+
+
+def parse_dates(values):
+    """
+    Text (or mixed) dates as datetime64[ns]. Each distinct value is parsed once, with the
+    candidate format that reads the most values; values it cannot read try the next one.
+    """
+    codes, uniques = pd.factorize(values)
+    texts = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    parsed = pd.Series(pd.NaT, index=texts.index, dtype='datetime64[ns]')
+    if len(texts):
+        sample = texts.iloc[np.unique(np.linspace(0, len(texts) - 1, FORMAT_SAMPLES).astype(int))]
+        attempts = {fmt: pd.to_datetime(texts, format=fmt, errors='coerce') for fmt in date_formats(sample)}
+        # sorted() is stable: on a tie the day-first format stays ahead
+        for fmt in sorted(attempts, key=lambda f: -int(attempts[f].notna().sum())):
+            parsed = parsed.where(parsed.notna(), attempts[fmt])
+        leftover = parsed.isna() & (texts != '') & (texts.str.lower() != 'nan')
+        if leftover.any():
+            parsed[leftover] = pd.to_datetime(texts[leftover], errors='coerce', format='mixed', dayfirst=True)
+    stamps = parsed.to_numpy(dtype='datetime64[ns]')[codes]
+    stamps[codes < 0] = np.datetime64('NaT')
+    return stamps
+
+
+def parse_timestamps(df, date_col, time_col=None):
+    """Event timestamps as datetime64[ns] (NaT where the date is missing or invalid)."""
+    dates = df[date_col]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.Series(parse_dates(dates), index=df.index)
+    stamps = dates.dt.normalize() if time_col is not None else dates
+    if time_col is not None:
+        # Each distinct time of day is parsed once
+        codes, uniques = pd.factorize(df[time_col].astype(str).str.strip())
+        parsed = pd.to_timedelta(pd.Series(uniques, dtype=object), errors='coerce').to_numpy()
+        offsets = pd.Series(np.where(codes >= 0, parsed[codes], np.timedelta64('NaT')), index=df.index)
+        # Keep the time of day only; unparseable times fall back to midnight
+        stamps = stamps + offsets.where(offsets.lt(pd.Timedelta(days=1))).fillna(pd.Timedelta(0))
+    return stamps.to_numpy(dtype='datetime64[ns]')
+
+
+_timestamp_cache = OrderedDict()
+_timestamp_lock = threading.Lock()
+
+
+def cached_timestamps(workbook, s_name, date_col, time_col=None):
+    """parse_timestamps for a workbook sheet, cached per workbook, sheet and columns (read-only)."""
+    key = (workbook.data_hash, workbook.skip_rows, s_name, date_col, time_col)
+    with _timestamp_lock:
+        if key in _timestamp_cache:
+            _timestamp_cache.move_to_end(key)
+            return _timestamp_cache[key]
+    stamps = parse_timestamps(workbook.sheet(s_name), date_col, time_col)
+    stamps.flags.writeable = False
+    with _timestamp_lock:
+        _timestamp_cache[key] = stamps
+        while len(_timestamp_cache) > MAX_CACHED_TIMESTAMPS:
+            _timestamp_cache.popitem(last=False)
+    return stamps
+
+
+def _sorted_events(timestamps, downtime):
+    timestamps = np.asarray(timestamps, dtype='datetime64[ns]')
+    downtime = np.asarray(downtime, dtype=np.float64)
+    valid = ~np.isnat(timestamps)
+    timestamps, downtime = timestamps[valid], downtime[valid]
+    if len(timestamps) > 1 and (np.diff(timestamps) < np.timedelta64(0, 'ns')).any():
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, downtime = timestamps[order], downtime[order]
+    return timestamps, downtime, int((~valid).sum())
+
+
+def compute_time_reliability(timestamps, downtime, unit='hours', min_failures=MIN_FAILURES_FOR_PREDICTION):
+    """Calendar-based MTTF, time between failures and next-failure estimate in `unit`."""
+    minutes_per_unit = TIME_UNITS[unit]
+    timestamps, downtime, dropped = _sorted_events(timestamps, downtime)
+    if len(timestamps) == 0:
+        raise ValueError("No records with a valid date")
+
+    # Whole calendar days covered by the log
+    start = timestamps[0].astype('datetime64[D]')
+    end = timestamps[-1].astype('datetime64[D]') + np.timedelta64(1, 'D')
+    calendar_minutes = (end - start) / np.timedelta64(1, 'm')
+    total_downtime = float(downtime.sum())
+    op_minutes = max(0.0, calendar_minutes - total_downtime)
+
+    failure_times = timestamps[downtime > 0]
+    num_failures = len(failure_times)
+    mttf = op_minutes / minutes_per_unit / num_failures if num_failures else 0.0
+
+    mean_tbf = std_tbf = since = estimate = confidence = 0.0
+    has_prediction = num_failures >= max(min_failures, 2)
+    if num_failures:
+        # Time since the last failure, measured to the newest event in the log
+        since = (timestamps[-1] - failure_times[-1]) / np.timedelta64(1, 'm') / minutes_per_unit
+    if has_prediction:
+        gaps = np.diff(failure_times) / np.timedelta64(1, 'm') / minutes_per_unit
+        mean_tbf = float(gaps.mean())
+        std_tbf = float(gaps.std())
+        estimate = max(0.0, mean_tbf - since)
+        confidence = max(0.0, 100 - (std_tbf / mean_tbf * 100)) if mean_tbf > 0 else 0.0
+
+    return TimeReliabilityResult(
+        start=pd.Timestamp(start),
+        end=pd.Timestamp(end),
+        calendar_time=float(calendar_minutes / minutes_per_unit),
+        total_downtime=total_downtime / minutes_per_unit,
+        total_op_time=float(op_minutes / minutes_per_unit),
+        num_failures=num_failures,
+        mttf=float(mttf),
+        failure_rate=float(1 / mttf) if mttf > 0 else 0.0,
+        mean_tbf=mean_tbf,
+        std_tbf=std_tbf,
+        time_since_failure=float(since),
+        estimated_next_failure=float(estimate),
+        confidence=float(confidence),
+        has_prediction=has_prediction,
+        dropped_rows=dropped,
+    )
+
+
+def resample_reliability(timestamps, downtime, freq='D', unit='hours'):
+    """Failures, downtime, operating time, MTTF and availability per calendar period."""
+    minutes_per_unit = TIME_UNITS[unit]
+    timestamps, downtime, _ = _sorted_events(timestamps, downtime)
+    if len(timestamps) == 0:
+        raise ValueError("No records with a valid date")
+    events = pd.DataFrame({'Downtime': downtime, 'Failures': (downtime > 0).astype(np.int64)},
+                          index=pd.DatetimeIndex(timestamps))
+    periods = events.resample(freq, closed='left', label='left').sum()
+    # Calendar length of each period (the last one runs up to the next period's start)
+    bounds = periods.index.append(pd.DatetimeIndex([periods.index[-1] + pd.tseries.frequencies.to_offset(freq)]))
+    period_minutes = np.diff(bounds.to_numpy()) / np.timedelta64(1, 'm')
+    op_minutes = np.clip(period_minutes - periods['Downtime'].to_numpy(), 0, None)
+    failures = periods['Failures'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mttf = np.where(failures > 0, op_minutes / minutes_per_unit / failures, np.nan)
+    return pd.DataFrame({
+        'Period': periods.index,
+        'Failures': failures,
+        f'Downtime ({unit})': periods['Downtime'].to_numpy() / minutes_per_unit,
+        f'Operating Time ({unit})': op_minutes / minutes_per_unit,
+        f'MTTF ({unit})': mttf,
+        'Availability (%)': op_minutes / period_minutes * 100,
+    })
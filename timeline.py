@@ -0,0 +1,110 @@
+"""
+Adaptive "Time Distribution per Event" chart.
+
+Small sheets keep the original stacked bar per record. Past FULL_DETAIL_LIMIT
+records the visible window is bucketed on the server (sum of operating
+time and downtime per bucket, plus the peak downtime so single long
+outages stay visible) and drawn with WebGL traces. The payload is bounded
+by MAX_POINTS whatever the sheet size; zooming into a smaller window
+re-buckets it at a finer resolution, down to one bar per record.
+"""
+import numpy as np
+
+FULL_DETAIL_LIMIT = 5000   # windows up to this many records keep one bar per record
+MAX_POINTS = 2000          # buckets drawn for larger windows
+
+OP_COLOR = '#10b981'
+DOWN_COLOR = '#ef4444'
+
+
+def bucket_edges(start, stop, max_points=MAX_POINTS):
+    """Record boundaries splitting [start, stop) into at most max_points buckets."""
+    n_buckets = max(1, min(max_points, stop - start))
+    return np.unique(np.linspace(start, stop, n_buckets + 1).astype(np.int64))
+
+
+def bucket_reduce(values, edges, how='sum'):
+    """Sum or max of `values` inside each bucket given by `edges` (one vectorized pass)."""
+    values = np.asarray(values, dtype=np.float64)
+    ufunc = np.maximum if how == 'max' else np.add
+    return ufunc.reduceat(values[edges[0]:edges[-1]], edges[:-1] - edges[0])
+
+
+def is_downsampled(n_records, start=0, stop=None):
+    stop = n_records if stop is None else stop
+    return stop - start > FULL_DETAIL_LIMIT
+
+
+def timeline_figure(operating_time, downtime, conv_factor, unit_conv, start=0, stop=None,
+                    max_points=MAX_POINTS, webgl=True):
+    """
+    Stacked operating time / downtime chart for records [start, stop).
+    webgl=False draws the bucketed view with SVG traces (for static image export).
+    """
+    import plotly.graph_objects as go
+
+    stop = len(downtime) if stop is None else stop
+    if not is_downsampled(len(downtime), start, stop):
+        fig = go.Figure()
+        index = np.arange(start, stop)
+        fig.add_trace(go.Bar(
+            name='Operating Time',
+            x=index,
+            y=np.asarray(operating_time[start:stop]) / conv_factor,
+            marker_color=OP_COLOR,
+            hovertemplate="Index %{x}<br>Op Time: %{y:.2f} " + unit_conv
+        ))
+        fig.add_trace(go.Bar(
+            name='Downtime',
+            x=index,
+            y=np.asarray(downtime[start:stop]) / conv_factor,
+            marker_color=DOWN_COLOR,
+            hovertemplate="Index %{x}<br>Downtime: %{y:.2f} " + unit_conv
+        ))
+        title = f"Time Distribution per Event ({unit_conv})"
+    else:
+        edges = bucket_edges(start, stop, max_points)
+        op_sum = bucket_reduce(operating_time, edges) / conv_factor
+        down_sum = bucket_reduce(downtime, edges) / conv_factor
+        down_max = bucket_reduce(downtime, edges, 'max') / conv_factor
+        x = edges[:-1]
+        ranges = np.stack([edges[:-1], edges[1:] - 1], axis=1)
+        scatter = go.Scattergl if webgl else go.Scatter
+
+        fig = go.Figure()
+        # Manual stacking: downtime from zero, operating time filled on top of it
+        fig.add_trace(scatter(
+            name='Downtime',
+            x=x, y=down_sum,
+            mode='lines', line=dict(color=DOWN_COLOR, width=1),
+            fill='tozeroy',
+            customdata=ranges,
+            hovertemplate="Records %{customdata[0]}-%{customdata[1]}<br>Downtime: %{y:.2f} " + unit_conv
+        ))
+        fig.add_trace(scatter(
+            name='Operating Time',
+            x=x, y=down_sum + op_sum,
+            mode='lines', line=dict(color=OP_COLOR, width=1),
+            fill='tonexty',
+            customdata=np.column_stack([ranges, op_sum]),
+            hovertemplate="Records %{customdata[0]}-%{customdata[1]}<br>Op Time: %{customdata[2]:.2f} " + unit_conv
+        ))
+        fig.add_trace(scatter(
+            name='Peak Downtime (single event)',
+            x=x, y=down_max,
+            mode='lines', line=dict(color='#7f1d1d', width=1, dash='dot'),
+            customdata=ranges,
+            hovertemplate="Records %{customdata[0]}-%{customdata[1]}<br>Peak downtime: %{y:.2f} " + unit_conv
+        ))
+        records_per_bucket = (stop - start) / len(x)
+        title = f"Time Distribution per Event ({unit_conv}, ~{records_per_bucket:,.0f} records per point)"
+
+    fig.update_layout(
+        barmode='stack',
+        title=dict(text=title, font=dict(size=20)),
+        plot_bgcolor='rgba(0,0,0,0)',
+        height=450,
+        margin=dict(l=20, r=20, t=50, b=20),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    return fig